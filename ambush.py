@@ -1,7 +1,8 @@
 import sys
 import random
 import itertools
-from visibility import Wave
+import math
+from visibility import VisibilityIndex
 
 from api import Commander, commands, gameinfo
 from api.vector2 import Vector2
@@ -10,6 +11,8 @@ from api.vector2 import Vector2
 from PySide import QtGui, QtCore
 import networkx as nx
 
+from mapcache import MapCache
+
 from visualizer import VisualizerApplication
 
 SCALE = 10
@@ -60,6 +63,9 @@ class AmbushCommander(Commander):
         self.visualizer.setKeyboardHook(self.keyPressed)
 
         self.makeGraph()
+        self.mapCache = MapCache(self.level)
+        self.visibility = VisibilityIndex.fromMask(self.level.blocksSight)
+        self.visibility.bits = self.mapCache.get('visibility', lambda: self.visibility.buildParallel(report = sys.stdout).bits)
         
         self.graph.add_node("enemy_base")
         start, finish = self.level.botSpawnAreas[self.game.enemyTeam.name]        
@@ -99,21 +105,8 @@ class AmbushCommander(Commander):
                 continue
             orientation = (next_position - position).normalized()
 
-            def visible(p):
-                delta = (p-position)
-                l = delta.length()
-                if l > 20.0:
-                    return False
-                if l < 2.5:
-                    return True
-                delta /= l
-                return orientation.dotProduct(delta) >= 0.5
-
-            cells = []
-            w = Wave((88, 50), lambda x, y: self.level.blockHeights[x][y] > 1, lambda x, y: cells.append((x,y)))
-            w.compute(position)
-
-            for x, y in [c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))]:
+            cells = self.visibility.coneCells(position, orientation, math.pi / 3, 20.0)
+            for x, y in self.visibility.cellCoordinates(cells):
                 self.visibilities.setPixel(x, y, self.visibilities.pixel(x, y)+1)
 
         starte, finishe = self.level.botSpawnAreas[self.game.enemyTeam.name]
@@ -127,16 +120,8 @@ class AmbushCommander(Commander):
             if not n: continue
             
             position = Vector2(*self.graph.node[n]["position"])
-            def visible(p):
-                delta = (p-position)
-                l = delta.length()
-                return l <= 15.0
-
-            cells = []
-            w = Wave((88, 50), lambda x, y: self.level.blockHeights[x][y] > 1, lambda x, y: cells.append((x,y)))
-            w.compute(position)
-
-            for x, y in [c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))]:
+            cells = self.visibility.coneCells(position, None, math.pi, 15.0)
+            for x, y in self.visibility.cellCoordinates(cells):
                 self.visibilities.setPixel(x, y, self.visibilities.pixel(x, y)+1)
 
 
@@ -163,22 +148,10 @@ class AmbushCommander(Commander):
         self.calculateAmbushes()
 
     def evaluate(self, position, orientation, callback):
-        cells = []
-        w = Wave((88, 50), lambda x, y: self.level.blockHeights[x][y] > 1, lambda x, y: cells.append((x,y)))
-        w.compute(position)
-
-        def visible(p):
-            delta = (p-position)
-            l = delta.length()
-            if l > 15.0:
-                return False
-            if l < 2.5:
-                return True
-            delta /= l
-            return orientation.dotProduct(delta) > 0.9238
+        cells = self.visibility.coneCells(position, orientation, math.pi / 8, self.level.firingDistance)
 
         total = 0.0
-        for x, y in [c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))]:
+        for x, y in self.visibility.cellCoordinates(cells):
             total += callback(x,y)
         return total
 
@@ -2,14 +2,17 @@ import sys
 import random
 import itertools
 import math
-from visibility import Wave
+from visibility import VisibilityIndex
 
 from api import Commander, commands, gameinfo
-from api.vector2 import Vector2
+from api.vector2 import Vector2, Vector2Array
 
 
 from PySide import QtGui, QtCore
 import networkx as nx
+import numpy as np
+
+from mapcache import MapCache
 
 from visualizer import VisualizerApplication
 
@@ -250,7 +253,8 @@ class AmbushCommander(Commander):
                             self.newDeadline(start, intersect)
     
     def drawPreWorld(self, visualizer):
-       furthest = max([self.distances[n] for n in itertools.chain(*self.terrain) if n])
+       # Cells that cannot reach the enemy's route are at an infinite distance, draw them as the furthest.
+       furthest = max([self.distances[n] for n in itertools.chain(*self.terrain) if n and np.isfinite(self.distances[n])] or [1.0])
        brightest = max([self.visibilities.pixel(i,j) for i, j in itertools.product(range(88), range(50))])
         
         # visible = QtGui.QImage(88, 50, QtGui.QImage.Format_ARGB32)
@@ -260,7 +264,7 @@ class AmbushCommander(Commander):
             n = self.terrain[j][i]
             if n:
                 if self.mode == self.MODE_TRAVELLING:
-                    d = self.distances[n] * 255.0 / furthest
+                    d = min(self.distances[n], furthest) * 255.0 / furthest
                 if self.mode == self.MODE_VISIBILITY:
                     d = self.visibilities.pixel(i,j) * 255 / brightest
             else:                
@@ -359,7 +363,28 @@ class AmbushCommander(Commander):
         self.visualizer.setKeyboardHook(self.keyPressed)
 
         self.makeGraph()
-        
+        self.mapCache = MapCache(self.level)
+        self.visibility = VisibilityIndex.fromMask(self.level.blocksSight)
+        self.visibility.bits = self.mapCache.get('visibility', lambda: self.visibility.buildParallel(report = sys.stdout).bits)
+        names = [self.game.team.name + '.visibilities', self.game.team.name + '.distances']
+        visibilities, self.distances = self.mapCache.getMany(names, self.analyseMap)
+
+        self.visibilities = QtGui.QImage(88, 50, QtGui.QImage.Format_ARGB32)
+        self.visibilities.fill(0)
+        for x, y in zip(*np.nonzero(visibilities)):
+            self.visibilities.setPixel(int(x), int(y), int(visibilities[x, y]))
+
+        self.queue = {}
+        self.game.match.retain(window = 30.0)
+        self.events = self.game.match.cursor(0)
+        print "Done with init. Calculating ambush spots"
+        self.calculateAmbushes(self.campLines)
+        self.aliveEnemies = 0
+
+    def analyseMap(self):
+        """
+        Return the heatmap of how often each cell is seen from the enemy route and the spawn areas, and the distances to the enemy route.
+        """
         self.graph.add_node("enemy_base")
         start, finish = self.level.botSpawnAreas[self.game.enemyTeam.name]        
         for i, j in itertools.product(range(int(start.x), int(finish.x)), range(int(start.y), int(finish.y))):
@@ -383,8 +408,7 @@ class AmbushCommander(Commander):
         vf2s = nx.shortest_path(self.graph, source=self.node_EnemyFlagIndex, target=self.node_EnemyScoreIndex)
         #vb2s = nx.shortest_path(self.graph, source="enemy_base", target=self.node_EnemyScoreIndex)
 
-        self.visibilities = QtGui.QImage(88, 50, QtGui.QImage.Format_ARGB32)
-        self.visibilities.fill(0)
+        visibilities = np.zeros((88, 50), dtype = np.int32)
         path = vb2f+vf2s
         #path = vb2f = nx.shortest_path(self.graph, source="enemy_base", target=self.node_EnemyFlagIndex)
         edgesinpath=zip(path[0:],path[1:])        
@@ -399,22 +423,8 @@ class AmbushCommander(Commander):
                 continue
             orientation = (next_position - position).normalized()
 
-            def visible(p):
-                delta = (p-position)
-                l = delta.length()
-                if l > 20.0:
-                    return False
-                if l < 2.5:
-                    return True
-                delta /= l
-                return orientation.dotProduct(delta) >= 0.5
-
-            cells = []
-            w = Wave((88, 50), lambda x, y: self.level.blockHeights[x][y] > 1, lambda x, y: cells.append((x,y)))
-            w.compute(position)
-
-            for x, y in [c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))]:
-                self.visibilities.setPixel(x, y, self.visibilities.pixel(x, y)+1)
+            cells = self.visibility.coneCells(position, orientation, math.pi / 3, 20.0)
+            visibilities[cells % 88, cells // 88] += 1
 
         starte, finishe = self.level.botSpawnAreas[self.game.enemyTeam.name]
         startf, finishf = self.level.botSpawnAreas[self.game.team.name]
@@ -427,17 +437,8 @@ class AmbushCommander(Commander):
             if not n: continue
             
             position = Vector2(*self.graph.node[n]["position"])
-            def visible(p):
-                delta = (p-position)
-                l = delta.length()
-                return l <= 15.0
-
-            cells = []
-            w = Wave((88, 50), lambda x, y: self.level.blockHeights[x][y] > 1, lambda x, y: cells.append((x,y)))
-            w.compute(position)
-
-            for x, y in [c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))]:
-                self.visibilities.setPixel(x, y, self.visibilities.pixel(x, y)+1)
+            cells = self.visibility.coneCells(position, None, math.pi, 15.0)
+            visibilities[cells % 88, cells // 88] += 1
 
 
         self.node_EnemyBaseToFlagIndex = "enemy_base_to_flag"
@@ -456,43 +457,24 @@ class AmbushCommander(Commander):
        #     self.graph.add_edge(self.node_EnemyBaseToScoreIndex, vertex, weight = 1.0)
 
         ## node = self.makeNode(self.game.enemyTeam.flag.position)"""
-        self.distances = nx.single_source_shortest_path_length(self.graph, self.node_EnemyFlagToScoreIndex)
-        #self.distances = nx.single_source_shortest_path_length(self.graph, self.node_EnemyBaseToFlagIndex)
-        self.queue = {}
-        self.index = 0
-        print "Done with init. Calculating ambush spots"
-        self.calculateAmbushes(self.campLines)
-        self.aliveEnemies = 0
+        lengths = nx.single_source_shortest_path_length(self.graph, self.node_EnemyFlagToScoreIndex)
+        #lengths = nx.single_source_shortest_path_length(self.graph, self.node_EnemyBaseToFlagIndex)
+        distances = np.empty(len(self.level.blockHeights) * len(self.level.blockHeights[0]))
+        distances.fill(float('inf'))
+        for n, d in lengths.iteritems():
+            if not isinstance(n, str):
+                distances[n] = d
+        return visibilities, distances
 
     def evaluate(self, position, orientation, callback):
-        cells = []
-        w = Wave((88, 50), lambda x, y: self.level.blockHeights[x][y] > 1, lambda x, y: cells.append((x,y)))
-        w.compute(position)
-
-        def visible(p):
-            delta = (p-position)
-            l = delta.length()
-            if l > 15.0:
-                return False
-            if l < 2.5:
-                return True
-            delta /= l
-            return orientation.dotProduct(delta) > 0.9238
+        cells = self.visibility.coneCells(position, orientation, math.pi / 8, self.level.firingDistance)
 
         total = 0.0
-        for x, y in [c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))]:
+        for x, y in self.visibility.cellCoordinates(cells):
             total += callback(x,y)
         return total
 
-    def findNearby(self, results, candidate, distance = 2.0):
-        d = distance * distance
-        s, (position, _) = candidate
-        for _, (p, _) in results:
-            if (p-position).squaredLength() < d:
-                return True            
-        return False
-
-    def replaceInList(self, candidate, results, maximum = 40):
+    def replaceInList(self, candidate, results, maximum = 40, distance = 2.0):
         results.append(candidate)
 
         if len(results) < 50:
@@ -501,14 +483,18 @@ class AmbushCommander(Commander):
         copy = results[:]
         copy.sort(key=lambda s: -s[0])
 
-        results[:] = []
-
-        for i, c in enumerate(copy):
-            if not self.findNearby(results, c):
-                results.append(c)
-            if len(results) >= maximum:
+        # Keep the best candidates, skipping any that is near one kept already.
+        points = Vector2Array([p for _, (p, _) in copy])
+        near = points.squaredDistanceMatrix(points) < distance * distance
+        kept = []
+        for i in range(len(copy)):
+            if not near[i, kept].any():
+                kept.append(i)
+            if len(kept) >= maximum:
                 break
 
+        results[:] = [copy[i] for i in kept]
+
     def calculateAmbushes(self, camps):        
         results = []
         for q, _ in camps:
@@ -545,7 +531,7 @@ class AmbushCommander(Commander):
             return 0.0
 
     def tick(self):
-        for e in self.game.match.combatEvents[self.index:]:
+        for e in self.events.unseen():
             if e.type == gameinfo.MatchCombatEvent.TYPE_RESPAWN:
                 if e.subject in self.queue:
                     del self.queue[e.subject]
@@ -555,7 +541,6 @@ class AmbushCommander(Commander):
             elif e.type == gameinfo.MatchCombatEvent.TYPE_KILLED and e.subject in self.game.enemyTeam.members:
                 self.aliveEnemies -= 1
                 sys.stdout.write(str(self.aliveEnemies) + '\n')
-        self.index = len(self.game.match.combatEvents)
 
         for c in self.spawnCampers:
             for derp in c[0][:]:
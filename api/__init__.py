@@ -1,2 +1,2 @@
 from commander import Commander
-from vector2 import Vector2
+from vector2 import Vector2, Vector2Array
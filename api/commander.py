@@ -12,6 +12,8 @@ import os
 import sys
 import logging
 
+from api.gameinfo import BotInfo
+
 
 class Commander(object):
     """
@@ -20,6 +22,10 @@ class Commander(object):
     You must implement `tick(self)` in your custom Commander.
     """
 
+    # The states of a bot that is still following the last command it was given.
+    BUSY_STATES = frozenset([BotInfo.STATE_DEFENDING, BotInfo.STATE_MOVING, BotInfo.STATE_ATTACKING, BotInfo.STATE_CHARGING,
+                             BotInfo.STATE_SHOOTING, BotInfo.STATE_TAKINGORDERS, BotInfo.STATE_HOLDING])
+
 
     def initialize(self):
         """
@@ -53,11 +59,22 @@ class Commander(object):
         Issue a command for a single bot, with optional arguments depending on the command.
 
         `CommandClass`: must be one of `[api.commands.Defend, api.commands.Attack, api.commands.Move, api.commands.Charge]`
+
+        The queue holds at most one command per bot: a command replaces the
+        one issued to the same bot earlier in the tick.  Issuing the order a
+        bot is still carrying out is dropped, as the game would restart it.
         """
         if not self.verbose and 'description' in dct:
             del dct['description']
 
-        self.commandQueue.append(CommandClass(bot.name, *args, **dct))
+        command = CommandClass(bot.name, *args, **dct)
+        for i, queued in enumerate(self.commandQueue):
+            if queued.botId == command.botId:
+                del self.commandQueue[i]
+                break
+        if bot.state in self.BUSY_STATES and command == self.issuedCommands.get(bot.name):
+            return
+        self.commandQueue.append(command)
 
 
     def __init__(self, nick, **kwargs):
@@ -108,6 +125,7 @@ class Commander(object):
         """
 
         self.commandQueue = [] # the queue were issues commands are stored to be run later by the game
+        self.issuedCommands = {} # the last command sent to each bot, by name
 
     # internal
     def setGameInfo(self, info):
@@ -123,6 +141,8 @@ class Commander(object):
 
     # internal
     def clearCommandQueue(self):
+        for command in self.commandQueue:
+            self.issuedCommands[command.botId] = command
         self.commandQueue = []
 
 
@@ -1,6 +1,50 @@
-from api import Vector2
+import json
 
-class Defend(object):
+from api import Vector2, Vector2Array
+
+
+encodeValue = json.JSONEncoder().encode
+
+# The format string for each number of waypoints seen so far.
+waypointFormats = {}
+
+def encodeWaypoints(vectors):
+    """
+    Return the JSON for a list of Vector2 as [[x, y], ...], formatted from one flat tuple of floats.
+    Waypoints off at infinity or NaN are written as json.dumps writes them, since %r differs there.
+    """
+    flat = tuple([c for v in vectors for c in (v.x, v.y)])
+    total = sum(flat)
+    if total - total != 0.0:
+        return encodeValue([[v.x, v.y] for v in vectors])
+    count = len(vectors)
+    if count not in waypointFormats:
+        waypointFormats[count] = '[' + ','.join(['[%r,%r]'] * count) + ']'
+    return waypointFormats[count] % flat
+
+
+class Command(object):
+    """
+    The base class of the commands, which caches their JSON encoding.  Setting an attribute drops the
+    cached encoding, but waypoint lists must not be changed in place once the command is encoded.
+    """
+
+    def __setattr__(self, name, value):
+        self.__dict__[name] = value
+        self.__dict__.pop('_encoded', None)
+
+    def encode(self):
+        """
+        Return the command as JSON, the same as json.dumps with toJSON, encoding it only the first time.
+        """
+        try:
+            return self.__dict__['_encoded']
+        except KeyError:
+            encoded = self.__dict__['_encoded'] = self.encodeJSON()
+            return encoded
+
+
+class Defend(Command):
     """
     Commands a bot to defend its current position.
     """
@@ -45,10 +89,23 @@ class Defend(object):
         A description of the intention of the bot. This is displayed automatically if the commander sets self.verbose = True
         """
 
+    def __eq__(self, other):
+        """
+        Return True if both commands give the same order to the same bot, whatever their descriptions.
+        """
+        return isinstance(other, Defend) and self.botId == other.botId and self.facingDirection == other.facingDirection
+
+    def __ne__(self, other):
+        return not self == other
+
+    def encodeJSON(self):
+        return '{"__class__": "Defend", "__value__": {"bot": %s, "facingDirections": %s, "description": %s}}' % (
+            encodeValue(self.botId), json.dumps(self.facingDirection, default = toJSON), encodeValue(self.description))
+
     def __str__(self):
         return "Defend {} facingDirection={} {}".format(self.botId, self.facingDirection, self.description)
 
-class Move(object):
+class Move(Command):
     """
     Commands a bot to run to a specified position without attacking visible enemies.
     """
@@ -74,11 +131,21 @@ class Move(object):
         A description of the intention of the bot. This is displayed automatically if the commander sets self.verbose = True
         """
 
+    def __eq__(self, other):
+        return isinstance(other, Move) and self.botId == other.botId and self.target == other.target
+
+    def __ne__(self, other):
+        return not self == other
+
+    def encodeJSON(self):
+        return '{"__class__": "Move", "__value__": {"bot": %s, "target": %s, "description": %s}}' % (
+            encodeValue(self.botId), encodeWaypoints(self.target), encodeValue(self.description))
+
     def __str__(self):
         return "Move {} target={} {}".format(self.botId, self.target, self.description)
 
 
-class Attack(object):
+class Attack(Command):
     """
     Commands a bot to attack a specified position. If an enemy bot is seen by this bot, it will be attacked.
     """
@@ -108,11 +175,22 @@ class Attack(object):
         A description of the intention of the bot. This is displayed automatically if the commander sets self.verbose = True
         """
 
+    def __eq__(self, other):
+        return isinstance(other, Attack) and self.botId == other.botId and self.target == other.target and self.lookAt == other.lookAt
+
+    def __ne__(self, other):
+        return not self == other
+
+    def encodeJSON(self):
+        lookAt = encodeValue([self.lookAt.x, self.lookAt.y]) if self.lookAt else 'null'
+        return '{"__class__": "Attack", "__value__": {"bot": %s, "target": %s, "lookAt": %s, "description": %s}}' % (
+            encodeValue(self.botId), encodeWaypoints(self.target), lookAt, encodeValue(self.description))
+
     def __str__(self):
         return "Attack {} target={} lookAt={} {}".format(self.botId, self.target, self.lookAt, self.description)
 
 
-class Charge(object):
+class Charge(Command):
     """
     Commands a bot to attack a specified position at a running pace. This is faster than Attack but incurs an additional firing delay penalty.
     """
@@ -138,6 +216,16 @@ class Charge(object):
         A description of the intention of the bot. This is displayed automatically if the commander sets self.verbose = True
         """
 
+    def __eq__(self, other):
+        return isinstance(other, Charge) and self.botId == other.botId and self.target == other.target
+
+    def __ne__(self, other):
+        return not self == other
+
+    def encodeJSON(self):
+        return '{"__class__": "Charge", "__value__": {"bot": %s, "target": %s, "description": %s}}' % (
+            encodeValue(self.botId), encodeWaypoints(self.target), encodeValue(self.description))
+
     def __str__(self):
         return "Charge {} target={} {}".format(self.botId, self.target, self.description)
 
@@ -147,6 +235,9 @@ def toJSON(python_object):
         v = python_object
         return [v.x, v.y]
 
+    if isinstance(python_object, Vector2Array):
+        return python_object.toJSON()
+
     if isinstance(python_object, Defend):
         command = python_object
         return {'__class__': 'Defend',
@@ -169,6 +260,12 @@ def toJSON(python_object):
 
     raise TypeError(repr(python_object) + ' is not JSON serializable')
 
+def encodeCommands(commandList):
+    """
+    Return the <command> messages for a whole batch of commands as one string, to send at once.
+    """
+    return ''.join(['<command>\n%s\n' % command.encode() for command in commandList])
+
 def toVector2List(list):
     result = []
     for v in list:
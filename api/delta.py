@@ -0,0 +1,136 @@
+"""
+Protocol version 1.5: instead of the whole GameInfo, each <tick> carries
+only the fields of the bots and flags that changed since the previous
+tick, with their floats rounded.  Every so often a tick is sent as a full
+GameInfo again, a keyframe, which is a valid 1.4 message with the same
+rounding.
+
+The server offers the version in its ConnectServer and the client asks
+for it in its ConnectClient:
+
+    connectServer = ConnectServer(supportedVersions = [ConnectServer.ExpectedProtocolVersion, PROTOCOL_VERSION])
+    version = connectServer.negotiate([PROTOCOL_VERSION])
+
+A server that does not offer it, or a client that does not ask for it,
+keeps to full snapshots.  A DeltaDecoder reads both kinds of tick, so a
+client that asked for deltas also works with a server that ignores the
+request.
+"""
+
+import json
+
+from api.gameinfo import GameInfo, GameInfoDecoder, toJSON
+from api.vector2 import Vector2
+
+
+PROTOCOL_VERSION = "1.5"
+
+# Decimal places kept for the floats of a delta, by field name, and for any
+# other float.
+PRECISION = {'position': 2, 'facingDirection': 3}
+DEFAULT_PRECISION = 2
+
+
+def quantize(value, places):
+    if isinstance(value, Vector2):
+        return [round(value.x, places), round(value.y, places)]
+    if isinstance(value, float):
+        return round(value, places)
+    return value
+
+
+class DeltaEncoder(object):
+    """
+        Encodes the GameInfo of each tick for one client, sending only what
+    changed since the last tick.  It keeps the rounded fields it sent for
+    every bot and flag, which is what the client has, so a change smaller
+    than the precision is not sent and the client is never off by more
+    than the rounding.  Keyframes are rounded the same way, for that to
+    hold after them too.
+    """
+
+    def __init__(self, keyframeInterval = 50):
+        self.keyframeInterval = keyframeInterval
+        """
+        Every this many ticks the full GameInfo is sent
+        """
+        self.ticks = 0
+        self.sent = {'bots': {}, 'flags': {}}
+
+    def fields(self, obj):
+        value = toJSON(obj)['__value__']
+        return dict((key, quantize(v, PRECISION.get(key, DEFAULT_PRECISION))) for key, v in value.iteritems())
+
+    def encode(self, game):
+        """
+        Return the line to send after <tick> for this state of the game.
+        """
+        keyframe = self.ticks % self.keyframeInterval == 0
+        self.ticks += 1
+
+        changed = {'bots': {}, 'flags': {}}
+        current = {'bots': {}, 'flags': {}}
+        for kind, objects in [('bots', game.bots), ('flags', game.flags)]:
+            sent = self.sent[kind]
+            for name, obj in objects.iteritems():
+                fields = current[kind][name] = self.fields(obj)
+                last = sent.get(name)
+                if last is None:
+                    changed[kind][name] = fields
+                else:
+                    diff = dict((key, v) for key, v in fields.iteritems() if last.get(key) != v)
+                    if diff:
+                        changed[kind][name] = diff
+                sent[name] = fields
+
+        if keyframe:
+            value = toJSON(game)
+            value['__value__'] = dict(value['__value__'],
+                bots = dict((name, {'__class__': 'BotInfo', '__value__': f}) for name, f in current['bots'].iteritems()),
+                flags = dict((name, {'__class__': 'FlagInfo', '__value__': f}) for name, f in current['flags'].iteritems()))
+            return json.dumps(value, default = toJSON, separators = (',', ':'))
+        return json.dumps({'__class__': 'GameInfoDelta',
+                           '__value__': { 'match': game.match, 'bots': changed['bots'], 'flags': changed['flags'] }},
+                          default = toJSON, separators = (',', ':'))
+
+
+class DeltaDecoder(GameInfoDecoder):
+    """
+        Decodes the ticks of a 1.5 server, keyframes and deltas alike.  It
+    keeps the last fields received for every bot and flag, and builds a
+    delta into a GameInfo holding only the bots and flags that changed, as
+    the full objects.  Like a decoded snapshot it is meant for mergeGameInfo,
+    it has no teams:
+
+        decoder = DeltaDecoder()
+        mergeGameInfo(commander.game, decoder.decode(line))
+    """
+
+    def __init__(self):
+        super(DeltaDecoder, self).__init__()
+        self.received = {'bots': {}, 'flags': {}}
+        self.decoders['GameInfoDelta'] = self.decodeGameInfoDelta
+
+    def decodeGameInfo(self, value):
+        for kind in ['bots', 'flags']:
+            self.received[kind] = dict((name, dict(obj['__value__'])) for name, obj in value[kind].iteritems())
+        return super(DeltaDecoder, self).decodeGameInfo(value)
+
+    def decodeGameInfoDelta(self, value):
+        name = self.name
+        game = GameInfo()
+        game.match = self.value(value['match'])
+
+        received = self.received['bots']
+        names, values = [], []
+        for botName, fields in value['bots'].iteritems():
+            received.setdefault(botName, {}).update(fields)
+            names.append(name(botName))
+            values.append(received[botName])
+        game.bots = dict(zip(names, self.decodeBots(values)))
+
+        received = self.received['flags']
+        for flagName, fields in value['flags'].iteritems():
+            received.setdefault(flagName, {}).update(fields)
+            game.flags[name(flagName)] = self.decodeFlagInfo(received[flagName])
+        return game
@@ -0,0 +1,91 @@
+"""
+Fake games shared by the unit tests and benchmark.py, and the code the
+merge of tick updates replaced, kept to check it against.
+"""
+
+import json
+
+from api.vector2 import Vector2
+from api.gameinfo import GameInfo, TeamInfo, FlagInfo, BotInfo, MatchInfo, toJSON, fixupReferences, mergeMatchInfo
+
+
+def syntheticGame(botsPerTeam, rng):
+    """
+    Return a GameInfo with two teams of botsPerTeam bots each, with references
+    between objects as the game sends them, for timing the network updates.
+    """
+    game = GameInfo()
+    game.match = MatchInfo()
+    for name in ['Red', 'Blue']:
+        team = TeamInfo(name)
+        team.flag = FlagInfo(name + 'Flag')
+        team.flag.team = team
+        team.flagScoreLocation = team.flagSpawnLocation = Vector2(rng.uniform(0, 88), rng.uniform(0, 50))
+        team.botSpawnArea = (Vector2(0, 0), Vector2(4, 4))
+        for i in range(botsPerTeam):
+            bot = BotInfo('{}{}'.format(name, i))
+            bot.team = team
+            team.members.append(bot)
+        game.addTeam(team)
+        game.match.scores[name] = 0
+    game.team, game.enemyTeam = game.teams['Red'], game.teams['Blue']
+    return game
+
+
+
+def tickGameInfo(game, rng, time):
+    """
+    Move the bots of the game at random and return the encoded GameInfo of the
+    next tick, as the game server would send it.
+    """
+    bots = game.bots.values()
+    for bot in bots:
+        bot.health = rng.choice([0, 100, 100, 100])
+        bot.state = rng.choice([BotInfo.STATE_IDLE, BotInfo.STATE_MOVING, BotInfo.STATE_ATTACKING, BotInfo.STATE_DEAD])
+        bot.position = Vector2(rng.uniform(0, 88), rng.uniform(0, 50))
+        bot.facingDirection = Vector2.randomUnitVector()
+        bot.seenlast = rng.uniform(0.1, 5.0)
+        enemies = [b for b in bots if b.team is not bot.team]
+        bot.visibleEnemies = rng.sample(enemies, rng.randint(0, min(3, len(enemies))))
+        bot.seenBy = rng.sample(enemies, rng.randint(0, min(3, len(enemies))))
+    game.match.timePassed = time
+    return json.dumps(game, default = toJSON)
+
+
+
+def stepGame(game, rng, moving, time):
+    """
+    Move a share of the bots of the game a little, as in one tick of play.
+    """
+    for bot in game.bots.values():
+        if bot.position is None:
+            bot.position, bot.facingDirection = Vector2(rng.uniform(1, 87), rng.uniform(1, 49)), Vector2(1.0, 0.0)
+        if rng.random() < moving:
+            bot.facingDirection = Vector2.randomUnitVector()
+            bot.position = bot.position + bot.facingDirection * rng.uniform(0.0, 0.6)
+            bot.state = rng.choice([BotInfo.STATE_MOVING, BotInfo.STATE_ATTACKING, BotInfo.STATE_CHARGING])
+            bot.seenlast = rng.uniform(0.1, 5.0)
+    game.match.timePassed = time
+
+
+def referenceMergeGameInfo(gameInfo, newGameInfo):
+    """
+    mergeGameInfo as it was, running fixupReferences on each bot and flag and
+    checking every bot of the game each time.
+    """
+    def fixup(obj):
+        for name, bot in gameInfo.bots.items():
+            assert bot is not None
+        fixupReferences(obj, gameInfo)
+
+    for newFlag in newGameInfo.flags.values():
+        flagInfo = gameInfo.flags[newFlag.name]
+        flagInfo.team, flagInfo.position = newFlag.team, newFlag.position
+        flagInfo.carrier, flagInfo.respawnTimer = newFlag.carrier, newFlag.respawnTimer
+        fixup(flagInfo)
+    for newBot in newGameInfo.bots.values():
+        botInfo = gameInfo.bots[newBot.name]
+        for name in ['team', 'health', 'state', 'position', 'facingDirection', 'seenlast', 'flag', 'visibleEnemies', 'seenBy']:
+            setattr(botInfo, name, getattr(newBot, name))
+        fixup(botInfo)
+    mergeMatchInfo(gameInfo, newGameInfo.match)
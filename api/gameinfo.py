@@ -1,7 +1,237 @@
+import json
+import math
 import random
+from collections import deque
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from api.vector2 import Vector2
 
+
+def distanceTransform(mask):
+    """
+    Return the Euclidean distance from every cell of the (width, height)
+    boolean array to the nearest True cell, infinite if there is none.
+    """
+    width, height = mask.shape
+    # The distance along y to the nearest True cell in the same column,
+    # scanning down and then up.
+    column = np.full(mask.shape, np.inf)
+    last = np.full(width, -np.inf)
+    for y in range(height):
+        last = np.where(mask[:, y], y, last)
+        column[:, y] = y - last
+    last = np.full(width, np.inf)
+    for y in reversed(range(height)):
+        last = np.where(mask[:, y], y, last)
+        column[:, y] = np.minimum(column[:, y], last - y)
+
+    # Then the closest of those columns along x.
+    x = np.arange(width, dtype = float)
+    squared = (x[:, np.newaxis] - x[np.newaxis, :]) ** 2
+    return np.sqrt((squared[:, :, np.newaxis] + column[np.newaxis, :, :] ** 2).min(axis = 1))
+
+
+class ClearanceMap(object):
+    """
+        Where a character of a given radius can stand in a level.  A point is
+    free if its cell has no block and it is at least `radius` away from the
+    blocks in the eight cells around it.  The map edge does not count as a
+    block.
+
+        For each cell the map stores the rectangle that stays clear of the
+    blocked sides, and which corners are cut off by blocked diagonals.  A
+    summed area table of the free area per cell lets it sample uniformly
+    from the free points in any box.
+    """
+
+    # Keep points this far inside the free area, so that they pass isFree
+    # after rounding.
+    EPSILON = 1e-6
+
+    def __init__(self, blockHeights, width, height, radius):
+        self.blockHeights = blockHeights
+        self.width, self.height = width, height
+        self.radius = radius
+
+        def blocked(x, y):
+            return 0 <= x < width and 0 <= y < height and blockHeights[x][y] > 0
+
+        # bounds[x + y*width] is (left, right, top, bottom, corners) in cell
+        # coordinates, or None for a blocked cell.  The corners are (dx, dy)
+        # pairs, for the diagonals that cut off a square of radius.
+        self.bounds = [None] * (width * height)
+        # area[y+1][x+1] is the free area of the cells left of and above (x, y), inclusive.
+        self.area = [[0.0] * (width + 1) for _ in range(height + 1)]
+        for y in range(height):
+            above, row = self.area[y], self.area[y + 1]
+            for x in range(width):
+                free = 0.0
+                if not blocked(x, y):
+                    left = radius if blocked(x - 1, y) else 0.0
+                    right = 1.0 - radius if blocked(x + 1, y) else 1.0
+                    top = radius if blocked(x, y - 1) else 0.0
+                    bottom = 1.0 - radius if blocked(x, y + 1) else 1.0
+                    corners = [(dx, dy) for dx in (-1, 1) for dy in (-1, 1)
+                               if blocked(x + dx, y + dy) and not blocked(x + dx, y) and not blocked(x, y + dy)]
+                    self.bounds[x + y * width] = (left, right, top, bottom, corners)
+                    free = max(right - left, 0.0) * max(bottom - top, 0.0) - len(corners) * radius * radius
+                row[x + 1] = row[x] + above[x + 1] - above[x] + free
+
+    def isFree(self, x, y):
+        """
+        Return True if a character can stand at (x, y), with the same checks
+        that LevelInfo.findRandomFreePositionInBox always made.
+        """
+        blockHeights, radius = self.blockHeights, self.radius
+        ix, iy = int(x), int(y)
+        # check if there are any blocks under current position
+        if blockHeights[ix][iy] > 0:
+            return False
+        left, right = (x - ix) < radius and ix > 0, (ix + 1 - x) < radius and ix < self.width - 1
+        top, bottom = (y - iy) < radius and iy > 0, (iy + 1 - y) < radius and iy < self.height - 1
+        # check if there are any blocks in the four cardinal directions
+        if (left and blockHeights[ix-1][iy] > 0) or (right and blockHeights[ix+1][iy] > 0):
+            return False
+        if (top and blockHeights[ix][iy-1] > 0) or (bottom and blockHeights[ix][iy+1] > 0):
+            return False
+        # check if there are any blocks in the four diagonals
+        if (left and top and blockHeights[ix-1][iy-1] > 0) or (right and top and blockHeights[ix+1][iy-1] > 0):
+            return False
+        if (left and bottom and blockHeights[ix-1][iy+1] > 0) or (right and bottom and blockHeights[ix+1][iy+1] > 0):
+            return False
+        return True
+
+    def boxArea(self, x0, y0, x1, y1):
+        """
+        Return the free area of the cells x0 <= x < x1, y0 <= y < y1.
+        """
+        area = self.area
+        return area[y1][x1] - area[y1][x0] - area[y0][x1] + area[y0][x0]
+
+    def sampleCell(self, x0, y0, x1, y1):
+        """
+        Pick one of the cells in the range at random, weighted by its free area.
+        """
+        u = random.random() * self.boxArea(x0, y0, x1, y1)
+        # The free area of the rows y0..y grows with y, binary search for the
+        # row holding u and then the same along that row.
+        low, high = y0, y1 - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.boxArea(x0, y0, x1, middle + 1) > u:
+                high = middle
+            else:
+                low = middle + 1
+        y = low
+        u -= self.boxArea(x0, y0, x1, y)
+        low, high = x0, x1 - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.boxArea(x0, y, middle + 1, y + 1) > u:
+                high = middle
+            else:
+                low = middle + 1
+        return low, y
+
+    def randomPosition(self, minX, minY, maxX, maxY, tries = 100):
+        """
+        Return a free point with minX <= x < maxX and minY <= y < maxY, drawn
+        uniformly from the free part of the box, or None if there is none.
+        """
+        # A point drawn from the whole box is as good as one drawn from its
+        # free part if it is free, and in the open that is the cheapest try.
+        x, y = minX + random.random() * (maxX - minX), minY + random.random() * (maxY - minY)
+        if self.isFree(x, y):
+            return Vector2(x, y)
+
+        x0, y0 = max(int(minX), 0), max(int(minY), 0)
+        x1, y1 = min(int(math.ceil(maxX)), self.width), min(int(math.ceil(maxY)), self.height)
+        if x0 >= x1 or y0 >= y1 or self.boxArea(x0, y0, x1, y1) < self.EPSILON:
+            return None
+
+        # Only the cells on the border of the box can reject a point, so
+        # this rarely takes more than a few tries.
+        for i in range(tries):
+            ix, iy = self.sampleCell(x0, y0, x1, y1)
+            bounds = self.bounds[ix + iy * self.width]
+            if bounds is None:
+                continue
+            left, right, top, bottom, _ = bounds
+            x = ix + left + random.random() * (right - left)
+            y = iy + top + random.random() * (bottom - top)
+            if minX <= x < maxX and minY <= y < maxY and self.isFree(x, y):
+                return Vector2(x, y)
+        return None
+
+    def closestInCell(self, x, y, ix, iy):
+        """
+        Return the free point of cell (ix, iy) closest to (x, y), or None if the cell is blocked.
+        """
+        bounds = self.bounds[ix + iy * self.width]
+        if bounds is None:
+            return None
+        left, right, top, bottom, corners = bounds
+        e, r = self.EPSILON, self.radius
+        px = min(max(x, ix + left + e), ix + right - e)
+        py = min(max(y, iy + top + e), iy + bottom - e)
+        for dx, dy in corners:
+            # Distance into the square cut off by this corner, along each axis.
+            inX = r - (px - ix) if dx < 0 else r - (ix + 1 - px)
+            inY = r - (py - iy) if dy < 0 else r - (iy + 1 - py)
+            if inX > 0 and inY > 0:
+                if inX < inY:
+                    px += (inX + e) * -dx
+                else:
+                    py += (inY + e) * -dy
+        return px, py
+
+    def nearestPosition(self, x, y):
+        """
+        Return the free point closest to (x, y), or None if the level has no
+        free point.  The search runs over rings of cells around the cell of
+        (x, y), and stops once no further ring can hold a closer point.
+        """
+        width, height = self.width, self.height
+        if 0 <= x < width and 0 <= y < height and self.isFree(x, y):
+            return Vector2(x, y)
+
+        def distance(x0, y0, x1, y1):
+            # From (x, y) to the box [x0, x1] x [y0, y1].
+            return math.hypot(max(x0 - x, x - x1, 0.0), max(y0 - y, y - y1, 0.0))
+
+        cx = min(max(int(math.floor(x)), 0), width - 1)
+        cy = min(max(int(math.floor(y)), 0), height - 1)
+        best, bestDistance = None, float('inf')
+        for k in range(max(width, height)):
+            left, right = max(cx - k, 0), min(cx + k, width - 1) + 1
+            top, bottom = max(cy - k, 0), min(cy + k, height - 1) + 1
+            # The ring is made of the sides of the square that are in the level.
+            sides = []
+            if cy - k >= 0: sides.append(distance(left, cy - k, right, cy - k + 1))
+            if cy + k < height: sides.append(distance(left, cy + k, right, cy + k + 1))
+            if cx - k >= 0: sides.append(distance(cx - k, top, cx - k + 1, bottom))
+            if cx + k < width: sides.append(distance(cx + k, top, cx + k + 1, bottom))
+            if not sides or min(sides) >= bestDistance:
+                break
+            for iy in range(top, bottom):
+                step = 1 if abs(iy - cy) == k else 2 * k
+                for ix in range(cx - k, cx + k + 1, step):
+                    if not 0 <= ix < width:
+                        continue
+                    point = self.closestInCell(x, y, ix, iy)
+                    if point is None:
+                        continue
+                    d = math.hypot(point[0] - x, point[1] - y)
+                    if d < bestDistance and self.isFree(*point):
+                        best, bestDistance = point, d
+        return Vector2(*best) if best else None
+
+
 class LevelInfo(object):
     """
     Provides information about the level the game is played in.
@@ -76,10 +306,72 @@ class LevelInfo(object):
         The time (seconds) between bot respawns.
         """
 
+        self._clearance = None
+        self._arrays = (None, {})
+
 
     def clamp(self, x, minValue, maxValue):
         return max(minValue, min(x, maxValue))
 
+    def derivedArray(self, name, compute):
+        """
+        Return the array compute() derives from blockHeights, computing it
+        on first use and again once blockHeights is replaced.
+        """
+        key, arrays = self._arrays
+        if key != id(self.blockHeights):
+            arrays = {}
+            self._arrays = (id(self.blockHeights), arrays)
+        if name not in arrays:
+            arrays[name] = compute()
+            arrays[name].flags.writeable = False
+        return arrays[name]
+
+    @property
+    def blocks(self):
+        """
+        The block heights as a read-only (width, height) uint8 array, indexed
+        [x][y] like blockHeights.  Needs numpy.
+        """
+        return self.derivedArray('blocks', lambda: np.array(self.blockHeights, dtype = np.uint8).reshape(self.width, self.height))
+
+    @property
+    def walkable(self):
+        """
+        The (width, height) boolean array of the cells without a block.
+        """
+        return self.derivedArray('walkable', lambda: self.blocks == 0)
+
+    @property
+    def blocksSight(self):
+        """
+        The (width, height) boolean array of the cells with a block too high
+        to see or shoot over, height 2 or more.
+        """
+        return self.derivedArray('blocksSight', lambda: self.blocks >= 2)
+
+    @property
+    def wallDistance(self):
+        """
+        The (width, height) float array of the distance from each cell to the
+        nearest cell with a block, between cell centres.  It is 0 on blocks
+        and infinite everywhere on a level without any.
+        """
+        return self.derivedArray('wallDistance', lambda: distanceTransform(self.blocks > 0))
+
+    def clearance(self):
+        """
+        Return the ClearanceMap of the level for the characterRadius.  It is
+        built on first use, and again if the blocks or the radius change.
+        """
+        # pad the radius a little to ensure that the point is okay even after floating point errors
+        # introduced by sending this value across the network to the game server
+        radius = self.characterRadius + 0.01
+        key = (id(self.blockHeights), self.width, self.height, radius)
+        if self._clearance is None or self._clearance[0] != key:
+            self._clearance = (key, ClearanceMap(self.blockHeights, self.width, self.height, radius))
+        return self._clearance[1]
+
     def findRandomFreePositionInBox(self, area):
         """
         Find a random position for a character to move to in an area.
@@ -92,49 +384,14 @@ class LevelInfo(object):
         if (rangeX == 0.0) or (rangeY == 0.0):
             return None
 
-        # pad the radius a little to ensure that the point is okay even after floating point errors
-        # introduced by sending this value across the network to the game server
-        radius = self.characterRadius + 0.01
-
-        for i in range(0, 100):
-            x, y = random.random() * rangeX + minX, random.random() * rangeY + minY
-            ix, iy = int(x), int(y)
-            # check if there are any blocks under current position
-            if self.blockHeights[ix][iy] > 0:
-                continue
-            # check if there are any blocks in the four cardinal directions
-            if (x - ix) < radius and ix > 0 and self.blockHeights[ix-1][iy] > 0:
-                continue
-            if (ix + 1 - x) < radius and ix < self.width - 1 and self.blockHeights[ix+1][iy] > 0:
-                continue
-            if (y - iy) < radius and iy > 0 and self.blockHeights[ix][iy-1] > 0:
-                continue
-            if (iy + 1 - y) < radius and iy < self.height - 1 and self.blockHeights[ix][iy+1] > 0:
-                continue
-            # check if there are any blocks in the four diagonals
-            if (x - ix) < radius and (y - iy) < radius and ix > 0 and iy > 0 and self.blockHeights[ix-1][iy-1] > 0:
-                continue
-            if (ix + 1 - x) < radius and (y - iy) < radius and ix < self.width - 1 and iy > 0 and self.blockHeights[ix+1][iy-1] > 0:
-                continue
-            if (x - ix) < radius and (iy + 1 - y) < radius and ix > 0 and iy < self.height - 1 and self.blockHeights[ix-1][iy+1] > 0:
-                continue
-            if (ix + 1 - x) < radius and (iy + 1 - y) < radius and ix < self.width - 1 and iy < self.height - 1 and self.blockHeights[ix+1][iy+1] > 0:
-                continue
-            return Vector2(x, y)
-        return None
+        return self.clearance().randomPosition(minX, minY, maxX, maxY)
 
     def findNearestFreePosition(self, target):
         """
-        Find a free position near 'target' for a character to move to.
+        Find the free position closest to 'target' for a character to move to.
         None is returned if no position could be found.
         """
-        for r in range(1, 100):
-            areaMin = Vector2(target.x - r, target.y - r)
-            areaMax = Vector2(target.x + r, target.y + r)
-            position = self.findRandomFreePositionInBox((areaMin, areaMax))
-            if position:
-                return position
-        return None
+        return self.clearance().nearestPosition(target.x, target.y)
 
     @property
     def area(self):
@@ -204,6 +461,10 @@ class GameInfo(object):
         """
         The dictionary containing the FlagInfo object for each flag indexed by flag name
         """
+        self.changes = GameInfoChanges()
+        """
+        The GameInfoChanges collected by the merges since the last takeChanges
+        """
 
     @property
     def bots_alive(self):
@@ -239,6 +500,110 @@ class GameInfo(object):
             self.bots[bot.name] = bot
         self.flags[team.flag.name] = team.flag
 
+    def takeChanges(self):
+        """
+        Return what the updates merged since the last call changed, and start
+        collecting again.  Several updates can be merged between two ticks,
+        so call this once per tick rather than looking at the last merge.
+        When nothing was merged, as in games run locally, every bot and flag
+        is returned as changed.
+        """
+        changes = self.changes
+        if changes.events is None:
+            changes.events = self.match.cursor(0)
+        if not changes.merged:
+            changes.addAll(self)
+        changes.close()
+        self.changes = GameInfoChanges(self.match.cursor())
+        return changes
+
+
+class GameInfoChanges(object):
+    """
+        What merging updates into a GameInfo changed, so that commanders can
+    update what they derive from the game incrementally instead of rescanning
+    it each tick.  Each list holds the BotInfo or FlagInfo objects of the game
+    once, in the order they first changed.  The new combat events are read
+    through a cursor on the match, so they are only copied out when the
+    changes are taken.
+    """
+
+    def __init__(self, events = None):
+        self.moved = []
+        """
+        The bots whose position or facing direction changed
+        """
+        self.stateChanged = []
+        """
+        The bots whose state changed
+        """
+        self.healthChanged = []
+        """
+        The bots whose health changed
+        """
+        self.visibilityChanged = []
+        """
+        The bots whose visibleEnemies, seenBy or seenlast changed
+        """
+        self.flagsMoved = []
+        """
+        The flags whose position or carrier changed
+        """
+        self.events = events
+        """
+        The CombatEventCursor at the first new combat event, if any
+        """
+        self.taken = None
+        self.merged = False
+        """
+        Whether an update was merged since the changes were last taken.  If
+        not, the game was updated some other way and every bot and flag
+        counts as changed.
+        """
+
+    @property
+    def combatEvents(self):
+        """
+        The new MatchCombatEvents, in the order they happened.
+        """
+        if self.taken is not None:
+            return self.taken
+        return self.events.peek() if self.events else []
+
+    def close(self):
+        """
+        Stop following the match, keeping the combat events up to now.
+        """
+        self.taken = list(self.events.unseen()) if self.events else []
+
+    def add(self, changed, obj):
+        if obj not in changed:
+            changed.append(obj)
+
+    def addAll(self, gameInfo):
+        """
+        Count every bot and flag of gameInfo as changed.
+        """
+        for changed in [self.moved, self.stateChanged, self.healthChanged, self.visibilityChanged]:
+            for bot in gameInfo.bots.values():
+                self.add(changed, bot)
+        for flag in gameInfo.flags.values():
+            self.add(self.flagsMoved, flag)
+
+    @property
+    def bots(self):
+        """
+        The bots with any change, in the order they first changed.
+        """
+        bots = []
+        for changed in [self.moved, self.stateChanged, self.healthChanged, self.visibilityChanged]:
+            for bot in changed:
+                self.add(bots, bot)
+        return bots
+
+    def __nonzero__(self):
+        return bool(self.moved or self.stateChanged or self.healthChanged or self.visibilityChanged or self.flagsMoved or self.combatEvents)
+
 
 class TeamInfo(object):
     """
@@ -446,10 +811,37 @@ class MatchInfo(object):
         """
         Time in seconds since the beginning of this match
         """
-        self.combatEvents = []
+        self.combatEvents = CombatEventLog()
+
+    @property
+    def combatEvents(self):
         """
-        List of combat events that have occurred during this match.
+        The CombatEventLog of the combat events that have occurred during this match.
         """
+        return self._combatEvents
+
+    @combatEvents.setter
+    def combatEvents(self, events):
+        # Games run locally set a new list each update and append every event
+        # of the match to it again, which the log replays to add only the new ones.
+        if isinstance(events, CombatEventLog):
+            self._combatEvents = events
+        else:
+            self._combatEvents.replay(events)
+
+    def retain(self, capacity = None, window = None):
+        """
+        Retain only some of the combat events, see CombatEventLog.
+        """
+        self.combatEvents.retain(capacity, window)
+
+    def cursor(self, position = None):
+        """
+        Return a CombatEventCursor on the combat events of this match that
+        starts reading at the event with that number, or after the newest
+        event for None.
+        """
+        return CombatEventCursor(self, len(self.combatEvents) if position is None else position)
 
 
 class MatchCombatEvent(object):
@@ -486,6 +878,187 @@ class MatchCombatEvent(object):
         """
 
 
+class CombatEventLog(object):
+    """
+        The combat events of a match, kept in a ring buffer so that a long
+    game does not hold on to all of them.  With a `capacity` only the newest
+    events are retained, with a `window` only those that happened at most
+    that many seconds before the newest one.  Both default to keeping
+    everything.
+
+        Events are numbered from the start of the match, and len(), indexing
+    and slicing use those numbers like the list this replaces, so reading
+    combatEvents[index:] keeps working.  Instead of keeping an index, ask the
+    match for a cursor and read the events it has not seen yet each tick:
+
+        self.events = self.game.match.cursor(0)
+        ...
+        for event in self.events.unseen():
+    """
+
+    def __init__(self, events = (), capacity = None, window = None):
+        self.capacity = capacity
+        """
+        The number of events retained, or None for no limit
+        """
+        self.window = window
+        """
+        How many seconds of events before the newest one are retained, or None for no limit
+        """
+        self.events = deque(maxlen = capacity)
+        """
+        The retained events, oldest first
+        """
+        self.count = 0
+        """
+        The number of events ever added
+        """
+        self.replayed = None
+        """
+        The number of events handed out again since replay was called, or None
+        """
+        self.extend(events)
+
+    @property
+    def first(self):
+        """
+        The number of the oldest retained event.
+        """
+        return self.count - len(self.events)
+
+    def append(self, event):
+        if self.replayed is not None:
+            self.replayed += 1
+            if self.replayed <= self.count:
+                return
+        self.events.append(event)
+        self.count += 1
+        if self.window is not None:
+            self.expire()
+
+    def extend(self, events):
+        events = list(events)
+        if self.replayed is not None:
+            known = min(max(self.count - self.replayed, 0), len(events))
+            self.replayed += len(events)
+            events = events[known:]
+        self.events.extend(events)
+        self.count += len(events)
+        if self.window is not None:
+            self.expire()
+
+    def expire(self):
+        events = self.events
+        if events:
+            oldest = events[-1].time - self.window
+            while events[0].time < oldest:
+                events.popleft()
+
+    def replay(self, events):
+        """
+        Start over from the first event of the match, with the events given
+        and any appended after them, skipping those that were already added.
+        Games run locally hand out all the events of the match each update.
+        """
+        self.replayed = 0
+        self.extend(events)
+
+    def retain(self, capacity = None, window = None):
+        """
+        Change how many events are retained, dropping the ones that are
+        already out of range.
+        """
+        self.capacity, self.window = capacity, window
+        self.events = deque(self.events, maxlen = capacity)
+        if window is not None:
+            self.expire()
+
+    def since(self, start, stop = None):
+        """
+        Return the retained events numbered from start up to stop.
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        start = max(start, self.first)
+        if start >= stop:
+            return []
+        offset = self.first
+        return list(islice(self.events, start - offset, stop - offset))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            assert step == 1, "combat events can only be sliced in order"
+            return self.since(start, stop)
+        if index < 0:
+            index += self.count
+        if not self.first <= index < self.count:
+            raise IndexError("combat event {} is not retained".format(index))
+        return self.events[index - self.first]
+
+
+class CombatEventCursor(object):
+    """
+        A position in the combat events of a match, for one reader to go
+    through the events it has not seen yet.  The log is looked up on the
+    match each time, so the cursor keeps up when it is replaced.  Events
+    that dropped out of the log before the reader got to them are counted in
+    `missed`.
+    """
+
+    def __init__(self, match, position):
+        self.match = match
+        self.position = position
+        """
+        The number of the next event to read
+        """
+        self.missed = 0
+        """
+        How many events were no longer retained when they were to be read
+        """
+
+    @property
+    def log(self):
+        return self.match.combatEvents
+
+    @property
+    def pending(self):
+        """
+        The number of retained events that have not been read.
+        """
+        log = self.log
+        return max(len(log) - max(self.position, log.first), 0)
+
+    def peek(self):
+        """
+        Return the unread events without marking them as read.
+        """
+        return list(self.log[self.position:])
+
+    def unseen(self):
+        """
+        Iterate over the unread events, marking each as read as it is returned.
+        """
+        while self.position < len(self.log):
+            log = self.log
+            if self.position < log.first:
+                self.missed += log.first - self.position
+                self.position = log.first
+            event = log[self.position]
+            self.position += 1
+            yield event
+
+    def skip(self):
+        """
+        Mark all the events up to now as read.
+        """
+        self.position = len(self.log)
+
 
 def toJSON(python_object):
     if isinstance(python_object, Vector2):
@@ -533,7 +1106,7 @@ def toJSON(python_object):
     if isinstance(python_object, MatchInfo):
         match = python_object
         return {'__class__': 'MatchInfo',
-                '__value__': { 'scores': match.scores, 'timeRemaining': match.timeRemaining, 'timeToNextRespawn': match.timeToNextRespawn, 'timePassed': match.timePassed, 'combatEvents': match.combatEvents }}
+                '__value__': { 'scores': match.scores, 'timeRemaining': match.timeRemaining, 'timeToNextRespawn': match.timeToNextRespawn, 'timePassed': match.timePassed, 'combatEvents': list(match.combatEvents) }}
 
     if isinstance(python_object, MatchCombatEvent):
         combatEvent = python_object
@@ -639,7 +1212,7 @@ def fromJSON(dct):
             match.timeRemaining = value['timeRemaining']
             match.timeToNextRespawn = value['timeToNextRespawn']
             match.timePassed = value['timePassed']
-            match.combatEvents = value['combatEvents'] # TODO: check this deserialization
+            match.combatEvents = CombatEventLog(value['combatEvents'])
             return match
 
         if dct['__class__'] == 'MatchCombatEvent':
@@ -650,11 +1223,161 @@ def fromJSON(dct):
     return dct
 
 
+class InternedNames(dict):
+    """
+    The str for each name decoded from the protocol, interned the first time it is looked up.
+    """
 
-def fixupReferences(obj, game):
-    for name, bot in game.bots.items():
-        assert bot is not None
+    def __missing__(self, text):
+        name = self[text] = intern(text.encode('utf-8'))
+        return name
 
+
+class GameInfoDecoder(object):
+    """
+        A faster way to decode the messages of one match than json.loads with
+    fromJSON as the object_hook.  The message is parsed without a hook, then
+    each object is built by the method for its class, looked up in a table,
+    which knows where the nested objects are instead of testing every dict.
+    Team, bot and flag names are encoded and interned once per decoder, and
+    the positions and facing directions of all the bots in a message are
+    converted together:
+
+        decoder = GameInfoDecoder()
+        game = decoder.decode(message)
+
+        The objects are the same as fromJSON builds, with the references
+    still to be fixed up or merged.
+    """
+
+    def __init__(self):
+        self.names = InternedNames()
+        """
+        The interned str for each name seen so far
+        """
+        self.name = self.names.__getitem__
+        self.decoders = {
+            'LevelInfo': self.decodeLevelInfo,
+            'GameInfo': self.decodeGameInfo,
+            'TeamInfo': self.decodeTeamInfo,
+            'FlagInfo': self.decodeFlagInfo,
+            'BotInfo': self.decodeBotInfo,
+            'MatchInfo': self.decodeMatchInfo,
+            'MatchCombatEvent': self.decodeMatchCombatEvent,
+        }
+
+    def decode(self, message):
+        """
+        Decode one line of the protocol.
+        """
+        return self.value(json.loads(message))
+
+    def value(self, dct):
+        decoder = self.decoders.get(dct.get('__class__'))
+        return decoder(dct['__value__']) if decoder else dct
+
+    def decodeLevelInfo(self, value):
+        name = self.name
+        level = LevelInfo()
+        level.width = value['width']
+        level.height = value['height']
+        level.blockHeights = value['blockHeights']
+        level.teamNames = [name(n) for n in value['teamNames']]
+        level.flagSpawnLocations = dict((name(n), toVector2(p)) for n, p in value['flagSpawnLocations'].iteritems())
+        level.flagScoreLocations = dict((name(n), toVector2(p)) for n, p in value['flagScoreLocations'].iteritems())
+        level.botSpawnAreas = dict((name(n), (toVector2(a[0]), toVector2(a[1]))) for n, a in value['botSpawnAreas'].iteritems())
+        level.characterRadius = value['characterRadius']
+        level.fieldOfViewAngles = value['fieldOfViewAngles']
+        level.firingDistance = value['firingDistance']
+        level.walkingSpeed = value['walkingSpeed']
+        level.runningSpeed = value['runningSpeed']
+        level.gameLength = value['gameLength']
+        level.initializationTime = value['initializationTime']
+        level.respawnTime = value['respawnTime']
+        return level
+
+    def decodeGameInfo(self, value):
+        name, decode = self.name, self.value
+        game = GameInfo()
+        game.match = decode(value['match'])
+        game.teams = dict((name(n), decode(t)) for n, t in value['teams'].iteritems())
+        game.team = name(value['team']) # needs fixup
+        game.enemyTeam = name(value['enemyTeam']) # needs fixup
+        bots = value['bots']
+        game.bots = dict(zip([name(n) for n in bots], self.decodeBots([b['__value__'] for b in bots.itervalues()])))
+        game.flags = dict((name(n), decode(f)) for n, f in value['flags'].iteritems())
+        return game
+
+    def decodeTeamInfo(self, value):
+        name = self.name
+        team = TeamInfo(name(value['name']))
+        team.members = [name(b) for b in value['members']] # needs fixup
+        team.flag = name(value['flag']) # needs fixup
+        team.flagScoreLocation = toVector2(value['flagScoreLocation'])
+        team.flagSpawnLocation = toVector2(value['flagSpawnLocation'])
+        team.botSpawnArea = (toVector2(value['botSpawnArea'][0]), toVector2(value['botSpawnArea'][1]))
+        return team
+
+    def decodeFlagInfo(self, value):
+        name = self.name
+        flag = FlagInfo(name(value['name']))
+        flag.team = name(value['team']) # needs fixup
+        flag.position = toVector2(value['position'])
+        flag.carrier = name(value['carrier']) if value['carrier'] else None # needs fixup
+        flag.respawnTimer = value['respawnTimer']
+        return flag
+
+    def decodeBots(self, values):
+        """
+        Build the BotInfo for each of the values, converting all their
+        positions and facing directions in one go.
+        """
+        name, new = self.name, BotInfo.__new__
+        bots = []
+        pairs = []
+        for value in values:
+            # All the attributes of BotInfo.__init__ are set at once, which
+            # takes less than half the time of constructing the bot.
+            bot = new(BotInfo)
+            bot.__dict__ = {
+                'name': name(value['name']),
+                'team': name(value['team']), # needs fixup
+                'health': value['health'],
+                'state': value['state'],
+                'seenlast': value['seenlast'] if value['seenlast'] else None,
+                'flag': name(value['flag']) if value['flag'] else None, # needs fixup
+                'visibleEnemies': [name(b) for b in value['visibleEnemies']], # needs fixup
+                'seenBy': [name(b) for b in value['seenBy']], # needs fixup
+            }
+            bots.append(bot)
+            pairs.append(value['position'])
+            pairs.append(value['facingDirection'])
+        vectors = Vector2.fromPairs(pairs)
+        for i, bot in enumerate(bots):
+            bot.position = vectors[2 * i]
+            bot.facingDirection = vectors[2 * i + 1]
+        return bots
+
+    def decodeBotInfo(self, value):
+        return self.decodeBots([value])[0]
+
+    def decodeMatchInfo(self, value):
+        name = self.name
+        match = MatchInfo()
+        match.scores = dict((name(n), score) for n, score in value['scores'].iteritems())
+        match.timeRemaining = value['timeRemaining']
+        match.timeToNextRespawn = value['timeToNextRespawn']
+        match.timePassed = value['timePassed']
+        match.combatEvents = CombatEventLog([self.value(e) for e in value['combatEvents']])
+        return match
+
+    def decodeMatchCombatEvent(self, value):
+        # subject and instigator need fixup
+        instigator = self.name(value['instigator']) if value['instigator'] else value['instigator']
+        return MatchCombatEvent(value['type'], self.name(value['subject']), instigator, value['time'])
+
+
+def fixupReferences(obj, game):
     if isinstance(obj, LevelInfo):
         pass
 
@@ -728,28 +1451,53 @@ def fixupReferences(obj, game):
             assert False, "Unknown event type"
 
 def fixupGameInfoReferences(obj):
+    for name, bot in obj.bots.items():
+        assert bot is not None
     fixupReferences(obj, obj)
+    # the events of the initial game count as new for the first tick
+    obj.changes = GameInfoChanges(obj.match.cursor(0))
+
+# The merge functions resolve the names in a decoded update through the
+# bots, flags and teams dictionaries of the game they merge into, instead
+# of running fixupReferences on every object.
 
 def mergeFlagInfo(gameInfo, newFlagInfo):
     flagInfo = gameInfo.flags[newFlagInfo.name]
-    flagInfo.team         = newFlagInfo.team
+    if flagInfo is newFlagInfo:
+        # already decoded into the game by mergingFromJSON
+        return
+    carrier = gameInfo.bots[newFlagInfo.carrier] if newFlagInfo.carrier else None
+    if flagInfo.position != newFlagInfo.position or flagInfo.carrier is not carrier:
+        gameInfo.changes.add(gameInfo.changes.flagsMoved, flagInfo)
+    flagInfo.team         = gameInfo.teams[newFlagInfo.team]
     flagInfo.position     = newFlagInfo.position
-    flagInfo.carrier      = newFlagInfo.carrier
+    flagInfo.carrier      = carrier
     flagInfo.respawnTimer = newFlagInfo.respawnTimer
-    fixupReferences(flagInfo, gameInfo)
 
 def mergeBotInfo(gameInfo, newBotInfo):
     botInfo = gameInfo.bots[newBotInfo.name]
-    botInfo.team            = newBotInfo.team
+    if botInfo is newBotInfo:
+        return
+    bots, changes = gameInfo.bots, gameInfo.changes
+    visibleEnemies = [bots[b] for b in newBotInfo.visibleEnemies]
+    seenBy = [bots[b] for b in newBotInfo.seenBy]
+    if botInfo.position != newBotInfo.position or botInfo.facingDirection != newBotInfo.facingDirection:
+        changes.add(changes.moved, botInfo)
+    if botInfo.state != newBotInfo.state:
+        changes.add(changes.stateChanged, botInfo)
+    if botInfo.health != newBotInfo.health:
+        changes.add(changes.healthChanged, botInfo)
+    if botInfo.visibleEnemies != visibleEnemies or botInfo.seenBy != seenBy or botInfo.seenlast != newBotInfo.seenlast:
+        changes.add(changes.visibilityChanged, botInfo)
+    botInfo.team            = gameInfo.teams[newBotInfo.team]
     botInfo.health          = newBotInfo.health
     botInfo.state           = newBotInfo.state
     botInfo.position        = newBotInfo.position
     botInfo.facingDirection = newBotInfo.facingDirection
     botInfo.seenlast        = newBotInfo.seenlast
-    botInfo.flag            = newBotInfo.flag
-    botInfo.visibleEnemies  = newBotInfo.visibleEnemies
-    botInfo.seenBy          = newBotInfo.seenBy
-    fixupReferences(botInfo, gameInfo)
+    botInfo.flag            = gameInfo.flags[newBotInfo.flag] if newBotInfo.flag else None
+    botInfo.visibleEnemies  = visibleEnemies
+    botInfo.seenBy          = seenBy
 
 def mergeMatchInfo(gameInfo, newMatchInfo):
     matchInfo = gameInfo.match
@@ -761,6 +1509,10 @@ def mergeMatchInfo(gameInfo, newMatchInfo):
     matchInfo.combatEvents.extend(newMatchInfo.combatEvents)
 
 def mergeGameInfo(gameInfo, newGameInfo):
+    """
+    Merge a decoded update into gameInfo and return gameInfo.changes, the
+    GameInfoChanges collected since the commander last took them.
+    """
     for newFlag in newGameInfo.flags.values():
         mergeFlagInfo(gameInfo, newFlag)
 
@@ -768,5 +1520,26 @@ def mergeGameInfo(gameInfo, newGameInfo):
         mergeBotInfo(gameInfo, newBot)
 
     mergeMatchInfo(gameInfo, newGameInfo.match)
+    gameInfo.changes.merged = True
+    return gameInfo.changes
 
 
+def mergingFromJSON(gameInfo):
+    """
+    Return an object_hook for json.loads that merges the bots and flags of a
+    tick update into gameInfo while the message is decoded, and hands back
+    the existing objects.  mergeGameInfo then only has the match to merge:
+
+        update = json.loads(message, object_hook = mergingFromJSON(game))
+        mergeGameInfo(game, update)
+    """
+    def objectHook(dct):
+        obj = fromJSON(dct)
+        if isinstance(obj, BotInfo) and obj.name in gameInfo.bots:
+            mergeBotInfo(gameInfo, obj)
+            return gameInfo.bots[obj.name]
+        if isinstance(obj, FlagInfo) and obj.name in gameInfo.flags:
+            mergeFlagInfo(gameInfo, obj)
+            return gameInfo.flags[obj.name]
+        return obj
+    return objectHook
@@ -3,9 +3,12 @@ import sys
 class ConnectServer(object):
     ExpectedProtocolVersion = "1.4"
 
-    def __init__(self, protocolVersion = ExpectedProtocolVersion):
+    def __init__(self, protocolVersion = ExpectedProtocolVersion, supportedVersions = None):
         super(ConnectServer, self).__init__()
         self.protocolVersion = protocolVersion
+        # Clients that do not negotiate get protocolVersion, the others can
+        # pick any of these in their ConnectClient.
+        self.supportedVersions = supportedVersions or [protocolVersion]
 
     def validate(self):
         if self.protocolVersion != self.ExpectedProtocolVersion:
@@ -13,41 +16,56 @@ class ConnectServer(object):
             return False
         return True
 
+    def negotiate(self, versions):
+        """
+        Return the first of the versions the client can read that the server
+        supports, or the base protocol version if there is none.
+        """
+        for version in versions:
+            if version in self.supportedVersions:
+                return version
+        return self.protocolVersion
+
     def __str__(self):
         return "ConnectServer"
 
 
 class ConnectClient(object):
-    def __init__(self, commanderName, language):
+    def __init__(self, commanderName, language, protocolVersion = ConnectServer.ExpectedProtocolVersion):
         super(ConnectClient, self).__init__()
         self.commanderName = commanderName
         self.language = language
+        # The version chosen with ConnectServer.negotiate, servers that do
+        # not negotiate ignore it.
+        self.protocolVersion = protocolVersion
 
     def __str__(self):
-        return "ConnectClient commanderName = {}, language = {}".format(self.commanderName, self.language)
+        return "ConnectClient commanderName = {}, language = {}, protocolVersion = {}".format(self.commanderName, self.language, self.protocolVersion)
 
 
 def toJSON(python_object):
     if isinstance(python_object, ConnectServer):
         connect = python_object
         return {'__class__': 'ConnectServer',
-                '__value__': { 'protocolVersion': connect.protocolVersion }}
+                '__value__': { 'protocolVersion': connect.protocolVersion, 'supportedVersions': connect.supportedVersions }}
 
     if isinstance(python_object, ConnectClient):
         connect = python_object
         return {'__class__': 'ConnectClient',
-                '__value__': { 'commanderName': connect.commanderName, 'language': connect.language }}
+                '__value__': { 'commanderName': connect.commanderName, 'language': connect.language, 'protocolVersion': connect.protocolVersion }}
 
 
 def fromJSON(dct):
     if '__class__' in dct:
         if dct['__class__'] == 'ConnectServer':
             value = dct['__value__']
-            return ConnectServer(value['protocolVersion'].encode('utf-8'))
+            supportedVersions = [v.encode('utf-8') for v in value.get('supportedVersions', [])]
+            return ConnectServer(value['protocolVersion'].encode('utf-8'), supportedVersions)
 
         if dct['__class__'] == 'ConnectClient':
             value = dct['__value__']
-            return ConnectClient(value['commanderName'].encode('utf-8'), value['language'].encode('utf-8'))
+            protocolVersion = value.get('protocolVersion', ConnectServer.ExpectedProtocolVersion)
+            return ConnectClient(value['commanderName'].encode('utf-8'), value['language'].encode('utf-8'), protocolVersion.encode('utf-8'))
 
     return dct
 
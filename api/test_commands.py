@@ -0,0 +1,106 @@
+import json
+import random
+import logging
+import unittest
+
+from api import Commander, Vector2, commands
+from api.gameinfo import BotInfo
+
+from api.fixtures import syntheticGame
+
+
+class TestCommandQueue(unittest.TestCase):
+
+    def setUp(self):
+        class Issuer(Commander):
+            pass
+        logging.getLogger('Issuer').addHandler(logging.NullHandler())
+
+        self.rng = random.Random(0)
+        self.game = syntheticGame(5, self.rng)
+        self.commander = Issuer('test')
+        self.commander.game = self.game
+        for bot in self.game.bots.values():
+            bot.state = BotInfo.STATE_IDLE
+
+    def testCoalescing(self):
+        """
+        A commander that issues several commands per bot and tick, often the
+        order the bot already follows: each bot must end up with the order
+        it was given last, as if every command had been sent.
+        """
+        rng, commander, bots = self.rng, self.commander, self.game.team.members
+        targets = [Vector2(rng.uniform(1, 87), rng.uniform(1, 49)) for _ in range(8)]
+        following = {}      # the order each bot carries out, as the game sees it
+        expected = {}       # what it would be with every command sent
+        for tick in range(200):
+            for bot in bots:
+                for _ in range(rng.randint(1, 3)):
+                    if bot.name in expected and rng.random() < 0.5:
+                        order = expected[bot.name]
+                    else:
+                        order = (rng.choice([commands.Move, commands.Attack, commands.Charge]), rng.choice(targets))
+                    commander.issue(order[0], bot, order[1], description = 'order')
+                    expected[bot.name] = order
+
+            self.assertEqual(len(set(command.botId for command in commander.commandQueue)), len(commander.commandQueue))
+            lines = commands.encodeCommands(commander.commandQueue).split('\n')
+            self.assertEqual(lines[0::2], ['<command>'] * len(commander.commandQueue) + [''])
+            self.assertEqual([json.loads(line) for line in lines[1::2]],
+                             [json.loads(json.dumps(command, default = commands.toJSON)) for command in commander.commandQueue])
+
+            # The game restarts each bot that was sent an order, which then
+            # moves for a few ticks and stands idle once it arrives.
+            for command in commander.commandQueue:
+                following[command.botId] = (command.__class__, command.target[0])
+            restarted = set(command.botId for command in commander.commandQueue)
+            commander.clearCommandQueue()
+            for bot in bots:
+                if bot.name in restarted:
+                    bot.state = BotInfo.STATE_MOVING
+                elif rng.random() < 0.1:
+                    bot.state = BotInfo.STATE_IDLE
+                self.assertEqual(following.get(bot.name), expected.get(bot.name), 'tick {}: {} follows the wrong order'.format(tick, bot.name))
+
+
+class TestEncode(unittest.TestCase):
+
+    def orders(self):
+        rng = random.Random(0)
+        path = [Vector2(rng.uniform(1, 87), rng.uniform(1, 49)) for _ in range(40)]
+        yield commands.Defend('Red0', Vector2(0.6, -0.8), description = 'defend')
+        yield commands.Defend('Red1', [(Vector2(1, 0), 1.5), (Vector2(0, 1), 2.0)], description = 'look around')
+        yield commands.Move('Red2', path, description = 'sneak')
+        yield commands.Attack('Red3', path[:5], lookAt = Vector2(10.25, 3.5), description = 'attack')
+        yield commands.Attack('Red4', path[0], description = u'\xfcber')
+        yield commands.Charge('Red5', path[::10] + [path[-1]], description = 'charge')
+
+    def testEncode(self):
+        """
+        Command.encode must decode to the same message as json.dumps with
+        toJSON, both the first time and from its cache.
+        """
+        for command in self.orders():
+            expected = json.loads(json.dumps(command, default = commands.toJSON))
+            self.assertEqual(json.loads(command.encode()), expected)
+            self.assertEqual(json.loads(command.encode()), expected)
+
+    def testCacheCleared(self):
+        for command in self.orders():
+            command.encode()
+            command.description = 'changed'
+            self.assertEqual(json.loads(command.encode()), json.loads(json.dumps(command, default = commands.toJSON)))
+
+    def testNonFinite(self):
+        """
+        Waypoints at infinity or NaN must be written as json.dumps writes them.
+        """
+        inf, nan = float('inf'), float('nan')
+        for path in [[Vector2(inf, 1.0)], [Vector2(2.0, 3.0), Vector2(-inf, nan)], [Vector2(1e308, 0.0), Vector2(1e308, 0.0)]]:
+            self.assertEqual(commands.encodeWaypoints(path), json.dumps([[v.x, v.y] for v in path]))
+            command = commands.Move('Red0', path)
+            self.assertEqual(command.encode(), json.dumps(command, default = commands.toJSON))
+
+
+if __name__ == '__main__':
+    unittest.main()
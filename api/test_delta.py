@@ -0,0 +1,52 @@
+import json
+import random
+import unittest
+
+from api.gameinfo import fromJSON, toJSON, fixupGameInfoReferences, mergeGameInfo
+from api.delta import DeltaEncoder, DeltaDecoder, PRECISION, DEFAULT_PRECISION
+
+from api.fixtures import syntheticGame, stepGame
+
+
+def fields(game):
+    value = json.loads(json.dumps(game, default = toJSON))['__value__']
+    return dict((kind, dict((name, obj['__value__']) for name, obj in value[kind].items())) for kind in ['bots', 'flags'])
+
+
+def close(a, b, places):
+    if isinstance(a, list) and a and isinstance(a[0], float):
+        return all(close(x, y, places) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= 0.5 * 10 ** -places + 1e-9
+    return a == b
+
+
+class TestDelta(unittest.TestCase):
+
+    def testMatch(self):
+        """
+        After each tick the commander must have the same game as the server,
+        with the floats up to the rounding of the deltas.
+        """
+        for botsPerTeam in [1, 5, 20]:
+            for moving in [0.1, 0.5, 1.0]:
+                rng = random.Random(botsPerTeam)
+                server = syntheticGame(botsPerTeam, rng)
+                stepGame(server, rng, 1.0, 0.0)
+                game = json.loads(json.dumps(server, default = toJSON), object_hook = fromJSON)
+                fixupGameInfoReferences(game)
+                encoder, decoder = DeltaEncoder(keyframeInterval = 10), DeltaDecoder()
+
+                for tick in range(30):
+                    stepGame(server, rng, moving, 0.1 * tick)
+                    mergeGameInfo(game, decoder.decode(encoder.encode(server)))
+                    expected, received = fields(server), fields(game)
+                    for kind in expected:
+                        for name, value in expected[kind].items():
+                            for key in value:
+                                self.assertTrue(close(value[key], received[kind][name][key], PRECISION.get(key, DEFAULT_PRECISION)),
+                                                '{} of {} differs at tick {}: {} != {}'.format(key, name, tick, value[key], received[kind][name][key]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,351 @@
+import json
+import math
+import random
+import unittest
+
+from api.gameinfo import BotInfo, CombatEventLog, FlagInfo, GameInfo, GameInfoDecoder, MatchCombatEvent, MatchInfo, TeamInfo
+from api.gameinfo import fromJSON, toJSON, fixupGameInfoReferences, mergeGameInfo, mergingFromJSON
+from api.vector2 import Vector2
+
+import maploader
+from api.fixtures import syntheticGame, tickGameInfo, referenceMergeGameInfo
+
+
+class LocalGame(object):
+    """
+        Updates a GameInfo the way game.gameinfobuilder does for games run
+    locally: the fields of the bots, flags and match are set directly, and
+    the combat events are a new list of every event so far each update.
+    """
+
+    def __init__(self, bots = 3):
+        self.game = GameInfo()
+        self.game.match = MatchInfo()
+        for name in ['Red', 'Blue']:
+            team = TeamInfo(name)
+            team.flag = FlagInfo(name + 'Flag')
+            team.flag.team = team
+            team.flag.position = Vector2(0.0, 0.0)
+            for i in range(bots):
+                bot = BotInfo('{}{}'.format(name, i))
+                bot.team = team
+                bot.position = Vector2(float(i), 0.0)
+                team.members.append(bot)
+            self.game.addTeam(team)
+        self.game.team = self.game.teams['Red']
+        self.game.enemyTeam = self.game.teams['Blue']
+        self.events = []
+
+    def event(self, type, subject, instigator = None):
+        self.events.append(MatchCombatEvent(type, subject, instigator, self.game.match.timePassed))
+
+    def update(self, step = 0.1):
+        match = self.game.match
+        match.timePassed += step
+        match.combatEvents = []
+        for e in self.events:
+            match.combatEvents.append(e)
+
+
+class TestLevelInfo(unittest.TestCase):
+    """
+    The free position queries on the clearance map, against the closest free
+    point of every cell.
+    """
+
+    def queries(self, level, count):
+        rng = random.Random(level.width * level.height)
+        # Half of the queries are around blocks, where finding free points is hardest.
+        blocks = [Vector2(x + 0.5, y + 0.5) for x in range(level.width) for y in range(level.height) if level.blockHeights[x][y] > 0]
+        for i in range(count):
+            if i % 2:
+                yield rng.choice(blocks), rng.choice([0.5, 1.0, 2.0, 5.0, 30.0])
+            else:
+                yield Vector2(rng.uniform(-5.0, level.width + 5.0), rng.uniform(-5.0, level.height + 5.0)), rng.choice([0.5, 1.0, 2.0, 5.0, 30.0])
+
+    def testFreePositionInBox(self):
+        for name in ['map00', 'map20']:
+            level = maploader.loadLevel(name)
+            clearance = level.clearance()
+            random.seed(0)
+            for a, size in self.queries(level, 200):
+                area = (a - size, a + size)
+                p = level.findRandomFreePositionInBox(area)
+                if p is not None:
+                    self.assertTrue(clearance.isFree(p.x, p.y), '{}: {} is not free'.format(name, p))
+                    self.assertTrue(area[0].x <= p.x < area[1].x and area[0].y <= p.y < area[1].y, '{}: {} is not in {}'.format(name, p, area))
+
+    def testNearestFreePosition(self):
+        for name in ['map00', 'map20']:
+            level = maploader.loadLevel(name)
+            clearance = level.clearance()
+            for t, _ in self.queries(level, 30):
+                p = level.findNearestFreePosition(t)
+                points = [clearance.closestInCell(t.x, t.y, x, y) for x in range(level.width) for y in range(level.height)]
+                best = min(math.hypot(q[0] - t.x, q[1] - t.y) for q in points if q is not None)
+                self.assertIsNotNone(p)
+                self.assertTrue(clearance.isFree(p.x, p.y), '{}: {} is not free'.format(name, p))
+                self.assertAlmostEqual(p.distance(t), best, 9, '{}: nearest free position to {} is {}, should be {} away'.format(name, t, p, best))
+
+
+def decoded(message):
+    return json.loads(message, object_hook = fromJSON)
+
+
+class TestGameInfoDecoder(unittest.TestCase):
+    """
+    GameInfoDecoder must decode the level and every tick to the same objects
+    as json.loads with fromJSON.
+    """
+
+    def encoded(self, game):
+        return json.dumps(game, default = toJSON, sort_keys = True)
+
+    def testLevel(self):
+        level = json.dumps(maploader.loadLevel('map00'), default = toJSON)
+        self.assertEqual(self.encoded(GameInfoDecoder().decode(level)), self.encoded(decoded(level)))
+
+    def testTicks(self):
+        for botsPerTeam in [1, 5, 20]:
+            rng = random.Random(botsPerTeam)
+            server = syntheticGame(botsPerTeam, rng)
+            decoder = GameInfoDecoder()
+            for t in range(20):
+                bots = server.bots.values()
+                server.match.combatEvents = CombatEventLog(MatchCombatEvent(MatchCombatEvent.TYPE_KILLED, rng.choice(bots), rng.choice(bots), t)
+                                                            for _ in range(rng.randint(0, 2)))
+                message = tickGameInfo(server, rng, t)
+                games = [decoder.decode(message), decoded(message)]
+                for game in games:
+                    fixupGameInfoReferences(game)
+                self.assertEqual(self.encoded(games[0]), self.encoded(games[1]))
+
+
+class TestMergeGameInfo(unittest.TestCase):
+
+    def testMerge(self):
+        """
+        The merge as it was, mergeGameInfo and mergingFromJSON must all leave
+        the game the server sent behind.
+        """
+        for botsPerTeam in [1, 5, 20]:
+            rng = random.Random(botsPerTeam)
+            server = syntheticGame(botsPerTeam, rng)
+            initial = json.dumps(server, default = toJSON)
+            games = [decoded(initial) for _ in range(3)]
+            for game in games:
+                fixupGameInfoReferences(game)
+            for t in range(20):
+                message = tickGameInfo(server, rng, t)
+                referenceMergeGameInfo(games[0], decoded(message))
+                mergeGameInfo(games[1], decoded(message))
+                mergeGameInfo(games[2], json.loads(message, object_hook = mergingFromJSON(games[2])))
+                expected = json.dumps(server, default = toJSON, sort_keys = True)
+                for game in games:
+                    self.assertEqual(json.dumps(game, default = toJSON, sort_keys = True), expected)
+
+
+class TestCombatEventCursor(unittest.TestCase):
+
+    def testLocalGame(self):
+        local = LocalGame()
+        match = local.game.match
+        match.retain(window = 30.0)
+        cursor = match.cursor(0)
+        red, blue = local.game.bots['Red0'], local.game.bots['Blue0']
+
+        local.update()
+        self.assertEqual(list(cursor.unseen()), [])
+        local.event(MatchCombatEvent.TYPE_KILLED, blue, red)
+        local.event(MatchCombatEvent.TYPE_RESPAWN, blue)
+        local.update()
+        self.assertEqual(cursor.pending, 2)
+        self.assertEqual([e.type for e in cursor.peek()], [MatchCombatEvent.TYPE_KILLED, MatchCombatEvent.TYPE_RESPAWN])
+        self.assertEqual([e.type for e in cursor.unseen()], [MatchCombatEvent.TYPE_KILLED, MatchCombatEvent.TYPE_RESPAWN])
+        local.update()
+        self.assertEqual(list(cursor.unseen()), [])
+        local.event(MatchCombatEvent.TYPE_KILLED, red, blue)
+        local.update()
+        self.assertEqual([e.subject for e in cursor.unseen()], [red])
+        self.assertEqual(cursor.missed, 0)
+
+    def testRetainedLocalGame(self):
+        """
+        The list of every event a local game sets each update is replayed
+        into the log, which keeps only the newest events.
+        """
+        local = LocalGame()
+        match = local.game.match
+        match.retain(capacity = 5)
+        log = match.combatEvents
+        cursor = match.cursor(0)
+        red = local.game.bots['Red0']
+
+        seen = []
+        for tick in range(50):
+            for _ in range(tick % 3):
+                local.event(MatchCombatEvent.TYPE_RESPAWN, red)
+            local.update()
+            self.assertIs(match.combatEvents, log)
+            self.assertEqual(len(match.combatEvents), len(local.events))
+            self.assertLessEqual(len(list(match.combatEvents)), 5)
+            seen.extend(cursor.unseen())
+        self.assertEqual(seen, local.events)
+        self.assertEqual(cursor.missed, 0)
+
+    def testRetainedLog(self):
+        match = MatchInfo()
+        match.retain(capacity = 2)
+        cursor = match.cursor()
+        bot = BotInfo('Red0')
+        match.combatEvents.extend(MatchCombatEvent(MatchCombatEvent.TYPE_RESPAWN, bot, None, float(t)) for t in range(5))
+        self.assertEqual(cursor.pending, 2)
+        self.assertEqual([e.time for e in cursor.unseen()], [3.0, 4.0])
+        self.assertEqual(cursor.missed, 3)
+        self.assertEqual(len(match.combatEvents), 5)
+
+    def testReplacedLog(self):
+        match = MatchInfo()
+        bot = BotInfo('Red0')
+        events = [MatchCombatEvent(MatchCombatEvent.TYPE_RESPAWN, bot, None, float(t)) for t in range(4)]
+        match.combatEvents = CombatEventLog(events[:2])
+        cursor = match.cursor(1)
+        match.combatEvents = CombatEventLog(events)
+        self.assertEqual([e.time for e in cursor.unseen()], [1.0, 2.0, 3.0])
+
+    def testMergedEvents(self):
+        """
+        Events merged into a game with a retention window, read each tick
+        through a cursor and from takeChanges, against what the server sent.
+        """
+        def describe(e):
+            return (e.type, e.subject.name, e.instigator.name if e.instigator else None, e.time)
+
+        rng = random.Random(0)
+        server = syntheticGame(5, rng)
+        game = decoded(json.dumps(server, default = toJSON))
+        fixupGameInfoReferences(game)
+        game.match.retain(window = 10.0)
+        cursor = game.match.cursor(0)
+        game.takeChanges()
+
+        sent = 0
+        for tick in range(1, 601):
+            t = tick * 0.1
+            events = []
+            for _ in range(int(0.5 + rng.random())):
+                subject, instigator = rng.sample(server.bots.values(), 2)
+                if rng.random() < 0.5:
+                    events.append(MatchCombatEvent(MatchCombatEvent.TYPE_KILLED, subject, instigator, t))
+                else:
+                    events.append(MatchCombatEvent(MatchCombatEvent.TYPE_RESPAWN, subject, None, t))
+            server.match.combatEvents = CombatEventLog(events)
+            sent += len(events)
+            mergeGameInfo(game, decoded(tickGameInfo(server, rng, t)))
+
+            expected = [describe(e) for e in events]
+            self.assertEqual([describe(e) for e in cursor.unseen()], expected)
+            self.assertEqual([describe(e) for e in game.takeChanges().combatEvents], expected)
+            retained = list(game.match.combatEvents)
+            self.assertTrue(not retained or retained[0].time >= retained[-1].time - 10.0)
+        self.assertEqual(cursor.missed, 0)
+        self.assertEqual(len(game.match.combatEvents), sent)
+        self.assertLess(len(list(game.match.combatEvents)), sent)
+
+
+def changedNames(before, after = None):
+    """
+    Return the names in each list of a GameInfoChanges as sets, or what they
+    should be from two encoded GameInfo values.
+    """
+    fields = [('moved', ['position', 'facingDirection']), ('stateChanged', ['state']), ('healthChanged', ['health']),
+              ('visibilityChanged', ['visibleEnemies', 'seenBy', 'seenlast'])]
+    if after is None:
+        changes = before
+        names = dict((name, set(b.name for b in getattr(changes, name))) for name, _ in fields)
+        names['flagsMoved'] = set(f.name for f in changes.flagsMoved)
+        return names
+    def differ(kind, name, keys):
+        a, b = before[kind][name]['__value__'], after[kind][name]['__value__']
+        return any(a[key] != b[key] for key in keys)
+    names = dict((name, set(b for b in after['bots'] if differ('bots', b, keys))) for name, keys in fields)
+    names['flagsMoved'] = set(f for f in after['flags'] if differ('flags', f, ['position', 'carrier']))
+    return names
+
+
+class TestTakeChanges(unittest.TestCase):
+
+    def testLocalGame(self):
+        local = LocalGame()
+        game = local.game
+        red, blue = game.bots['Red0'], game.bots['Blue1']
+        local.event(MatchCombatEvent.TYPE_RESPAWN, red)
+        local.update()
+
+        changes = game.takeChanges()
+        self.assertEqual(set(changes.stateChanged), set(game.bots.values()))
+        self.assertEqual(set(changes.moved), set(game.bots.values()))
+        self.assertEqual(set(changes.flagsMoved), set(game.flags.values()))
+        self.assertEqual([e.subject for e in changes.combatEvents], [red])
+
+        blue.state = BotInfo.STATE_DEAD
+        local.event(MatchCombatEvent.TYPE_KILLED, blue, red)
+        local.update()
+        changes = game.takeChanges()
+        self.assertIn(blue, changes.stateChanged)
+        self.assertEqual([e.subject for e in changes.combatEvents], [blue])
+
+        local.update()
+        changes = game.takeChanges()
+        self.assertEqual(changes.combatEvents, [])
+        self.assertTrue(changes)
+
+    def testMerged(self):
+        local = LocalGame()
+        server = local.game
+        game = json.loads(json.dumps(server, default = toJSON), object_hook = fromJSON)
+        fixupGameInfoReferences(game)
+        game.takeChanges()
+
+        server.bots['Red1'].position = Vector2(5.0, 5.0)
+        server.bots['Blue0'].state = BotInfo.STATE_DEAD
+        local.event(MatchCombatEvent.TYPE_KILLED, server.bots['Blue0'], server.bots['Red1'])
+        server.match.combatEvents = CombatEventLog(local.events[-1:])
+        mergeGameInfo(game, json.loads(json.dumps(server, default = toJSON), object_hook = fromJSON))
+
+        changes = game.takeChanges()
+        self.assertEqual(changes.moved, [game.bots['Red1']])
+        self.assertEqual(changes.stateChanged, [game.bots['Blue0']])
+        self.assertEqual(changes.flagsMoved, [])
+        self.assertEqual([(e.subject, e.instigator) for e in changes.combatEvents], [(game.bots['Blue0'], game.bots['Red1'])])
+
+        server.match.combatEvents = CombatEventLog()
+        mergeGameInfo(game, json.loads(json.dumps(server, default = toJSON), object_hook = fromJSON))
+        self.assertFalse(game.takeChanges())
+
+    def testSyntheticGame(self):
+        """
+        The change sets of both ways of merging, against comparing the
+        encoded game before and after each update.
+        """
+        for botsPerTeam in [1, 5, 20]:
+            rng = random.Random(botsPerTeam)
+            server = syntheticGame(botsPerTeam, rng)
+            initial = json.dumps(server, default = toJSON)
+            games = [decoded(initial) for _ in range(2)]
+            for game in games:
+                fixupGameInfoReferences(game)
+                game.takeChanges()
+            for t in range(20):
+                message = tickGameInfo(server, rng, t)
+                before = json.loads(json.dumps(games[0], default = toJSON))['__value__']
+                mergeGameInfo(games[0], decoded(message))
+                mergeGameInfo(games[1], json.loads(message, object_hook = mergingFromJSON(games[1])))
+                after = json.loads(json.dumps(games[0], default = toJSON))['__value__']
+                expected = changedNames(before, after)
+                for game in games:
+                    self.assertEqual(changedNames(game.takeChanges()), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
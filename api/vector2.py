@@ -1,24 +1,49 @@
 import random
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class Vector2(object):
     """
     A 2d Vector class
+
+    Vectors use __slots__, so they carry no per-instance __dict__.  The
+    operators always return a new Vector2; iadd, isub and imul change the
+    vector in place instead, for loops that step a single position.
     """
 
+    __slots__ = ('x', 'y', '_length')
+
     def __init__(self, x, y):
         """
         Initialize the Vector2 from two floats.
         """
-        super(Vector2, self).__init__()
-        self.x = float(x)
+        _setX(self, float(x))
         """
         The x parameter
         """
-        self.y = float(y)
+        _setY(self, float(y))
         """
         The y parameter
         """
+        _setLength(self, None)
+
+    def __setattr__(self, name, value):
+        # Assigning x or y directly must drop the cached length.
+        object.__setattr__(self, name, value)
+        if name != '_length':
+            _setLength(self, None)
+
+    def __getstate__(self):
+        return (self.x, self.y)
+
+    def __setstate__(self, (x, y)):
+        _setX(self, x)
+        _setY(self, y)
+        _setLength(self, None)
 
     def __str__(self):
         """
@@ -33,7 +58,7 @@ class Vector2(object):
         return "Vector2({}, {})".format(self.x, self.y)
 
     def __iter__(self):
-        return iter([self.x, self.y])
+        return iter((self.x, self.y))
 
     def __eq__(self, other):
         """
@@ -95,12 +120,51 @@ class Vector2(object):
         """
         return Vector2(-self.x, -self.y)
 
+    def iadd(self, other):
+        """
+        Add a Vector2 or a float to this Vector2 in place and return it.
+        Unlike +=, this changes the vector for everyone holding it.
+        """
+        if isinstance(other, Vector2):
+            _setX(self, self.x + other.x)
+            _setY(self, self.y + other.y)
+        else:
+            _setX(self, self.x + other)
+            _setY(self, self.y + other)
+        _setLength(self, None)
+        return self
+
+    def isub(self, other):
+        """
+        Subtract a Vector2 or a float from this Vector2 in place and return it.
+        """
+        if isinstance(other, Vector2):
+            _setX(self, self.x - other.x)
+            _setY(self, self.y - other.y)
+        else:
+            _setX(self, self.x - other)
+            _setY(self, self.y - other)
+        _setLength(self, None)
+        return self
+
+    def imul(self, other):
+        """
+        Multiply this Vector2 by a scalar in place and return it.
+        """
+        _setX(self, self.x * float(other))
+        _setY(self, self.y * float(other))
+        _setLength(self, None)
+        return self
 
     def length(self):
         """
-        Return the length of the Vector2.
+        Return the length of the Vector2.  It is remembered until the vector changes.
         """
-        return math.sqrt(self.x * self.x + self.y * self.y)
+        length = self._length
+        if length is None:
+            length = math.sqrt(self.x * self.x + self.y * self.y)
+            _setLength(self, length)
+        return length
 
     def squaredLength(self):
         """
@@ -113,13 +177,15 @@ class Vector2(object):
         Return the distance between two vectors.
         eg d = u.distance(v);
         """
-        return (other - self).length()
+        dx, dy = other.x - self.x, other.y - self.y
+        return math.sqrt(dx * dx + dy * dy)
 
     def squaredDistance(self, other):
         """
         Return the square of the distance between two vectors.
         """
-        return (other - self).squaredLength()
+        dx, dy = other.x - self.x, other.y - self.y
+        return dx * dx + dy * dy
 
     def dotProduct(self, other):
         """
@@ -133,8 +199,9 @@ class Vector2(object):
         """
         d = self.length();
         assert d != 0
-        self.x /= d
-        self.y /= d
+        _setX(self, self.x / d)
+        _setY(self, self.y / d)
+        _setLength(self, None)
 
     def normalized(self):
         """
@@ -200,9 +267,29 @@ class Vector2(object):
         angle = 2 * math.pi * random.random()
         return Vector2(math.cos(angle), math.sin(angle))
 
+    @staticmethod
+    def fromPairs(pairs):
+        """ Return a Vector2 for each [x, y] pair in the list, or None for an empty one, without calling __init__ for each. """
+        new, setX, setY, setLength = Vector2.__new__, _setX, _setY, _setLength
+        result = []
+        for pair in pairs:
+            if pair:
+                v = new(Vector2)
+                setX(v, float(pair[0]))
+                setY(v, float(pair[1]))
+                setLength(v, None)
+                result.append(v)
+            else:
+                result.append(None)
+        return result
+
 
 
 
+# The slot descriptors, to set the fields without going through __setattr__.
+_setX = Vector2.x.__set__
+_setY = Vector2.y.__set__
+_setLength = Vector2._length.__set__
 
 
 Vector2.ZERO = Vector2(0.0, 0.0)
@@ -235,3 +322,161 @@ Vector2.UNIT_SCALE = Vector2(1.0, 1.0)
 The unit scale vector.
 """
 
+
+
+class Vector2Array(object):
+    """
+    A batch of N points or directions held as an (N, 2) float array, for
+    geometry over all bots or targets at once instead of a lambda per Vector2.
+    Needs numpy, unlike Vector2.
+
+        points = Vector2Array([bot.position for bot in bots])
+        closest = bots[points.nearest(target)[0]]
+    """
+
+    def __init__(self, points = ()):
+        """
+        Initialize from a sequence of Vector2, of [x, y] pairs as in JSON, or
+        from an (N, 2) array.
+        """
+        if np is None:
+            raise ImportError("Vector2Array needs numpy")
+        if not isinstance(points, np.ndarray):
+            points = [(p.x, p.y) if isinstance(p, Vector2) else p for p in points]
+        self.array = np.array(points, dtype = float).reshape(-1, 2)
+        """
+        The (N, 2) array of points, one row per point.
+        """
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return (Vector2(x, y) for x, y in self.array.tolist())
+
+    def __getitem__(self, index):
+        """
+        Return the Vector2 at an integer index, or a Vector2Array for a slice,
+        a boolean mask or an array of indices.
+        """
+        if isinstance(index, (int, long, np.integer)):
+            x, y = self.array[index].tolist()
+            return Vector2(x, y)
+        return Vector2Array(self.array[index])
+
+    def __repr__(self):
+        return "Vector2Array({})".format(self.array.tolist())
+
+    @staticmethod
+    def operand(other):
+        if isinstance(other, Vector2):
+            return np.array([other.x, other.y])
+        if isinstance(other, Vector2Array):
+            return other.array
+        return np.asarray(other, dtype = float)
+
+    @staticmethod
+    def scalars(other):
+        # One factor per point has to be a column to scale whole rows.
+        other = np.asarray(other, dtype = float)
+        return other[:, np.newaxis] if other.ndim == 1 else other
+
+    def __add__(self, other):
+        """
+        Add a Vector2 to every point, or another Vector2Array point by point.
+        """
+        return Vector2Array(self.array + self.operand(other))
+
+    def __sub__(self, other):
+        return Vector2Array(self.array - self.operand(other))
+
+    def __mul__(self, other):
+        """
+        Multiply every point by a scalar, or each by its own with N scalars.
+        """
+        return Vector2Array(self.array * self.scalars(other))
+
+    __rmul__ = __mul__
+
+    def __div__(self, other):
+        return Vector2Array(self.array / self.scalars(other))
+
+    def __neg__(self):
+        return Vector2Array(-self.array)
+
+    @property
+    def x(self):
+        return self.array[:, 0]
+
+    @property
+    def y(self):
+        return self.array[:, 1]
+
+    def squaredLengths(self):
+        x, y = self.x, self.y
+        return x * x + y * y
+
+    def lengths(self):
+        return np.sqrt(self.squaredLengths())
+
+    def normalized(self):
+        """
+        Return the points scaled to unit length.  None of them can be zero length.
+        """
+        lengths = self.lengths()
+        assert lengths.all()
+        return Vector2Array(self.array / lengths[:, np.newaxis])
+
+    def dotProducts(self, other):
+        """
+        Return the dot product of every point with a Vector2, or of the points
+        of two Vector2Arrays of the same length pairwise.
+        """
+        other = self.operand(other)
+        return self.x * other[..., 0] + self.y * other[..., 1]
+
+    def squaredDistances(self, other):
+        """
+        Return the squared distance from every point to a Vector2, or between
+        the points of two Vector2Arrays of the same length pairwise.
+        """
+        other = self.operand(other)
+        dx, dy = other[..., 0] - self.x, other[..., 1] - self.y
+        return dx * dx + dy * dy
+
+    def distances(self, other):
+        """
+        Return the distance from every point to a Vector2, the same values
+        Vector2.distance gives one by one.
+        """
+        return np.sqrt(self.squaredDistances(other))
+
+    def squaredDistanceMatrix(self, other):
+        """
+        Return the (N, M) matrix of squared distances between these N points
+        and the M points of another Vector2Array.
+        """
+        other = self.operand(other)
+        dx = other[np.newaxis, :, 0] - self.x[:, np.newaxis]
+        dy = other[np.newaxis, :, 1] - self.y[:, np.newaxis]
+        return dx * dx + dy * dy
+
+    def distanceMatrix(self, other):
+        return np.sqrt(self.squaredDistanceMatrix(other))
+
+    def nearest(self, other, k = 1):
+        """
+        Return the indices of the k points closest to a Vector2, closest
+        first.  Ties keep the order of the points, like sorted() would.
+        """
+        order = np.argsort(self.distances(other), kind = 'mergesort')
+        return order[:k]
+
+    def toVectors(self):
+        return list(self)
+
+    def toJSON(self):
+        """
+        Return the points as a list of [x, y] pairs, as toJSON writes a Vector2.
+        """
+        return self.array.tolist()
@@ -13,18 +13,21 @@
 # Import AI Sandbox API:
 from api import Commander
 from api import commands
-from api import Vector2
+from api import Vector2, Vector2Array
 from api.gameinfo import BotInfo
 from api.gameinfo import MatchCombatEvent
 
 # Import other modules
 import random
 #import png # for writing debug pngs
-import networkx as nx # for graphs
 import itertools
 import math
 import sys
-import copy
+
+import numpy as np
+
+from pathfinding import GridGraph, NoPathError
+from mapcache import MapCache
 
 #TODO Make bots more aggressive when time is running out and losing
 #TODO Make bots more defensive when time is running out and winning
@@ -69,7 +72,7 @@ class ArlecksCommander(Commander):
         """
         self.verbose = True    # display the command descriptions next to the bot labels
         
-        self.lastEventCount = 0
+        self.game.match.retain(window = 30.0)
         self.numAllies = len(self.game.team.members)
         self.botDeathLocations = [] # stores a list of Vector2 objects of where bots died
         
@@ -163,67 +166,8 @@ class ArlecksCommander(Commander):
             )
 
         self.makeGraph()
-        self.sneakGraph.add_node("enemy_base")
-        self.positions["enemy_base"] = None
-        start, finish = self.level.botSpawnAreas[self.game.enemyTeam.name]
-        for i, j in itertools.product(range(int(start.x), int(finish.x)), range(int(start.y), int(finish.y))):
-            self.sneakGraph.add_edge("enemy_base", self.terrain[j][i], weight = 1.0)
-
-        self.sneakGraph.add_node("base")
-        self.positions["base"] = None
-        start, finish = self.level.botSpawnAreas[self.game.team.name]
-        for i, j in itertools.product(range(int(start.x), int(finish.x)), range(int(start.y), int(finish.y))):
-            self.sneakGraph.add_edge("base", self.terrain[j][i], weight = 1.0)
-
-        self.node_EnemyFlagIndex = self.getNodeIndex(self.game.team.flag.position)
-        self.node_EnemyScoreIndex = self.getNodeIndex(self.game.enemyTeam.flagScoreLocation)
-
-        # self.node_Bases = self.graph.add_vertex()
-        # e = self.graph.add_edge(self.node_Bases, self.node_MyBase)
-        # e = self.graph.add_edge(self.node_Bases, self.node_EnemyBase)
-
-        vb2f = nx.shortest_path(self.sneakGraph, source="enemy_base", target=self.node_EnemyFlagIndex)
-        try:
-            if self.node_EnemyFlagIndex != self.node_EnemyScoreIndex:
-                vf2s = nx.shortest_path(self.sneakGraph, source=self.node_EnemyFlagIndex, target=self.node_EnemyScoreIndex)
-            else:
-                vf2s = None
-        except IndexError as e:
-            vf2s = None
-            sys.stdout.write(str(e) + '\n')
-        #vb2s = nx.shortest_path(self.graph, source="enemy_base", target=self.node_EnemyScoreIndex)
-
-        self.node_EnemyBaseToFlagIndex = "enemy_base_to_flag"
-        self.sneakGraph.add_node(self.node_EnemyBaseToFlagIndex)
-        self.positions["enemy_base_to_flag"] = None
-        for vertex in vb2f:
-            self.sneakGraph.add_edge(self.node_EnemyBaseToFlagIndex, vertex, weight = 1.0)
-        
-        if vf2s:
-            self.node_EnemyFlagToScoreIndex = "enemy_flag_to_score" 
-            self.sneakGraph.add_node(self.node_EnemyFlagToScoreIndex)
-            self.positions["enemy_flag_to_score"] = None
-            for vertex in vf2s:
-                self.sneakGraph.add_edge(self.node_EnemyFlagToScoreIndex, vertex, weight = 1.0)
-        
-        self.node_EnemyBaseToScoreIndex = "enemy_base_to_score"
-        self.sneakGraph.add_node(self.node_EnemyBaseToScoreIndex)
-        self.positions["enemy_base_to_score"] = None
-       # for vertex in vb2s:
-       #     self.graph.add_edge(self.node_EnemyBaseToScoreIndex, vertex, weight = 1.0)
-
-        ## node = self.makeNode(self.game.enemyTeam.flag.position)
-        if vf2s:
-            self.distances = nx.single_source_shortest_path_length(self.sneakGraph, self.node_EnemyFlagToScoreIndex)
-        else:
-            self.distances = nx.single_source_shortest_path_length(self.sneakGraph, self.node_EnemyBaseToFlagIndex)
-
-        self.sneakGraph.remove_node("base")
-        self.sneakGraph.remove_node("enemy_base")
-        self.sneakGraph.remove_node(self.node_EnemyBaseToFlagIndex)
-        if vf2s:
-            self.sneakGraph.remove_node(self.node_EnemyFlagToScoreIndex)
-        self.sneakGraph.remove_node(self.node_EnemyBaseToScoreIndex)
+        self.mapCache = MapCache(self.level)
+        self.distances = self.mapCache.get(self.game.team.name + '.sneakDistances', self.computeDistances)
         self.updateEdgeWeights()
         
         spawnConnection = (self.midEnemySpawn - self.midOurSpawn)
@@ -265,7 +209,6 @@ class ArlecksCommander(Commander):
 
         self.cmds = {}
         self.aliveEnemies = 0
-        self.index = 0
         self.firstTick = True
         self.waiter = None
         self.botByFlagSpawnDistance = []
@@ -285,11 +228,11 @@ class ArlecksCommander(Commander):
         # calculate the shortest path between the bot and the target using our weights
         srcIndex = self.getNodeIndex(bot.position)
         dstIndex = self.getNodeIndex(dst)
-        pathNodes = nx.shortest_path(self.sneakGraph, srcIndex, dstIndex, 'weight')
+        pathNodes = self.sneakGraph.shortestPath(srcIndex, dstIndex)
     
         pathLength = len(pathNodes)
         if pathLength > 0:
-            path = [self.positions[p] for p in pathNodes if self.positions[p]]
+            path = [self.sneakGraph.positions[p] for p in pathNodes]
             if len(path) > 0:
                 orderPath = path[::10]
                 orderPath.append(path[-1]) # take every 10th point including last point
@@ -319,7 +262,8 @@ class ArlecksCommander(Commander):
         """
         Listen for events and run the bot's behavior tree.
         """
-        for e in self.game.match.combatEvents[self.index:]:
+        changes = self.game.takeChanges()
+        for e in changes.combatEvents:
             if e.type == MatchCombatEvent.TYPE_RESPAWN and e.subject in self.game.enemyTeam.members:
                 self.aliveEnemies += 1
                 self.waiter = None
@@ -332,10 +276,10 @@ class ArlecksCommander(Commander):
                     sys.stdout.write('enemies alive: ' + str(self.aliveEnemies) + '\n')
                 elif e.subject in self.game.team.members:
                     self.behaviorTrees[e.subject.name].killed()
-        self.index = len(self.game.match.combatEvents)
         
-        for bot in copy.copy(self.cmds):
-            if bot.state == BotInfo.STATE_DEAD:
+        # only bots whose state changed can have died since the last tick
+        for bot in changes.stateChanged:
+            if bot.state == BotInfo.STATE_DEAD and bot in self.cmds:
                 del self.cmds[bot]
         
         self.targets = set()
@@ -355,7 +299,14 @@ class ArlecksCommander(Commander):
                     #sys.stdout.write('dumb\n')
                     self.targets.add((enemy.position, 0.0))
         
-        self.botByFlagSpawnDistance = sorted(self.game.bots_alive, key = lambda f: f.position.distance(self.game.enemyTeam.flagSpawnLocation))
+        self.targetList = list(self.targets)
+        self.targetPositions = Vector2Array([position for position, _ in self.targetList])
+        self.targetDelays = np.array([seen for _, seen in self.targetList], dtype = float)
+
+        bots = self.game.bots_alive
+        positions = Vector2Array([bot.position for bot in bots])
+        order = positions.nearest(self.game.enemyTeam.flagSpawnLocation, len(bots))
+        self.botByFlagSpawnDistance = [bots[i] for i in order]
         
         # run behavior tree
         for bot in self.game.bots_alive:
@@ -381,6 +332,7 @@ class ArlecksCommander(Commander):
         width, height = levelSize
         potPosits = [[0 for y in xrange(height)] for x in xrange(width)]
         neighbors = getVonNeumannNeighborhood((int(secLoc.x), int(secLoc.y)), self.level.blockHeights, int(self.level.firingDistance)+2)
+        coverBlocks = adjCoverBlockCounts(self.level.blocksSight).tolist()
         securePositions = []
         
         for n in neighbors:
@@ -394,7 +346,7 @@ class ArlecksCommander(Commander):
                 potPosits[x][y] = 255
                 
             if potPosits[x][y] == 255:
-                numWallCells = numAdjCoverBlocks(n, self.level.blockHeights)
+                numWallCells = coverBlocks[x][y]
                 numWallCells += numAdjMapWalls(n, levelSize)
                 #print numWallCells
                 if numWallCells == 0:
@@ -421,6 +373,16 @@ class ArlecksCommander(Commander):
         return sorted(securePositions, key = lambda p: numAdjMapWalls(p, levelSize)*4 + numAdjCoverBlocksWeighted(p, self) + distTo(Vector2(p[0],p[1]), secLoc)/self.level.firingDistance, reverse = True)
                             
                             
+    def closestTarget(self, position):
+        """
+        Return the target with the lowest distance from position plus time since it was seen.
+        """
+        scores = self.targetPositions.distances(position) + self.targetDelays
+        for i in np.argsort(scores, kind = 'mergesort'):
+            # Targets reached earlier in this tick are removed from the set.
+            if self.targetList[i] in self.targets:
+                return self.targetList[i]
+
     def getFlankingPosition(self, bot, target):
         flanks = [target + f * self.level.firingDistance for f in [self.leftFlank, self.rightFlank]]
         options = map(lambda f: self.level.findNearestFreePosition(f), flanks)
@@ -436,76 +398,61 @@ class ArlecksCommander(Commander):
         return livingEnemies
 
     def makeGraph(self):
-        blocks = self.level.blockHeights
-        width, height = len(blocks), len(blocks[0])
-
-        g = nx.Graph(directed=False, map_height = height, map_width = width)
-        #self.positions = g.new_vertex_property('vector<float>')
-        #self.weights = g.new_edge_property('float')
-    
-        #g.vertex_properties['pos'] = self.positions
-        #g.edge_properties['weight'] = self.weights
-    
-        self.terrain = []
-        self.positions = {}
-        for j in range(0, height):
-            row = []
-            for i in range(0,width):
-                if blocks[i][j] == 0:
-                    g.add_node(i+j*width, position = (float(i)+0.5, float(j)+0.5) )
-                    self.positions[i+j*width] = Vector2(float(i) + 0.5, float(j) + 0.5)
-                    row.append(i+j*width)
-                else:
-                    row.append(None)
-            self.terrain.append(row)
+        self.sneakGraph = GridGraph(self.level.blocks)
+
+    def computeDistances(self):
+        """
+        Return the number of steps from every cell to the route the enemy takes from their spawn to our flag and on to their score location.
+        """
+        enemyBase = self.sneakGraph.addNode()
+        for cell in self.sneakGraph.cellsInBox(*self.level.botSpawnAreas[self.game.enemyTeam.name]):
+            self.sneakGraph.addEdge(enemyBase, cell)
+
+        base = self.sneakGraph.addNode()
+        for cell in self.sneakGraph.cellsInBox(*self.level.botSpawnAreas[self.game.team.name]):
+            self.sneakGraph.addEdge(base, cell)
+
+        flagIndex = self.getNodeIndex(self.game.team.flag.position)
+        scoreIndex = self.getNodeIndex(self.game.enemyTeam.flagScoreLocation)
+
+        vb2f = self.sneakGraph.shortestPath(enemyBase, flagIndex, weighted = False)
+        try:
+            if flagIndex != scoreIndex:
+                vf2s = self.sneakGraph.shortestPath(flagIndex, scoreIndex, weighted = False)
+            else:
+                vf2s = None
+        except NoPathError as e:
+            vf2s = None
+            sys.stdout.write(str(e) + '\n')
+
+        baseToFlag = self.sneakGraph.addNode()
+        for vertex in vb2f:
+            self.sneakGraph.addEdge(baseToFlag, vertex)
         
-        for i, j in itertools.product(range(0, width), range(0, height)):
-            p = self.terrain[j][i]
-            if not p: continue
-    
-            if i < width-1:
-                q = self.terrain[j][i+1]
-                if q:
-                    e = g.add_edge(p, q, weight = 1.0)
-    
-            if j < height-1:
-                r = self.terrain[j+1][i]
-                if r:
-                    e = g.add_edge(p, r, weight = 1.0)
-    
-        self.sneakGraph = g
+        if vf2s:
+            flagToScore = self.sneakGraph.addNode()
+            for vertex in vf2s:
+                self.sneakGraph.addEdge(flagToScore, vertex)
 
-    def updateEdgeWeights(self):
-        blocks = self.level.blockHeights
-        width, height = len(blocks), len(blocks[0])
+        if vf2s:
+            distances = self.sneakGraph.pathLengths(flagToScore)
+        else:
+            distances = self.sneakGraph.pathLengths(baseToFlag)
 
-        # update the weights in the graph based on the distance to the shortest path between the enemy flag and enemy score location
+        self.sneakGraph.removeNode(base)
+        self.sneakGraph.removeNode(enemyBase)
+        self.sneakGraph.removeNode(baseToFlag)
+        if vf2s:
+            self.sneakGraph.removeNode(flagToScore)
+        return distances
 
-        for j in range(0, height):
-            for i in range(0, width -1):
-                a = self.terrain[j][i]
-                b = self.terrain[j][i+1]
-                if a and b:
-                    #w = max(99999999 - (self.distances[a] + self.distances[b]), 0)
-                    w = max(255 - 4.0 * (self.distances[a] + self.distances[b]), 0)
-                    #sys.stdout.write(str(w) + ' ')
-                    self.sneakGraph[a][b]['weight'] = w
-
-        for j in range(0, height-1):
-            for i in range(0, width):
-                a = self.terrain[j][i]
-                b = self.terrain[j+1][i]
-                if a and b:
-                    #w = max(99999999 - (self.distances[a] + self.distances[b]), 0)
-                    w = max(255 - 4.0 * (self.distances[a] + self.distances[b]), 0)
-                    #sys.stdout.write(str(w) + ' ')
-                    self.sneakGraph[a][b]['weight'] = w
+    def updateEdgeWeights(self):
+        # update the weights in the graph based on the distance to the shortest path between the enemy flag and enemy score location
+        right, down = self.sneakGraph.edgeSums(self.distances)
+        self.sneakGraph.setWeights(np.maximum(255 - 4.0 * right, 0), np.maximum(255 - 4.0 * down, 0))
 
     def getNodeIndex(self, position):
-        i = int(position.x)
-        j = int(position.y)
-        width = self.sneakGraph.graph["map_width"]
-        return i+j*width
+        return self.sneakGraph.getNodeIndex(position)
 
 # Helper functions
 def distTo(pos1, pos2):
@@ -515,15 +462,14 @@ def distTo(pos1, pos2):
 def canInterceptTarget(bot, target, targetGoal):  
     return distTo(bot, targetGoal) < distTo(target, targetGoal)
 
-# Returns number of blocks that are adjacent that can be used as cover at a given position
-def numAdjCoverBlocks(cell, blockHeights):
-    adjCells = getVonNeumannNeighborhood(cell, blockHeights, 1)
-    numWallCells = 0
-    for aCell in adjCells:
-        aCellX, aCellY = aCell
-        if blockHeights[aCellX][aCellY] >= 2:
-            numWallCells += 1
-    return numWallCells
+# Returns the number of blocks that are adjacent that can be used as cover at every position, given the blocksSight mask of the level
+def adjCoverBlockCounts(blocksSight):
+    counts = blocksSight.astype(int)
+    counts[1:, :] += blocksSight[:-1, :]
+    counts[:-1, :] += blocksSight[1:, :]
+    counts[:, 1:] += blocksSight[:, :-1]
+    counts[:, :-1] += blocksSight[:, 1:]
+    return counts
 
 # prioritize cells that have cover from their spawn
 def numAdjCoverBlocksWeighted(cell, cmdr):
@@ -572,8 +518,9 @@ def numAdjMapWalls(cell, mapSize):
 # http://mathworld.wolfram.com/vonNeumannNeighborhood.html
 def getVonNeumannNeighborhood(cell, cells, r): # where cell is a tuple, cells is a 2D list, and r is the range
     newCells = [] # list of tuples
-    for x, cx in enumerate(cells):
-        for y, cy in enumerate(cx):
+    # only the cells in the bounding box of the neighborhood can be in range, in the same order as scanning all of them
+    for x in xrange(max(cell[0] - r, 0), min(cell[0] + r + 1, len(cells))):
+        for y in xrange(max(cell[1] - r, 0), min(cell[1] + r + 1, len(cells[x]))):
             if abs(x - cell[0]) + abs(y - cell[1]) <= r:
                 newCells.append((x,y))
     return newCells
@@ -853,7 +800,7 @@ class ChooseAndApproachTarget(Node):
             if self.commander().targets:
                 bot = self.bot()
                 # and (bot not in self.combats or self.combats[bot][1] + 4 < self.game.match.timePassed)
-                kill = sorted(self.commander().targets, key = lambda f : f[0].distance(bot.position) + f[1])[0]
+                kill = self.commander().closestTarget(bot.position)
     
                 if kill[0].distance(bot.position) + kill[1] < 1.5 * self.commander().level.firingDistance:
                     if kill[0].distance(bot.position) > self.commander().level.runningSpeed * 2.0:
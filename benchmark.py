@@ -0,0 +1,1006 @@
+#!/usr/bin/env python2
+"""
+Offline benchmarks for the commander helpers, run on the maps in assets/
+without starting the game.  They only time the helpers against the code
+they replaced.  That both give the same results is checked by the test_*.py
+files next to each module:
+
+    python -m unittest discover -p 'test_*.py'
+
+The benchmarks:
+
+    python benchmark.py pathfinding [--maps map00 map01] [--queries 50]
+    python benchmark.py weights [--maps map00 map01] [--repeat 20]
+    python benchmark.py visibility [--maps map00 map01] [--queries 200] [--processes 4]
+    python benchmark.py lines [--segments 5000] [--length 15]
+    python benchmark.py merge [--bots 5 10 20 40] [--ticks 200]
+    python benchmark.py decode [--bots 5 10 20 40] [--ticks 200]
+    python benchmark.py delta [--bots 5 10 20] [--moving 0.1 0.5 1.0] [--keyframes 50]
+    python benchmark.py stream [--ticks 300] [--interval 0.01] [--tickTime 0.05]
+    python benchmark.py commands [--bots 10] [--ticks 500] [--repeat 0.5]
+    python benchmark.py orders [--maps map00 map01] [--queries 100]
+    python benchmark.py events [--games 3] [--seconds 300] [--window 30]
+    python benchmark.py tournament [--levels 6] [--commanders 5] [--processes 4] [--recycle 10]
+    python benchmark.py farm [--nodes 3] [--processes 2] [--lease 1]
+    python benchmark.py league [--commanders 12] [--levels 6]
+    python benchmark.py sequential [--strengths 0.3 0.5 0.7] [--trials 200] [--budget 200]
+    python benchmark.py positions [--maps map00 map01] [--queries 500]
+    python benchmark.py cones [--maps map00 map01] [--queries 500]
+    python benchmark.py waves [--maps map00 map01] [--cells 500]
+    python benchmark.py vectors [--number 20000]
+"""
+
+import sys
+import math
+import time
+import timeit
+import random
+import argparse
+import itertools
+
+import numpy as np
+
+import maploader
+from fixtures import sneakSetup, networkxSneakGraph, gridSneakGraph, referenceLine, referenceWave, playStream, FakeGame
+from api.fixtures import syntheticGame, tickGameInfo, stepGame, referenceMergeGameInfo
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+def benchmarkPathfinding(args):
+    import networkx as nx
+
+    totals = [0.0] * 4
+    print '{:<20} {:>10} {:>10} {:>12} {:>12} {:>8}'.format('map', 'nx init', 'grid init', 'nx sneak', 'grid sneak', 'speedup')
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        setup = sneakSetup(level, level.teamNames[0], level.teamNames[1])
+
+        (nxGraph, _, _), nxInit = timed(networkxSneakGraph, setup)
+        (grid, _, _), gridInit = timed(gridSneakGraph, setup)
+
+        # Search both graphs with the same weights, see test_pathfinding.py.
+        for a, b in nxGraph.edges():
+            grid.setWeight(a, b, nxGraph[a][b]['weight'])
+
+        rng = random.Random(name)
+        free = sorted(nxGraph.nodes())
+        queries = [(rng.choice(free), rng.choice(free)) for _ in range(args.queries)]
+        queries = [(s, t) for s, t in queries if nx.has_path(nxGraph, s, t)]
+
+        _, nxSneak = timed(lambda: [nx.shortest_path(nxGraph, s, t, 'weight') for s, t in queries])
+        _, gridSneak = timed(lambda: [grid.shortestPath(s, t) for s, t in queries])
+
+        for k, t in enumerate([nxInit, gridInit, nxSneak, gridSneak]):
+            totals[k] += t
+        print '{:<20} {:>9.3f}s {:>9.3f}s {:>11.3f}s {:>11.3f}s {:>7.1f}x'.format(
+            name, nxInit, gridInit, nxSneak, gridSneak, (nxInit + nxSneak) / (gridInit + gridSneak))
+    print '{:<20} {:>9.3f}s {:>9.3f}s {:>11.3f}s {:>11.3f}s {:>7.1f}x'.format(
+        'total', totals[0], totals[1], totals[2], totals[3], (totals[0] + totals[2]) / (totals[1] + totals[3]))
+
+
+def benchmarkWeights(args):
+    """
+    Re-weighting the sneak graph from a distance field: per edge through
+    networkx, as updateEdgeWeights used to, against the whole-array version.
+    """
+    print '{:<20} {:>10} {:>10} {:>8}'.format('map', 'nx', 'grid', 'speedup')
+    totals = [0.0, 0.0]
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        setup = sneakSetup(level, level.teamNames[0], level.teamNames[1])
+        nxGraph, _, nxDistances = networkxSneakGraph(setup)
+        grid, _, distances = gridSneakGraph(setup)
+
+        def loop():
+            for _ in range(args.repeat):
+                for a, b in nxGraph.edges():
+                    nxGraph[a][b]['weight'] = max(255 - 4.0 * (nxDistances[a] + nxDistances[b]), 0)
+
+        def vectorized():
+            for _ in range(args.repeat):
+                right, down = grid.edgeSums(distances)
+                grid.setWeights(np.maximum(255 - 4.0 * right, 0), np.maximum(255 - 4.0 * down, 0))
+                grid.costs()
+
+        _, nxTime = timed(loop)
+        _, gridTime = timed(vectorized)
+        totals[0] += nxTime
+        totals[1] += gridTime
+        print '{:<20} {:>9.2f}ms {:>9.2f}ms {:>7.1f}x'.format(name, 1000 * nxTime / args.repeat, 1000 * gridTime / args.repeat, nxTime / gridTime)
+    print '{:<20} {:>9.2f}ms {:>9.2f}ms {:>7.1f}x'.format('total', 1000 * totals[0] / args.repeat, 1000 * totals[1] / args.repeat, totals[0] / totals[1])
+
+
+class DictVector2(object):
+    """
+        The operations of api.Vector2 that benchmarkVectors times, as they
+    were before it used __slots__, to compare against.
+    """
+
+    def __init__(self, x, y):
+        super(DictVector2, self).__init__()
+        self.x = float(x)
+        self.y = float(y)
+
+    def __add__(self, other):
+        if isinstance(other, DictVector2):
+            return DictVector2(self.x + other.x, self.y + other.y)
+        else:
+            return DictVector2(self.x + other, self.y + other)
+
+    def __sub__(self, other):
+        if isinstance(other, DictVector2):
+            return DictVector2(self.x - other.x, self.y - other.y)
+        else:
+            return DictVector2(self.x - other, self.y - other)
+
+    def __mul__(self, other):
+        return DictVector2(self.x * float(other), self.y * float(other))
+
+    def __div__(self, other):
+        return DictVector2(self.x / float(other), self.y / float(other))
+
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y)
+
+    def distance(self, other):
+        return (other - self).length()
+
+    def dotProduct(self, other):
+        return self.x * other.x + self.y * other.y
+
+    def normalized(self):
+        d = self.length();
+        assert d != 0
+        return self / d
+
+
+def benchmarkVectors(args):
+    """
+    The Vector2 operations that commanders use most, and the line of sight
+    loops from freeLoS and getMostSecurePositions built on them, on the
+    Vector2 from before __slots__ and on api.Vector2.  The last row steps
+    the position with iadd instead of building a new vector every step.
+    """
+    from api import Vector2
+
+    def loops(V):
+        a, b = V(3.5, 4.5), V(40.2, 30.7)
+
+        def freeLoS(start = a, end = b):
+            vec = (end - start).normalized()
+            vecInc = 0.5
+            while (vec * vecInc).length() < (end - start).length():
+                testPos = start + vec * vecInc
+                if heights[int(testPos.x)][int(testPos.y)] >= 2:
+                    return False
+                vecInc += 0.5
+            return True
+
+        def secureLoS(secLoc = a, x = 40, y = 30):
+            lookVec = V(x + 0.5, y + 0.5) - (secLoc + V(.5, .5))
+            lookVecNorm = lookVec.normalized()
+            vecInc = .1
+            while vecInc < lookVec.length():
+                testPos = secLoc + lookVecNorm * vecInc
+                if heights[int(testPos.x)][int(testPos.y)] >= 2:
+                    return False
+                vecInc += .1
+            return True
+
+        return [
+            ('construct', lambda: V(1.5, 2.5)),
+            ('add', lambda: a + b),
+            ('sub', lambda: a - b),
+            ('scale', lambda: a * 0.5),
+            ('length', lambda: a.length()),
+            ('distance', lambda: a.distance(b)),
+            ('normalized', lambda: a.normalized()),
+            ('dotProduct', lambda: a.dotProduct(b)),
+            ('freeLoS', freeLoS),
+            ('secureLoS', secureLoS),
+        ]
+
+    heights = [[0] * 50 for _ in range(88)]
+
+    def steppedLoS(start = Vector2(3.5, 4.5), end = Vector2(40.2, 30.7)):
+        distance = start.distance(end)
+        step = (end - start).normalized().imul(0.5)
+        testPos = start + step
+        travelled = 0.5
+        while travelled < distance:
+            if heights[int(testPos.x)][int(testPos.y)] >= 2:
+                return False
+            testPos.iadd(step)
+            travelled += 0.5
+        return True
+
+    print '{:<20} {:>10} {:>10} {:>8}'.format('operation', 'dict', 'slots', 'speedup')
+    before, after = loops(DictVector2), loops(Vector2)
+    rows = [(name, b, a) for (name, b), (_, a) in zip(before, after)]
+    rows.append(('freeLoS iadd', before[-2][1], steppedLoS))
+    for i, (name, b, a) in enumerate(rows):
+        # The loops take a few hundred steps, time fewer of them.
+        number = args.number if i < 8 else max(args.number // 100, 1)
+        times = [min(timeit.Timer(f).repeat(3, number)) / number for f in (b, a)]
+        print '{:<20} {:>8.3f}us {:>8.3f}us {:>7.1f}x'.format(name, 1e6 * times[0], 1e6 * times[1], times[0] / times[1])
+
+
+def benchmarkLines(args):
+    """
+    Walk random segments about as long as the firing distance, like the
+    field of view checks of ArlecksCommander, with visibility.line against
+    the version that checked the end of the line at every step.
+    """
+    from api import Vector2
+    from visibility import line
+
+    rng = random.Random(0)
+    segments = []
+    for _ in range(args.segments):
+        A = Vector2(rng.uniform(0, 88), rng.uniform(0, 50))
+        segments.append((A, A + Vector2.randomUnitVector() * rng.uniform(0.5, 2.0) * args.length))
+
+    print '{:>10} {:>10} {:>10} {:>8}'.format('', 'reference', 'line', 'speedup')
+    for name, finite, covering in [('covering', True, True), ('single', True, False)]:
+        referenceTime = min(timed(lambda: [list(referenceLine(A, B, finite, covering)) for A, B in segments])[1] for _ in range(3))
+        lineTime = min(timed(lambda: [list(line(A, B, finite, covering)) for A, B in segments])[1] for _ in range(3))
+        print '{:>10} {:>8.2f}us {:>8.2f}us {:>7.1f}x'.format(name, 1e6 * referenceTime / len(segments), 1e6 * lineTime / len(segments),
+            referenceTime / lineTime)
+
+
+def benchmarkVisibility(args):
+    """
+    Queries of the cells visible from a cell: running a Wave each time, as the
+    ambush commanders did, against looking them up in a VisibilityIndex.
+    """
+    from api import Vector2
+    from visibility import Wave, VisibilityIndex
+
+    print '{:<20} {:>10} {:>10} {:>12} {:>12} {:>8}'.format('map', 'build', 'parallel', 'wave query', 'index query', 'speedup')
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        blocks = level.blockHeights
+        size = (level.width, level.height)
+        isBlocked = lambda x, y: blocks[x][y] > 1
+
+        index, build = timed(lambda: VisibilityIndex(size, isBlocked).build())
+        parallel = VisibilityIndex(size, isBlocked).buildParallel(processes = args.processes)
+
+        rng = random.Random(name)
+        free = [(x, y) for x in range(level.width) for y in range(level.height) if not isBlocked(x, y)]
+        queries = [rng.choice(free) for _ in range(args.queries)]
+        # Leave out the cells Wave never finishes from, see referenceWave.
+        queries = [cell for cell in queries if referenceWave(size, isBlocked, cell) is not None]
+
+        def waves():
+            results = []
+            for x, y in queries:
+                cells = []
+                Wave(size, isBlocked, lambda i, j: cells.append((i, j))).compute(Vector2(x + 0.5, y + 0.5))
+                results.append(cells)
+            return results
+
+        _, waveTime = timed(waves)
+        _, indexTime = timed(lambda: [index.visibleCells(x, y) for x, y in queries])
+
+        print '{:<20} {:>9.2f}s {:>9.2f}s {:>10.2f}ms {:>10.2f}ms {:>7.1f}x'.format(
+            name, build, parallel.buildTime, 1000 * waveTime / len(queries), 1000 * indexTime / len(queries), waveTime / indexTime)
+
+
+def benchmarkMerge(args):
+    """
+    Decoding and merging tick updates into the GameInfo of a commander: the
+    merge as it was and mergeGameInfo on decoded updates, and decoding
+    straight into the game with mergingFromJSON, against decoding and the
+    old merge.
+    """
+    import json
+    from api.gameinfo import GameInfo, fromJSON, toJSON, fixupGameInfoReferences, mergeGameInfo, mergingFromJSON
+
+    def decoded(message):
+        return json.loads(message, object_hook = fromJSON)
+
+    print '{:>6} {:>10} {:>10} {:>10} {:>10} {:>8}'.format('bots', 'decode', 'reference', 'merge', 'hook', 'speedup')
+    for botsPerTeam in args.bots:
+        rng = random.Random(botsPerTeam)
+        server = syntheticGame(botsPerTeam, rng)
+        initial = json.dumps(server, default = toJSON)
+        messages = [tickGameInfo(server, rng, t) for t in range(args.ticks)]
+        games = [decoded(initial) for _ in range(3)]
+        for game in games:
+            fixupGameInfoReferences(game)
+
+        updates, decodeTime = timed(lambda: [decoded(m) for m in messages])
+        _, referenceTime = timed(lambda: [referenceMergeGameInfo(games[0], u) for u in updates])
+        updates = [decoded(m) for m in messages]
+        _, mergeTime = timed(lambda: [mergeGameInfo(games[1], u) for u in updates])
+        _, hookTime = timed(lambda: [mergeGameInfo(games[2], json.loads(m, object_hook = mergingFromJSON(games[2]))) for m in messages])
+
+        print '{:>6} {:>8.3f}ms {:>8.3f}ms {:>8.3f}ms {:>8.3f}ms {:>7.1f}x'.format(2 * botsPerTeam,
+            1000 * decodeTime / args.ticks, 1000 * referenceTime / args.ticks, 1000 * mergeTime / args.ticks,
+            1000 * hookTime / args.ticks, (decodeTime + referenceTime) / hookTime)
+
+
+def benchmarkDecode(args):
+    """
+    Decoding the messages of a match with GameInfoDecoder, against json.loads
+    with fromJSON as the object_hook.  The parse column is json.loads without
+    a hook, the part that both have to do.
+    """
+    import json
+    from api.gameinfo import CombatEventLog, MatchCombatEvent, GameInfoDecoder, fromJSON
+
+    print '{:>6} {:>10} {:>10} {:>10} {:>8}'.format('bots', 'parse', 'fromJSON', 'decoder', 'speedup')
+    for botsPerTeam in args.bots:
+        rng = random.Random(botsPerTeam)
+        server = syntheticGame(botsPerTeam, rng)
+        messages = []
+        for t in range(args.ticks):
+            bots = server.bots.values()
+            server.match.combatEvents = CombatEventLog(MatchCombatEvent(MatchCombatEvent.TYPE_KILLED, rng.choice(bots), rng.choice(bots), t)
+                                                        for _ in range(rng.randint(0, 2)))
+            messages.append(tickGameInfo(server, rng, t))
+
+        # Best of three passes, one message at a time as the client reads them.
+        def best(decode):
+            def run():
+                for message in messages:
+                    decode(message)
+            return min(timeit.repeat(run, number = 1, repeat = 3))
+        decoder = GameInfoDecoder()
+        parseTime = best(json.loads)
+        hookTime = best(lambda m: json.loads(m, object_hook = fromJSON))
+        decoderTime = best(decoder.decode)
+        print '{:>6} {:>8.3f}ms {:>8.3f}ms {:>8.3f}ms {:>7.1f}x'.format(2 * botsPerTeam, 1000 * parseTime / args.ticks,
+            1000 * hookTime / args.ticks, 1000 * decoderTime / args.ticks, hookTime / decoderTime)
+
+
+def benchmarkDelta(args):
+    """
+    Sending a match with the delta encoded protocol 1.5 against full 1.4
+    snapshots: the bytes per tick, and decoding plus merging them into the
+    GameInfo of a commander.
+    """
+    import json
+    from api.gameinfo import fromJSON, toJSON, fixupGameInfoReferences, mergeGameInfo
+    from api.delta import DeltaEncoder, DeltaDecoder
+
+    print '{:>6} {:>7} {:>10} {:>10} {:>10} {:>10}'.format('bots', 'moving', '1.4 bytes', '1.5 bytes', '1.4 time', '1.5 time')
+    for botsPerTeam in args.bots:
+        for moving in args.moving:
+            rng = random.Random(botsPerTeam)
+            server = syntheticGame(botsPerTeam, rng)
+            stepGame(server, rng, 1.0, 0.0)
+            initial = json.dumps(server, default = toJSON)
+            clients = [json.loads(initial, object_hook = fromJSON) for _ in range(2)]
+            for game in clients:
+                fixupGameInfoReferences(game)
+            encoder, decoder = DeltaEncoder(keyframeInterval = args.keyframes), DeltaDecoder()
+
+            fullBytes = deltaBytes = 0
+            fullTime = deltaTime = 0.0
+            for tick in range(args.ticks):
+                stepGame(server, rng, moving, 0.1 * tick)
+                full = json.dumps(server, default = toJSON)
+                delta = encoder.encode(server)
+                fullBytes += len(full)
+                deltaBytes += len(delta)
+
+                start = time.time()
+                mergeGameInfo(clients[0], json.loads(full, object_hook = fromJSON))
+                fullTime += time.time() - start
+                start = time.time()
+                mergeGameInfo(clients[1], decoder.decode(delta))
+                deltaTime += time.time() - start
+            print '{:>6} {:>6.0f}% {:>10} {:>10} {:>8.3f}ms {:>8.3f}ms'.format(2 * botsPerTeam, 100 * moving,
+                fullBytes // args.ticks, deltaBytes // args.ticks, 1000 * fullTime / args.ticks, 1000 * deltaTime / args.ticks)
+
+
+def benchmarkStream(args):
+    """
+    Play a match against streamclient.StreamingClient with a server that
+    sends ticks faster than the commander ticks, for each protocol.  Reports
+    how many updates were skipped and how many ticks behind the server the
+    state of each commander tick was.
+    """
+    from api.handshaking import ConnectServer
+    from api.delta import PROTOCOL_VERSION
+
+    print '{:>8} {:>8} {:>8} {:>8} {:>12} {:>10}'.format('protocol', 'updates', 'ticked', 'skipped', 'mean behind', 'max behind')
+    for versions in [[ConnectServer.ExpectedProtocolVersion], [PROTOCOL_VERSION]]:
+        _, client, sent = playStream(versions, args.bots, args.ticks, args.step, args.interval, args.tickTime, args.rate)
+        behind = client.commander.behind
+        print '{:>8} {:>8} {:>8} {:>8} {:>12.2f} {:>10}'.format(sent['version'], client.received, len(behind), client.skipped,
+            float(sum(behind)) / len(behind), max(behind))
+
+
+def benchmarkCommands(args):
+    """
+    A commander that issues several commands per bot and tick, often the
+    order the bot already follows, like the behaviour trees of arlecks31.
+    The coalescing queue with encodeCommands against sending every command
+    with json.dumps.
+    """
+    import json
+    import logging
+    from api import Commander, Vector2, commands
+    from api.gameinfo import BotInfo
+
+    class Issuer(Commander):
+        pass
+    logging.getLogger('Issuer').addHandler(logging.NullHandler())
+
+    rng = random.Random(0)
+    game = syntheticGame(args.bots, rng)
+    commander = Issuer('benchmark')
+    commander.game = game
+    bots = game.team.members
+    targets = [Vector2(rng.uniform(1, 87), rng.uniform(1, 49)) for _ in range(8)]
+    for bot in bots:
+        bot.state = BotInfo.STATE_IDLE
+
+    expected = {}       # the last order of each bot
+    sent = issued = 0
+    queueTime = encodeTime = referenceTime = 0.0
+    for tick in range(args.ticks):
+        orders = []
+        for bot in bots:
+            for _ in range(rng.randint(1, 3)):
+                if bot.name in expected and rng.random() < args.repeat:
+                    order = expected[bot.name]
+                else:
+                    order = (rng.choice([commands.Move, commands.Attack, commands.Charge]), rng.choice(targets))
+                orders.append((bot, order))
+                expected[bot.name] = order
+
+        start = time.time()
+        for bot, (CommandClass, target) in orders:
+            commander.issue(CommandClass, bot, target, description = 'order')
+        queueTime += time.time() - start
+
+        start = time.time()
+        reference = [json.dumps(CommandClass(bot.name, target, description = 'order'), default = commands.toJSON)
+                     for bot, (CommandClass, target) in orders]
+        referenceTime += time.time() - start
+        start = time.time()
+        batch = commands.encodeCommands(commander.commandQueue)
+        encodeTime += time.time() - start
+        issued += len(reference)
+        sent += len(commander.commandQueue)
+
+        # The game restarts each bot that was sent an order, which then
+        # moves for a few ticks and stands idle once it arrives.
+        restarted = set(command.botId for command in commander.commandQueue)
+        commander.clearCommandQueue()
+        for bot in bots:
+            if bot.name in restarted:
+                bot.state = BotInfo.STATE_MOVING
+            elif rng.random() < 0.1:
+                bot.state = BotInfo.STATE_IDLE
+
+    print '{} commands issued, {} sent'.format(issued, sent)
+    print 'queueing {:.3f}ms, encoding {:.3f}ms per tick, every command with json.dumps {:.3f}ms'.format(
+        1000 * queueTime / args.ticks, 1000 * encodeTime / args.ticks, 1000 * referenceTime / args.ticks)
+
+
+def benchmarkOrders(args):
+    """
+    Encoding long Charge and Move orders along paths like sneakTo issues,
+    every 10th node of a shortest path: json.dumps with commands.toJSON,
+    against Command.encode the first time and from its cache.
+    """
+    import json
+    from api import commands
+    from pathfinding import GridGraph, NoPathError
+
+    orders = []
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        graph = GridGraph(level.blockHeights)
+        free = [n for n in range(graph.size) if graph.walkable[n]]
+        rng = random.Random(name)
+        for i in range(args.queries):
+            try:
+                nodes = graph.shortestPath(rng.choice(free), rng.choice(free), weighted = False)
+            except NoPathError:
+                continue
+            path = [graph.positions[n] for n in nodes]
+            waypoints = path[::10] + [path[-1]]
+            CommandClass = commands.Charge if i % 2 else commands.Move
+            orders.append((CommandClass, 'Red{}'.format(i % 10), waypoints))
+
+    def issued():
+        return [CommandClass(bot, list(waypoints), description = 'sneak') for CommandClass, bot, waypoints in orders]
+
+    batches = [issued() for _ in range(3)]
+    referenceTime = min(timed(lambda: [json.dumps(c, default = commands.toJSON) for c in batch])[1] for batch in batches)
+    batches = [issued() for _ in range(3)]
+    encodeTime = min(timed(lambda: [c.encode() for c in batch])[1] for batch in batches)
+    cachedTime = min(timed(lambda: [c.encode() for c in batches[0]])[1] for _ in range(3))
+
+    waypoints = sum(len(w) for _, _, w in orders)
+    print '{} orders, {:.1f} waypoints on average'.format(len(orders), float(waypoints) / len(orders))
+    print 'json.dumps with toJSON {:.1f}us, encode {:.1f}us, cached {:.1f}us per order'.format(
+        1e6 * referenceTime / len(orders), 1e6 * encodeTime / len(orders), 1e6 * cachedTime / len(orders))
+
+
+def benchmarkEvents(args):
+    """
+    Merge the combat events of a batch of long games into commanders that
+    read them each tick, through a cursor on a CombatEventLog with a retention
+    window and from takeChanges.  Reports the most events each game kept at
+    once next to the number sent.
+    """
+    import json
+    from api.gameinfo import CombatEventLog, MatchCombatEvent, fromJSON, toJSON, fixupGameInfoReferences, mergeGameInfo
+
+    def describe(e):
+        return (e.type, e.subject.name, e.instigator.name if e.instigator else None, e.time)
+
+    print '{:>5} {:>8} {:>8} {:>10} {:>10}'.format('game', 'events', 'kept', 'merge', 'read')
+    rng = random.Random(0)
+    ticks = int(args.seconds / args.step)
+    for number in range(args.games):
+        server = syntheticGame(args.bots, rng)
+        game = json.loads(json.dumps(server, default = toJSON), object_hook = fromJSON)
+        fixupGameInfoReferences(game)
+        game.match.retain(window = args.window)
+        cursor = game.match.cursor(0)
+        game.takeChanges()
+
+        sent, retained, mergeTime, readTime = 0, 0, 0.0, 0.0
+        for tick in range(1, ticks + 1):
+            t = tick * args.step
+            events = []
+            for _ in range(int(args.rate * args.step + rng.random())):
+                subject, instigator = rng.sample(server.bots.values(), 2)
+                if rng.random() < 0.5:
+                    events.append(MatchCombatEvent(MatchCombatEvent.TYPE_KILLED, subject, instigator, t))
+                else:
+                    events.append(MatchCombatEvent(MatchCombatEvent.TYPE_RESPAWN, subject, None, t))
+            server.match.combatEvents = CombatEventLog(events)
+            sent += len(events)
+            message = tickGameInfo(server, rng, t)
+
+            start = time.time()
+            mergeGameInfo(game, json.loads(message, object_hook = fromJSON))
+            mergeTime += time.time() - start
+            start = time.time()
+            [describe(e) for e in cursor.unseen()]
+            [describe(e) for e in game.takeChanges().combatEvents]
+            readTime += time.time() - start
+
+            retained = max(retained, len(game.match.combatEvents.events))
+        print '{:>5} {:>8} {:>8} {:>8.3f}ms {:>8.3f}ms'.format(number, sent, retained,
+            1000 * mergeTime / ticks, 1000 * readTime / ticks)
+
+
+def referenceFreePosition(level, area):
+    """
+    LevelInfo.findRandomFreePositionInBox as it was before the clearance map:
+    up to 100 random points in the box, each checked against its neighbours.
+    """
+    minX, minY = level.clamp(area[0].x, 0, level.width-1), level.clamp(area[0].y, 0, level.height-1)
+    maxX, maxY = level.clamp(area[1].x, 0, level.width-1), level.clamp(area[1].y, 0, level.height-1)
+    rangeX, rangeY = maxX - minX, maxY - minY
+    if (rangeX == 0.0) or (rangeY == 0.0):
+        return None
+    clearance = level.clearance()
+    for i in range(0, 100):
+        x, y = random.random() * rangeX + minX, random.random() * rangeY + minY
+        if clearance.isFree(x, y):
+            return (x, y)
+    return None
+
+
+def referenceNearestPosition(level, target):
+    for r in range(1, 100):
+        position = referenceFreePosition(level, (target - r, target + r))
+        if position:
+            return position
+    return None
+
+
+def benchmarkTournament(args):
+    """
+    Play a tournament of fake games with Pool.map, as competition.py did,
+    and with tournament.play: the time until the first result is tallied and
+    until the last, and the workers that played them.
+    """
+    from multiprocessing.pool import Pool
+    from tournament import Standings, play
+    fakeGame = FakeGame(args.seconds)
+
+    commanders = ['Commander{}'.format(i) for i in range(args.commanders)]
+    pairs = itertools.product(['map{:02}'.format(i) for i in range(args.levels)], itertools.combinations(commanders, 2))
+    games = [(level, pair, seed) for seed, (level, pair) in enumerate(pairs)]
+
+    def tally(results):
+        standings, first, pids = Standings(), None, set()
+        start = time.time()
+        for level, _, _, scores, _ in results():
+            if first is None:
+                first = time.time() - start
+            standings.add(level, scores)
+            pids.update(pid for pid, _ in scores)
+        return standings, first, time.time() - start, pids
+
+    def mapped():
+        pool = Pool(processes = args.processes)
+        results = pool.map(fakeGame, games)
+        pool.close()
+        pool.join()
+        return results
+
+    print '{:>16} {:>8} {:>8} {:>8}'.format('', 'first', 'last', 'workers')
+    for name, results in [('Pool.map', mapped), ('play', lambda: play(fakeGame, games, args.processes)),
+                          ('play, recycled', lambda: play(fakeGame, games, args.processes, args.recycle))]:
+        standings, first, last, pids = tally(results)
+        print '{:>16} {:>7.2f}s {:>7.2f}s {:>8}'.format(name, first, last, len(pids))
+
+
+def benchmarkFarm(args):
+    """
+    Play a tournament of fake games through a tournament.Coordinator, in two
+    batches, with worker processes standing in for the hosts of a farm.  A
+    worker that takes two games and disappears is played first, so those
+    wait for their lease to run out.
+    """
+    import multiprocessing
+    from tournament import Coordinator, TournamentManager, work
+    fakeGame = FakeGame(args.seconds)
+
+    commanders = ['Commander{}'.format(i) for i in range(args.commanders)]
+    pairs = itertools.product(['map{:02}'.format(i) for i in range(args.levels)], itertools.combinations(commanders, 2))
+    games = [(level, pair, seed) for seed, (level, pair) in enumerate(pairs)]
+
+    start = time.time()
+    coordinator = Coordinator(('localhost', 0), 'benchmark', lease = args.lease)
+    coordinator.games.add(games[:2])
+    lost = TournamentManager(address = coordinator.address, authkey = 'benchmark')
+    lost.connect()
+    for _ in range(2):
+        lost.games().take()
+
+    nodes = [multiprocessing.Process(target = work, args = (fakeGame, coordinator.address, 'benchmark', args.processes, args.recycle))
+             for _ in range(args.nodes)]
+    for node in nodes:
+        node.start()
+
+    duration = 0.0
+    half = len(games) // 2
+    for batch in [games[:2], games[2:half], games[half:]]:
+        for _, _, _, _, seconds in coordinator.play(batch):
+            duration += seconds
+    coordinator.close()
+    for node in nodes:
+        node.join()
+    elapsed = time.time() - start
+    print '{} games on {} workers of {} processes: {:.2f}s, {:.2f}s of games'.format(len(games), args.nodes, args.processes, elapsed, duration)
+
+
+def benchmarkLeague(args):
+    """
+    Discover the commanders in this directory, and rate a league of
+    simulated commanders with known strengths, scheduled by round robin like
+    competition.py does.  Reports how long rating took and the rank
+    correlation of the ratings with the strengths.
+    """
+    import os
+    from tournament import Elo, discover, roundRobin
+
+    commanders, discoverTime = timed(discover, os.path.dirname(os.path.abspath(__file__)))
+    print 'discovered {} commanders in {:.2f}s'.format(len(commanders), discoverTime)
+
+    players = ['fake{:02}.FakeCommander'.format(i) for i in range(args.commanders)]
+    strength = dict((c, 1500.0 + 400.0 * (i - args.commanders / 2.0) / args.commanders) for i, c in enumerate(players))
+    games = []
+    for i in range(args.levels):
+        for j, pairs in enumerate(roundRobin(players)):
+            for pair in pairs:
+                games.append(('map{:02}'.format(i), pair if (i + j) % 2 == 0 else pair[::-1], len(games)))
+
+    rng = random.Random(0)
+    elo = Elo()
+    start = time.time()
+    for level, pair, seed in games:
+        expected = 1.0 / (1.0 + 10.0 ** ((strength[pair[1]] - strength[pair[0]]) / 400.0))
+        r = rng.random()
+        score = (1, 0) if r < expected - 0.05 else (0, 0) if r < expected + 0.05 else (0, 1)
+        elo.add(level, pair, seed, {(pair[0], 'FakeCommander'): score, (pair[1], 'FakeCommander'): score[::-1]})
+    elapsed = time.time() - start
+
+    rank = dict((c, i) for i, (c, _) in enumerate(elo.ranked()))
+    truth = dict((c, i) for i, c in enumerate(sorted(players, key = strength.get, reverse = True)))
+    n = len(players)
+    spearman = 1.0 - 6.0 * sum((rank[c] - truth[c]) ** 2 for c in players) / (n * (n * n - 1))
+    print '{} games between {} commanders, rated in {:.3f}s, rank correlation {:.3f}'.format(len(games), n, elapsed, spearman)
+    print elo
+
+
+def benchmarkSequential(args):
+    """
+    Run sequential tests on simulated games between commanders of known
+    strength, the share of the points the candidate is expected to score
+    with a tenth of the games drawn, and count the games each needed
+    against the full budget.
+    """
+    from tournament import SequentialTest
+
+    rng = random.Random(0)
+    print '{:>8} {:>9} {:>8} {:>8} {:>10} {:>8}'.format('strength', 'stronger', 'weaker', 'none', 'mean games', 'saved')
+    for strength in args.strengths:
+        verdicts, games = {'stronger': 0, 'weaker': 0, 'undecided': 0}, 0
+        for _ in range(args.trials):
+            pair = ('cand.CandidateCommander', 'base.BaselineCommander')
+            test = SequentialTest(pair[0], pair[1], confidence = args.confidence, budget = args.budget)
+            while test.verdict() is None:
+                for _ in range(min(args.round, args.budget - test.games)):
+                    r = rng.random()
+                    score = (1, 0) if r < strength - 0.05 else (0, 0) if r < strength + 0.05 else (0, 1)
+                    test.add(pair, {(pair[0], 'CandidateCommander'): score, (pair[1], 'BaselineCommander'): score[::-1]})
+            verdicts[test.verdict()] += 1
+            games += test.games
+        print '{:>8.2f} {:>9} {:>8} {:>8} {:>10.1f} {:>7.0%}'.format(strength, verdicts['stronger'], verdicts['weaker'],
+            verdicts['undecided'], float(games) / args.trials, 1 - float(games) / (args.trials * args.budget))
+
+
+def benchmarkPositions(args):
+    """
+    Free position queries on LevelInfo: rejection sampling, as before, against
+    the clearance map.
+    """
+    from api import Vector2
+
+    print '{:<20} {:>10} {:>10} {:>7} {:>7} {:>10} {:>10} {:>10}'.format('map', 'box', 'clearance', 'failed', 'failed', 'nearest', 'clearance', 'build')
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        _, buildTime = timed(level.clearance)
+
+        rng = random.Random(name)
+        def randomPoint(margin):
+            return Vector2(rng.uniform(-margin, level.width + margin), rng.uniform(-margin, level.height + margin))
+        # Half of the queries are around blocks, where rejection sampling struggles.
+        blocks = [Vector2(x + 0.5, y + 0.5) for x in range(level.width) for y in range(level.height) if level.blockHeights[x][y] > 0]
+        boxes, targets = [], []
+        for i in range(args.queries):
+            a, size = rng.choice(blocks) if blocks and i % 2 else randomPoint(0.0), rng.choice([0.5, 1.0, 2.0, 5.0, 30.0])
+            boxes.append((a - size, a + size))
+            targets.append(rng.choice(blocks) if blocks and i % 2 else randomPoint(5.0))
+
+        def boxQueries(find):
+            random.seed(0)
+            return [find(level, area) for area in boxes]
+        expected, boxTime = timed(boxQueries, referenceFreePosition)
+        found, clearanceTime = timed(boxQueries, lambda level, area: level.findRandomFreePositionInBox(area))
+        _, nearestTime = timed(lambda: [referenceNearestPosition(level, t) for t in targets])
+        _, closestTime = timed(lambda: [level.findNearestFreePosition(t) for t in targets])
+
+        print '{:<20} {:>8.3f}ms {:>8.3f}ms {:>7} {:>7} {:>8.3f}ms {:>8.3f}ms {:>8.1f}ms'.format(name,
+            1000 * boxTime / len(boxes), 1000 * clearanceTime / len(boxes), expected.count(None), found.count(None),
+            1000 * nearestTime / len(targets), 1000 * closestTime / len(targets), 1000 * buildTime)
+
+
+def benchmarkCones(args):
+    """
+    Field of view queries: filtering the cells of VisibilityIndex.visibleCells
+    with a closure per cell, as the ambush commanders did, against
+    VisibilityIndex.coneCells, cold and cached.
+    """
+    from math import pi, cos, sin
+    from api import Vector2
+    from visibility import VisibilityIndex
+
+    print '{:<20} {:>10} {:>10} {:>10} {:>8}'.format('map', 'closure', 'cold', 'cached', 'speedup')
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        blocks = level.blockHeights
+        index = VisibilityIndex((level.width, level.height), lambda x, y: blocks[x][y] > 1)
+        index.build()
+
+        rng = random.Random(name)
+        free = [(x, y) for x in range(level.width) for y in range(level.height) if blocks[x][y] <= 1]
+        step = 2.0 * pi / index.orientationSteps
+        queries = []
+        for _ in range(args.queries):
+            x, y = rng.choice(free)
+            halfAngle, maxRange = rng.choice([(pi / 3, 20.0), (pi / 8, level.firingDistance), (pi, 15.0)])
+            angle = rng.randrange(index.orientationSteps) * step
+            queries.append((Vector2(x + 0.5, y + 0.5), Vector2(cos(angle), sin(angle)), halfAngle, maxRange))
+
+        def closures():
+            results = []
+            for position, facing, halfAngle, maxRange in queries:
+                def visible(p):
+                    delta = (p-position)
+                    l = delta.length()
+                    if l > maxRange:
+                        return False
+                    if l < 2.5 or halfAngle >= pi:
+                        return True
+                    delta /= l
+                    return facing.dotProduct(delta) >= cos(halfAngle)
+                cells = index.visibleCells(int(position.x), int(position.y))
+                results.append([c for c in cells if visible(Vector2(c[0]+0.5, c[1]+0.5))])
+            return results
+
+        def cones():
+            return [index.cellCoordinates(index.coneCells(*query)) for query in queries]
+
+        _, closureTime = timed(closures)
+        _, coldTime = timed(cones)
+        _, cachedTime = timed(cones)
+
+        print '{:<20} {:>8.3f}ms {:>8.3f}ms {:>8.3f}ms {:>7.1f}x'.format(name, 1000 * closureTime / len(queries),
+            1000 * coldTime / len(queries), 1000 * cachedTime / len(queries), closureTime / coldTime)
+
+
+def benchmarkWaves(args):
+    """
+    Time Wave, MaskWave.compute and MaskWave.computeMany from every free cell
+    of each map, or from a sample of them.  Cells from which Wave does not
+    finish are only counted.
+    """
+    from api import Vector2
+    from visibility import MaskWave
+
+    print '{:<20} {:>6} {:>8} {:>10} {:>10} {:>10} {:>8} {:>8}'.format(
+        'map', 'cells', 'skipped', 'wave', 'compute', 'many', 'speedup', 'many')
+    for name in args.maps or maploader.levelNames():
+        level = maploader.loadLevel(name)
+        blocks = level.blockHeights
+        size = (level.width, level.height)
+        isBlocked = lambda x, y: blocks[x][y] > 1
+
+        free = [(x, y) for x in range(level.width) for y in range(level.height) if not isBlocked(x, y)]
+        if args.cells:
+            free = random.Random(name).sample(free, min(args.cells, len(free)))
+
+        finished, waveTime = [], 0.0
+        for cell in free:
+            visible, duration = timed(referenceWave, size, isBlocked, cell)
+            if visible is not None:
+                finished.append(cell)
+                waveTime += duration
+
+        wave = MaskWave(np.array(blocks) > 1)
+        _, singleTime = timed(lambda: [wave.compute(Vector2(x + 0.5, y + 0.5)) for x, y in finished])
+        _, manyTime = timed(lambda: wave.computeMany(np.array(finished) + 0.5))
+
+        print '{:<20} {:>6} {:>8} {:>8.2f}ms {:>8.3f}ms {:>8.3f}ms {:>7.1f}x {:>7.1f}x'.format(
+            name, len(free), len(free) - len(finished), 1000 * waveTime / len(finished), 1000 * singleTime / len(finished),
+            1000 * manyTime / len(finished), waveTime / singleTime, waveTime / manyTime)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the commander helpers on the maps in assets/.')
+    subparsers = parser.add_subparsers()
+
+    pathfinding = subparsers.add_parser('pathfinding', help = 'compare the networkx sneak graph with pathfinding.GridGraph')
+    pathfinding.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    pathfinding.add_argument('--queries', type = int, default = 50, help = 'sneak paths to search per map')
+    pathfinding.set_defaults(run = benchmarkPathfinding)
+
+    weights = subparsers.add_parser('weights', help = 'time re-weighting the sneak graph from its distance field')
+    weights.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    weights.add_argument('--repeat', type = int, default = 20, help = 'updates to time per map')
+    weights.set_defaults(run = benchmarkWeights)
+
+    lines = subparsers.add_parser('lines', help = 'time visibility.line on random segments')
+    lines.add_argument('--segments', type = int, default = 5000, help = 'segments to walk')
+    lines.add_argument('--length', type = float, default = 15.0, help = 'mean length of a segment')
+    lines.set_defaults(run = benchmarkLines)
+
+    visibility = subparsers.add_parser('visibility', help = 'compare running a Wave per query with a VisibilityIndex')
+    visibility.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    visibility.add_argument('--queries', type = int, default = 200, help = 'cells to query per map')
+    visibility.add_argument('--processes', type = int, default = None, help = 'worker processes for the parallel build, one per cpu by default')
+    visibility.set_defaults(run = benchmarkVisibility)
+
+    merge = subparsers.add_parser('merge', help = 'time decoding and merging tick updates into a GameInfo')
+    merge.add_argument('--bots', type = int, nargs = '*', default = [5, 10, 20, 40], help = 'bots per team')
+    merge.add_argument('--ticks', type = int, default = 200, help = 'updates to merge')
+    merge.set_defaults(run = benchmarkMerge)
+
+    decode = subparsers.add_parser('decode', help = 'time GameInfoDecoder against json.loads and fromJSON on tick messages')
+    decode.add_argument('--bots', type = int, nargs = '*', default = [5, 10, 20, 40], help = 'bots per team')
+    decode.add_argument('--ticks', type = int, default = 200, help = 'messages to decode')
+    decode.set_defaults(run = benchmarkDecode)
+
+    delta = subparsers.add_parser('delta', help = 'compare the delta encoded tick protocol with full snapshots')
+    delta.add_argument('--bots', type = int, nargs = '*', default = [5, 10, 20], help = 'bots per team')
+    delta.add_argument('--moving', type = float, nargs = '*', default = [0.1, 0.5, 1.0], help = 'share of the bots that move each tick')
+    delta.add_argument('--ticks', type = int, default = 200, help = 'ticks to send')
+    delta.add_argument('--keyframes', type = int, default = 50, help = 'ticks between full snapshots')
+    delta.set_defaults(run = benchmarkDelta)
+
+    stream = subparsers.add_parser('stream', help = 'play a match against streamclient.StreamingClient with a commander slower than the server')
+    stream.add_argument('--bots', type = int, default = 10, help = 'bots per team')
+    stream.add_argument('--ticks', type = int, default = 300, help = 'ticks to send')
+    stream.add_argument('--step', type = float, default = 0.1, help = 'game seconds between ticks')
+    stream.add_argument('--interval', type = float, default = 0.01, help = 'seconds the server waits between ticks')
+    stream.add_argument('--tickTime', type = float, default = 0.05, help = 'seconds each commander tick takes')
+    stream.add_argument('--rate', type = float, default = 5.0, help = 'combat events per game second')
+    stream.set_defaults(run = benchmarkStream)
+
+    commands = subparsers.add_parser('commands', help = 'time the coalescing command queue and encoding the batch')
+    commands.add_argument('--bots', type = int, default = 10, help = 'bots per team')
+    commands.add_argument('--ticks', type = int, default = 500, help = 'ticks to issue commands for')
+    commands.add_argument('--repeat', type = float, default = 0.5, help = 'chance that a command repeats the last order of its bot')
+    commands.set_defaults(run = benchmarkCommands)
+
+    orders = subparsers.add_parser('orders', help = 'time encoding long Charge and Move orders with Command.encode and json.dumps')
+    orders.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    orders.add_argument('--queries', type = int, default = 100, help = 'paths to order per map')
+    orders.set_defaults(run = benchmarkOrders)
+
+    events = subparsers.add_parser('events', help = 'time reading combat events through a CombatEventLog with a retention window')
+    events.add_argument('--games', type = int, default = 3, help = 'games to play in a row')
+    events.add_argument('--seconds', type = float, default = 300.0, help = 'length of each game')
+    events.add_argument('--step', type = float, default = 0.1, help = 'seconds between updates')
+    events.add_argument('--rate', type = float, default = 2.0, help = 'combat events per second')
+    events.add_argument('--window', type = float, default = 30.0, help = 'seconds of events to retain')
+    events.add_argument('--bots', type = int, default = 5, help = 'bots per team')
+    events.set_defaults(run = benchmarkEvents)
+
+    tournament = subparsers.add_parser('tournament', help = 'time tallying a tournament of fake games with Pool.map and tournament.play')
+    tournament.add_argument('--levels', type = int, default = 6, help = 'levels to play each pair on')
+    tournament.add_argument('--commanders', type = int, default = 5, help = 'commanders playing each other')
+    tournament.add_argument('--seconds', type = float, default = 0.05, help = 'mean length of a game')
+    tournament.add_argument('--processes', type = int, default = 4, help = 'worker processes')
+    tournament.add_argument('--recycle', type = int, default = 10, help = 'games each worker plays before it is replaced')
+    tournament.set_defaults(run = benchmarkTournament)
+
+    farm = subparsers.add_parser('farm', help = 'play fake games through tournament.Coordinator with worker processes as hosts')
+    farm.add_argument('--levels', type = int, default = 6, help = 'levels to play each pair on')
+    farm.add_argument('--commanders', type = int, default = 5, help = 'commanders playing each other')
+    farm.add_argument('--seconds', type = float, default = 0.05, help = 'mean length of a game')
+    farm.add_argument('--nodes', type = int, default = 3, help = 'worker processes standing in for hosts')
+    farm.add_argument('--processes', type = int, default = 2, help = 'games each worker plays at once')
+    farm.add_argument('--recycle', type = int, default = 10, help = 'games each process of a worker plays before it is replaced')
+    farm.add_argument('--lease', type = float, default = 1.0, help = 'seconds before a game taken by a worker is handed out again')
+    farm.set_defaults(run = benchmarkFarm)
+
+    league = subparsers.add_parser('league', help = 'time commander discovery and rating a simulated league with the Elo ratings of tournament.py')
+    league.add_argument('--commanders', type = int, default = 12, help = 'simulated commanders to rate')
+    league.add_argument('--levels', type = int, default = 6, help = 'levels to play each pair on')
+    league.set_defaults(run = benchmarkLeague)
+
+    sequential = subparsers.add_parser('sequential', help = 'count the games the sequential test of tournament.py needs on simulated games')
+    sequential.add_argument('--strengths', type = float, nargs = '*', default = [0.3, 0.45, 0.5, 0.55, 0.6, 0.7], help = 'shares of the points the candidate scores')
+    sequential.add_argument('--trials', type = int, default = 200, help = 'tests to run per strength')
+    sequential.add_argument('--budget', type = int, default = 200, help = 'most games per test')
+    sequential.add_argument('--round', type = int, default = 12, help = 'games per round')
+    sequential.add_argument('--confidence', type = float, default = 0.99)
+    sequential.set_defaults(run = benchmarkSequential)
+
+    positions = subparsers.add_parser('positions', help = 'compare the LevelInfo free position queries with rejection sampling')
+    positions.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    positions.add_argument('--queries', type = int, default = 500, help = 'boxes and targets to query per map')
+    positions.set_defaults(run = benchmarkPositions)
+
+    cones = subparsers.add_parser('cones', help = 'compare filtering visible cells with a closure against VisibilityIndex.coneCells')
+    cones.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    cones.add_argument('--queries', type = int, default = 500, help = 'cone queries per map')
+    cones.set_defaults(run = benchmarkCones)
+
+    waves = subparsers.add_parser('waves', help = 'time MaskWave against Wave')
+    waves.add_argument('--maps', nargs = '*', help = 'maps to run on, all maps in assets/ by default')
+    waves.add_argument('--cells', type = int, default = None, help = 'cells to run from per map, all free cells by default')
+    waves.set_defaults(run = benchmarkWaves)
+
+    vectors = subparsers.add_parser('vectors', help = 'time the Vector2 operations commanders use, before and after __slots__')
+    vectors.add_argument('--number', type = int, default = 20000, help = 'calls to time per operation')
+    vectors.set_defaults(run = benchmarkVectors)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,8 @@ import logging
 
 from game import networkclient
 
+import streamclient
+
 import api
 
 logger = logging.getLogger("client")
@@ -93,6 +95,7 @@ def main(args):
     parser.add_argument('--name', required=False, default='network_client')     # optional path for name of client
     parser.add_argument('--serverHost', required=False, default='localhost')
     parser.add_argument('--serverPort', type=int, required=False, default=41041)
+    parser.add_argument('--streaming', action='store_true')                     # decode on a thread of its own and skip stale ticks
     parser.add_argument('commander', nargs=1)                                   # mandatory client file/class name
     args, _ = parser.parse_known_args()
 
@@ -111,14 +114,17 @@ def main(args):
     logger.debug('CLIENT: Initializing on {}:{}'.format(args.serverHost, args.serverPort))
     flushLog(logger)
 
-    wrapper = networkclient.NetworkClient((args.serverHost, args.serverPort), commanderCls, args.name)
+    if args.streaming:
+        wrapper = streamclient.StreamingClient((args.serverHost, args.serverPort), commanderCls, args.name)
+    else:
+        wrapper = networkclient.NetworkClient((args.serverHost, args.serverPort), commanderCls, args.name)
 
     logger.debug('CLIENT: Starting...')
 
     flushLog(logger)
     try:
         wrapper.run() 
-    except networkclient.DisconnectError:
+    except (networkclient.DisconnectError, streamclient.DisconnectError):
         pass
 
     logger.debug('CLIENT: Finished!')
@@ -1,25 +1,29 @@
 import bootstrap
 import sys
 import os
+import time
+import random
 
-from multiprocessing.queues import Queue
-from multiprocessing.pool import Pool
-import multiprocessing
+import argparse
 import itertools
 
 from aisbx import platform, callstack
 from game import application
 
+from tournament import Coordinator, Elo, ResultsLog, SequentialTest, Standings, discover, outcome, play, roundRobin, work
+
 def run(args):
     try:
-        level, commanders = args
+        level, commanders, seed = args
+        random.seed(seed)
+        start = time.time()
         sys.stderr.write('.')
         runner = platform.ConsoleRunner()
         runner.accelerate()
-        app = application.CaptureTheFlag(list(commanders), level, quiet = True, games = 1)
+        app = application.CaptureTheFlag(list(commanders), level, quiet = True, games = 1, commanderNames = list(commanders))
         runner.run(app)
         sys.stderr.write('o')
-        return level, app.scores
+        return level, commanders, seed, app.scores, time.time() - start
     except Exception as e:
         print >> sys.stderr, str(e)
         tb_list = callstack.format(sys.exc_info()[2])
@@ -27,44 +31,162 @@ def run(args):
             print >> sys.stderr, s
         raise
     except KeyboardInterrupt:
-        return None 
-
+        return None
 
-if __name__ == '__main__':
-    p = Pool(processes = multiprocessing.cpu_count())
 
-    total = 0
-    scores = {}
+def competition(args, levels, log, schedule):
+    """
+    Play mycmd against each of the example commanders on every level.
+    """
+    standings = Standings()
+    for level, _, _, results, _ in log.records:
+        standings.add(level, results)
 
     mycmd = 'mycmd.Placeholder'
     competitors = ['examples.Greedy', 'examples.Balanced', 'examples.Random', 'examples.Defender']
-    levels = ['map00', 'map01', 'map10', 'map11', 'map20', 'map30']
 
     pairs = itertools.product([mycmd], competitors)
-    games = list(itertools.product(levels, pairs))
+    games = [(level, pair, seed) for seed, (level, pair) in enumerate(itertools.product(levels, pairs), args.seed)]
+    total = len(games)
+    games = [game for game in games if not log.played(*game)]
 
-    print "Running against %i commanders on %i levels, for a total of %i games.\n" % (len(competitors), len(levels), len(games))
-    try:
-        for level, results in p.map(run, games):
-            for (_, bot), score in results.items():
-                scores.setdefault(bot, [0, 0, 0, 0, 0])
-                scores[bot][0] += score[0]                      # Flags captured.
-                scores[bot][1] += score[1]                      # Flags conceded.
-                scores[bot][2] += int(score[0] > score[1])      # Win.
-                scores[bot][3] += int(score[0] == score[1])     # Draw.
-                scores[bot][4] += int(score[1] > score[0])      # Loss.
-            total += 1
-    except KeyboardInterrupt:
-        print "\nTerminating competition due to keyboard interrupt."
-        p.terminate()
-        p.join()
-    else:        
-        print "\n"
-        for r, s in sorted(scores.items(), key = lambda i: i[1][2]*30 + i[1][3]*10 + i[1][0] - i[1][1], reverse = True):
-            nick = r.replace('Commander', '')
-            if nick in mycmd: continue
+    print "Running against %i commanders on %i levels, for a total of %i games.\n" % (len(competitors), len(levels), total)
+    if standings.games:
+        print "Resuming with %i games already played.\n" % standings.games
+    for level, commanders, seed, results, duration in schedule(games):
+        log.append(level, commanders, seed, results, duration)
+        standings.add(level, results)
+        print "\n\nAfter {} of {} games, {} on {}:\n{}".format(standings.games, total,
+            ' against '.join(bot.replace('Commander', '') for _, bot in results), level, standings)
+
+    print "\n"
+    for r, s in standings.ranked():
+        nick = r.replace('Commander', '')
+        if nick in mycmd: continue
+
+        print "{}\n\tCaptured {} flags and conceded {}.\n\tWon {}, drew {} and lost {}.\n".format(nick.upper(), *s)
+
+    print '\n\nAll matches played against {}; best opponent at top of list.\n'.format(mycmd)
+
+
+def sequential(args, levels, log, schedule):
+    """
+    Play the candidate against the baseline in rounds of one game per level
+    and side until the SequentialTest is decided or its budget is spent.
+    """
+    test = SequentialTest(args.candidate, args.baseline, confidence = args.confidence, budget = args.budget)
+    pair = (args.candidate, args.baseline)
+    for _, commanders, _, results, _ in log.records:
+        if sorted(commanders) == sorted(pair):
+            test.add(commanders, results)
+
+    print "Playing %s against %s in rounds of %i games, for at most %i games.\n" % (args.candidate, args.baseline, 2 * len(levels), args.budget)
+    seed = args.seed
+    while test.verdict() is None:
+        games = []
+        for level in levels:
+            for commanders in [pair, pair[::-1]]:
+                games.append((level, commanders, seed))
+                seed += 1
+        games = [game for game in games if not log.played(*game)][:args.budget - test.games]
+        for result in schedule(games):
+            log.append(*result)
+            test.add(result[1], result[3])
+        print "\n" + str(test)
+
+    if test.verdict() == 'undecided':
+        print "\n\nNo decision between {} and {} within {} games.\n".format(args.candidate, args.baseline, args.budget)
+    else:
+        print "\n\n{} is {} than {}.\n".format(args.candidate, test.verdict(), args.baseline)
 
-            print "{}\n\tCaptured {} flags and conceded {}.\n\tWon {}, drew {} and lost {}.\n".format(nick.upper(), *s)
 
-        print '\n\nAll matches played against {}; best opponent at top of list.\n'.format(mycmd)
+def league(args, levels, log, schedule):
+    """
+    Play every commander found against every other on each level, a round
+    of the round robin at a time, and keep their Elo ratings up to date.
+    """
+    commanders = discover(os.path.dirname(os.path.abspath(__file__)), args.league or None)
+    elo = Elo(args.ratings)
+    for level, players, seed, results, _ in log.records:
+        if all(c in commanders for c in players):
+            elo.add(level, players, seed, results, log.run)
+    elo.save()
 
+    games = []
+    for i, level in enumerate(levels):
+        for j, pairs in enumerate(roundRobin(commanders)):
+            for pair in pairs:
+                games.append((level, pair if (i + j) % 2 == 0 else pair[::-1], args.seed + len(games)))
+    total = len(games)
+    games = [game for game in games if not log.played(*game)]
+
+    print "Running a league of %i commanders on %i levels, for a total of %i games.\n" % (len(commanders), len(levels), total)
+    for number, (level, players, seed, results, duration) in enumerate(schedule(games), total - len(games) + 1):
+        log.append(level, players, seed, results, duration)
+        elo.add(level, players, seed, results, log.run)
+        elo.save()
+        print "{} of {}: {} on {}, {}".format(number, total, ' against '.join(players), level,
+            ' to '.join(str(score[0]) for score in outcome(players, results)))
+        if number % len(commanders) == 0:
+            print "\n{}\n".format(elo)
+
+    print "\n\n{}\n".format(elo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type = int, default = None)              # worker processes, one per CPU by default
+    parser.add_argument('--recycle', type = int, default = 10)                  # games each worker plays before it is replaced
+    parser.add_argument('--log', default = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'competition.jsonl'))  # file the result of each game is appended to
+    parser.add_argument('--resume', action = 'store_true')                      # continue the last run in the log instead of starting a new one
+    parser.add_argument('--seed', type = int, default = 0)                      # seed of the first game, the others count up from it
+    parser.add_argument('--candidate', default = None)                         # play only this commander against the baseline, until one is shown stronger
+    parser.add_argument('--baseline', default = 'examples.Balanced')
+    parser.add_argument('--confidence', type = float, default = 0.99, choices = [0.9, 0.95, 0.99, 0.999])
+    parser.add_argument('--budget', type = int, default = 200)                  # most games to play for a decision
+    parser.add_argument('--league', nargs = '*', default = None)                # play a round robin between the commanders of these modules, or of all
+    parser.add_argument('--ratings', default = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'ratings.json'))  # Elo ratings kept from one league to the next
+    parser.add_argument('--serve', default = None)                              # host:port to hand the games out on, to workers started with --work
+    parser.add_argument('--work', default = None)                               # host:port of a competition started with --serve, to play its games
+    parser.add_argument('--authkey', default = None)                            # shared by the competition and its workers, random for --serve by default
+    args, _ = parser.parse_known_args()
+
+    def address(value):
+        host, _, port = value.rpartition(':')
+        return host, int(port)
+
+    if args.work:
+        if not args.authkey:
+            parser.error('--work needs the --authkey the competition was started with')
+        print "Playing the games of the competition at %s.\n" % args.work
+        try:
+            work(run, address(args.work), args.authkey, processes = args.processes, gamesPerWorker = args.recycle)
+        except KeyboardInterrupt:
+            print "\nTerminating worker due to keyboard interrupt."
+        sys.exit(0)
+
+    coordinator = None
+    if args.serve:
+        # the workers unpickle what the coordinator sends, so never serve with a known key
+        authkey = args.authkey or os.urandom(16).encode('hex')
+        coordinator = Coordinator(address(args.serve), authkey)
+        print "Serving games on %s:%i, start workers with --work and --authkey %s.\n" % (coordinator.address + (authkey,))
+        schedule = coordinator.play
+    else:
+        schedule = lambda games: play(run, games, processes = args.processes, gamesPerWorker = args.recycle)
+
+    log = ResultsLog(args.log, resume = args.resume)
+    levels = ['map00', 'map01', 'map10', 'map11', 'map20', 'map30']
+    try:
+        if args.league is not None:
+            league(args, levels, log, schedule)
+        elif args.candidate:
+            sequential(args, levels, log, schedule)
+        else:
+            competition(args, levels, log, schedule)
+    except KeyboardInterrupt:
+        print "\nTerminating competition due to keyboard interrupt, run again with --resume to continue."
+    finally:
+        log.close()
+        if coordinator:
+            coordinator.close()
@@ -0,0 +1,344 @@
+"""
+Fixtures shared by the unit tests and benchmark.py: the code the helpers
+replaced, kept to check them against and to time them against, and fake
+inputs like the sneak setup of a level, a match streamed to a client or
+the games of a tournament.
+"""
+
+import os
+import time
+import random
+import itertools
+from math import floor, copysign
+
+import numpy as np
+
+
+def sneakSetup(level, team, enemyTeam):
+    """
+    Return (blocks, width, height, spawn, enemySpawn, flag, score) for the
+    sneak graph that ArlecksCommander builds when playing as `team`.
+    """
+    blocks = level.blockHeights
+    return (blocks, len(blocks), len(blocks[0]), level.botSpawnAreas[team], level.botSpawnAreas[enemyTeam],
+            level.flagSpawnLocations[team], level.flagScoreLocations[enemyTeam])
+
+
+def networkxSneakGraph(setup):
+    """
+    The sneak graph as ArlecksCommander built it with networkx: one node per
+    free cell, supernodes to find the enemy's route and edge weights based on
+    the distance to that route.
+    """
+    import networkx as nx
+
+    blocks, width, height, spawn, enemySpawn, flag, score = setup
+    g = nx.Graph()
+    terrain = [[i+j*width if blocks[i][j] == 0 else None for i in range(width)] for j in range(height)]
+    for j in range(height):
+        for i in range(width):
+            if terrain[j][i] is not None:
+                g.add_node(terrain[j][i])
+    for i, j in itertools.product(range(width), range(height)):
+        p = terrain[j][i]
+        if p is None: continue
+        if i < width-1 and terrain[j][i+1] is not None:
+            g.add_edge(p, terrain[j][i+1], weight = 1.0)
+        if j < height-1 and terrain[j+1][i] is not None:
+            g.add_edge(p, terrain[j+1][i], weight = 1.0)
+
+    def boxCells(box):
+        start, finish = box
+        return [terrain[j][i] for i, j in itertools.product(range(int(start.x), int(finish.x)), range(int(start.y), int(finish.y)))
+                if terrain[j][i] is not None]
+
+    for cell in boxCells(enemySpawn):
+        g.add_edge("enemy_base", cell, weight = 1.0)
+    for cell in boxCells(spawn):
+        g.add_edge("base", cell, weight = 1.0)
+
+    flagIndex = int(flag.x) + int(flag.y) * width
+    scoreIndex = int(score.x) + int(score.y) * width
+    vb2f = nx.shortest_path(g, source = "enemy_base", target = flagIndex)
+    vf2s = nx.shortest_path(g, source = flagIndex, target = scoreIndex) if flagIndex != scoreIndex else None
+    for vertex in vb2f:
+        g.add_edge("enemy_base_to_flag", vertex, weight = 1.0)
+    if vf2s:
+        for vertex in vf2s:
+            g.add_edge("enemy_flag_to_score", vertex, weight = 1.0)
+    distances = nx.single_source_shortest_path_length(g, "enemy_flag_to_score" if vf2s else "enemy_base_to_flag")
+    for node in ["base", "enemy_base", "enemy_base_to_flag", "enemy_flag_to_score"]:
+        if node in g:
+            g.remove_node(node)
+
+    for a, b in g.edges():
+        g[a][b]['weight'] = max(255 - 4.0 * (distances[a] + distances[b]), 0)
+    return g, len(vb2f) + len(vf2s or []), distances
+
+
+def gridSneakGraph(setup):
+    """
+    The same sneak graph built on pathfinding.GridGraph, as ArlecksCommander does now.
+    """
+    from pathfinding import GridGraph, NoPathError
+
+    blocks, width, height, spawn, enemySpawn, flag, score = setup
+    g = GridGraph(blocks)
+    enemyBase = g.addNode()
+    for cell in g.cellsInBox(*enemySpawn):
+        g.addEdge(enemyBase, cell)
+    base = g.addNode()
+    for cell in g.cellsInBox(*spawn):
+        g.addEdge(base, cell)
+
+    flagIndex, scoreIndex = g.getNodeIndex(flag), g.getNodeIndex(score)
+    vb2f = g.shortestPath(enemyBase, flagIndex, weighted = False)
+    try:
+        vf2s = g.shortestPath(flagIndex, scoreIndex, weighted = False) if flagIndex != scoreIndex else None
+    except NoPathError:
+        vf2s = None
+    baseToFlag = g.addNode()
+    for vertex in vb2f:
+        g.addEdge(baseToFlag, vertex)
+    flagToScore = g.addNode()
+    for vertex in vf2s or []:
+        g.addEdge(flagToScore, vertex)
+    distances = g.pathLengths(flagToScore if vf2s else baseToFlag)
+    for node in [base, enemyBase, baseToFlag, flagToScore]:
+        g.removeNode(node)
+
+    right, down = g.edgeSums(distances)
+    g.setWeights(np.maximum(255 - 4.0 * right, 0), np.maximum(255 - 4.0 * down, 0))
+    return g, len(vb2f) + len(vf2s or []), distances
+
+
+def referenceLine(A, B, finite = True, covering = True):
+    """
+    visibility.line as it was, checking the end of a finite line at every
+    step.  Kept to check line against.
+    """
+    sign = lambda x: int(copysign(1, x))
+
+    d = B - A           # Total delta of the line.
+
+    if abs(d.x) >= abs(d.y):
+        sy = d.y / abs(d.x)     # Slope along Y that was chosen.
+        sx = sign(d.x)          # Step in the correct X direction.
+
+        y = int(floor(A.y))     # Starting pixel, rounded.
+        x = int(floor(A.x))
+        e = A.y - float(y)      # Exact error calculated.
+
+        while True:
+            yield (x, y)
+        
+            if finite and x == int(floor(B.x)):
+                break
+
+            p = e           # Store current error for reference.
+            e += sy         # Accumulate error from slope.
+
+            if e >= 1.0:    # Reached the next row yet?
+                e -= 1.0        # Re-adjust the error accordingly.
+
+                if covering:
+                    if p+e < 1.0:   # Did the line go below the corner?
+                        yield (x+sx, y)
+                    elif p+e > 1.0:
+                        yield (x, y+1)
+
+                y += 1          # Step the coordinate to next row.
+
+            elif e < 0.0:   # Reached the previous row?
+                e += 1.0        # Re-adjust error accordingly.
+
+                if covering:
+                    if p+e < 1.0:   # Did the line go below the corner?
+                        yield (x, y-1)
+                    elif p+e > 1.0:
+                        yield (x+sx, y)
+
+                y -= 1          # Step the coordinate to previous row.
+
+            x += sx         # Take then next step with x.
+
+    else: # abs(d.x) < abs(d.y)
+
+        sx = d.x / abs(d.y)     # Slope along Y that was chosen.
+        sy = sign(d.y)          # Step in the correct X direction.
+
+        x = int(floor(A.x))     # Starting pixel, rounded.
+        y = int(floor(A.y))
+        e = A.x - float(x)      # Exact error calculated.
+ 
+        while True:
+            yield (x, y)
+
+            if finite and y == int(floor(B.y)):
+                break
+
+            p = e           # Store current error for reference.
+            e += sx         # Accumulate error from slope.
+
+            if e >= 1.0:    # Reached the next row yet?
+                e -= 1.0        # Re-adjust the error accordingly.
+
+                if covering:
+                    if p+e < 1.0:   # Did the line go below the corner?
+                        yield (x, y+sy)
+                    elif p+e > 1.0:
+                        yield (x+1, y)
+
+                x += 1          # Step the coordinate to next column.
+
+            elif e < 0.0:   # Reached the previous row?
+                e += 1.0        # Re-adjust error accordingly.
+
+                if covering:
+                    if p+e < 1.0:   # Did the line go below the corner?
+                        yield (x-1, y)
+                    elif p+e > 1.0:
+                        yield (x, y+sy)
+
+                x -= 1          # Step coordinate to the previous column.
+
+            y += sy         # Go for another iteration with next Y.
+
+
+class WaveLimit(Exception):
+    pass
+
+
+def referenceWave(size, isBlocked, (x, y), limit = 10000):
+    """
+    Return the (width, height) mask of the cells a Wave sees from the middle
+    of cell (x, y), or None if it splits into more than `limit` sub-waves.
+    Overlapping sub-waves can multiply with every column, and on some maps
+    Wave never finishes from a few cells.
+    """
+    from api import Vector2
+    from visibility import Wave
+
+    class LimitedWave(Wave):
+        calls = 0
+        def xwave_internal(self, *args):
+            self.count()
+            Wave.xwave_internal(self, *args)
+        def ywave_internal(self, *args):
+            self.count()
+            Wave.ywave_internal(self, *args)
+        def count(self):
+            self.calls += 1
+            if self.calls > limit:
+                raise WaveLimit()
+
+    visible = np.zeros(size, dtype = bool)
+    def setVisible(i, j):
+        visible[i, j] = True
+    try:
+        LimitedWave(size, isBlocked, setVisible).compute(Vector2(x + 0.5, y + 0.5))
+    except WaveLimit:
+        return None
+    return visible
+
+
+def playStream(protocolVersions, bots, ticks, step, interval, tickTime, rate, seed = 0):
+    """
+    Play a match against streamclient.StreamingClient over a socket, with a
+    server that sends a tick every interval seconds, to a commander whose
+    ticks take tickTime seconds.  Returns the game of the server, the client
+    and what was sent: the negotiated protocol 'version', the last 'tick'
+    and the combat events as (type, subject, instigator, time).
+    """
+    import json
+    import socket
+    import logging
+    import threading
+    from api import Commander
+    from api.handshaking import ConnectServer, fromJSON as handshakeFromJSON, toJSON as handshakeToJSON
+    from api.gameinfo import CombatEventLog, MatchCombatEvent, toJSON
+    from api.delta import DeltaEncoder, PROTOCOL_VERSION
+    from api.fixtures import syntheticGame, stepGame
+    import maploader
+    from streamclient import StreamingClient
+
+    def describe(e):
+        name = lambda obj: getattr(obj, 'name', obj)
+        return (e.type, name(e.subject), name(e.instigator), e.time)
+
+    sent = {'tick': 0, 'events': []}
+
+    class SlowCommander(Commander):
+        def initialize(self):
+            self.events = self.game.match.cursor(0)
+            self.read = []
+            self.behind = []
+
+        def tick(self):
+            self.behind.append(sent['tick'] - int(round(self.game.match.timePassed / step)))
+            self.read.extend(describe(e) for e in self.events.unseen())
+            time.sleep(tickTime)
+    logging.getLogger('SlowCommander').addHandler(logging.NullHandler())
+
+    def serve(listener, server, rng):
+        conn, _ = listener.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        stream = conn.makefile('rb')
+        connectServer = ConnectServer(supportedVersions = [ConnectServer.ExpectedProtocolVersion, PROTOCOL_VERSION])
+        conn.sendall('<connect>\n{}\n'.format(json.dumps(connectServer, default = handshakeToJSON)))
+        assert stream.readline() == '<connect>\n'
+        sent['version'] = json.loads(stream.readline(), object_hook = handshakeFromJSON).protocolVersion
+        encoder = DeltaEncoder() if sent['version'] == PROTOCOL_VERSION else None
+
+        level = maploader.loadLevel(maploader.levelNames()[0])
+        conn.sendall('<initialize>\n{}\n{}\n'.format(json.dumps(level, default = toJSON), json.dumps(server, default = toJSON)))
+        assert stream.readline() == '<ready>\n'
+        for tick in range(1, ticks + 1):
+            t = tick * step
+            stepGame(server, rng, 0.5, t)
+            events = []
+            for _ in range(int(rate * step + rng.random())):
+                subject, instigator = rng.sample(server.bots.values(), 2)
+                events.append(MatchCombatEvent(MatchCombatEvent.TYPE_KILLED, subject, instigator, t))
+            server.match.combatEvents = CombatEventLog(events)
+            sent['events'].extend(describe(e) for e in events)
+            message = encoder.encode(server) if encoder else json.dumps(server, default = toJSON)
+            sent['tick'] = tick
+            conn.sendall('<tick>\n{}\n'.format(message))
+            time.sleep(interval)
+        conn.sendall('<shutdown>\n')
+        conn.close()
+
+    rng = random.Random(seed)
+    server = syntheticGame(bots, rng)
+    stepGame(server, rng, 1.0, 0.0)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('localhost', 0))
+    listener.listen(1)
+    thread = threading.Thread(target = serve, args = (listener, server, rng))
+    thread.start()
+
+    client = StreamingClient(listener.getsockname(), SlowCommander, 'stream', protocolVersions = protocolVersions)
+    client.run()
+    thread.join()
+    listener.close()
+    return server, client, sent
+
+
+class FakeGame(object):
+    """
+        Stands in for competition.run: sleeps for a random time of about
+    `seconds`, a few games ten times longer, and returns random scores keyed
+    by the process that played them.  An object rather than a function so
+    that it takes its duration along when it is sent to a Pool.
+    """
+
+    def __init__(self, seconds = 0.01):
+        self.seconds = seconds
+
+    def __call__(self, (level, commanders, seed)):
+        rng = random.Random('{}{}{}'.format(level, commanders, seed))
+        duration = rng.uniform(0.0, 2.0 * self.seconds) * (10 if rng.random() < 0.05 else 1)
+        time.sleep(duration)
+        scores = dict(((os.getpid(), bot + 'Commander'), (rng.randint(0, 5), rng.randint(0, 5))) for bot in commanders)
+        return level, commanders, seed, scores, duration
@@ -0,0 +1,107 @@
+import os
+import hashlib
+
+import numpy as np
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# Bump this when the way any cached artifact is computed changes, so that
+# stale results from an older version are not picked up.
+VERSION = 2
+
+
+def levelKey(level):
+    """
+    Return a hex digest identifying the layout of a level: its block heights,
+    the spawn areas, flag spawn and score locations of all teams, and the
+    character radius, firing distance and fields of view that positions and
+    lines of fire are worked out with.
+    """
+    h = hashlib.sha1()
+    h.update('v{}'.format(VERSION))
+    h.update(level.blocks.tobytes())
+    h.update(repr((level.width, level.height)))
+    h.update(repr((level.characterRadius, level.firingDistance, list(level.fieldOfViewAngles))))
+    for name in sorted(level.botSpawnAreas):
+        start, finish = level.botSpawnAreas[name]
+        h.update(repr((name, start.x, start.y, finish.x, finish.y)))
+    for locations in [level.flagSpawnLocations, level.flagScoreLocations]:
+        for name in sorted(locations):
+            h.update(repr((name, locations[name].x, locations[name].y)))
+    return h.hexdigest()
+
+
+class MapCache(object):
+    """
+        Results of the map analysis that commanders do in initialize, stored
+    on disk as .npy files so that the next game on the same map can load them
+    instead of computing them again:
+
+        cache = MapCache(self.level)
+        distances = cache.get(self.game.team.name + '.distances', computeDistances)
+
+        Artifacts are named by the commander, and the name should include
+    whatever else the result depends on, like the team being played.  The
+    arrays are memory mapped read-only, copy them before modifying.
+    """
+
+    def __init__(self, level, directory = CACHE_DIR):
+        self.key = levelKey(level)
+        self.directory = os.path.join(directory, self.key)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name + '.npy')
+
+    def load(self, name):
+        """
+        Return the stored array for this name, or None if there is none.
+        """
+        try:
+            return np.load(self.path(name), mmap_mode = 'r', allow_pickle = False)
+        except (IOError, ValueError):
+            return None
+
+    def store(self, name, array):
+        """
+        Write the array to the cache.  It is written to a temporary file first
+        so that a game running at the same time never reads half a file.
+        Failing to write is not an error, the result is just not cached.
+        """
+        array = np.asarray(array)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            temporary = self.path(name) + '.{}.tmp'.format(os.getpid())
+            with open(temporary, 'wb') as f:
+                np.save(f, array, allow_pickle = False)
+            os.rename(temporary, self.path(name))
+        except (OSError, IOError):
+            pass
+        return array
+
+    def get(self, name, compute):
+        """
+        Return the cached array for this name, calling compute() and storing
+        its result as an array first if it is not in the cache yet.
+        """
+        array = self.load(name)
+        if array is not None:
+            self.hits += 1
+            return array
+        self.misses += 1
+        return self.store(name, compute())
+
+    def getMany(self, names, compute):
+        """
+        Like get, for several arrays that are computed together: compute()
+        returns one array per name, and is only called if any is missing.
+        """
+        arrays = [self.load(name) for name in names]
+        if all(array is not None for array in arrays):
+            self.hits += 1
+            return arrays
+        self.misses += 1
+        return [self.store(name, array) for name, array in zip(names, compute())]
@@ -0,0 +1,120 @@
+import os
+import glob
+import math
+import zlib
+import struct
+import ConfigParser
+
+from api.gameinfo import LevelInfo
+from api.vector2 import Vector2
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# Luminance of a map pixel to the height of the block in that cell.  White is
+# free floor, grey a low block that can be seen over, black a full block.
+HEIGHTS = {255: 0, 128: 1, 0: 4}
+
+
+def readPng(filename):
+    """
+    Decode an 8-bit RGB or RGBA png into (width, height, rows), where each row
+    is a list of luminance values.  Only what the map files use is supported,
+    so this works without PIL or pypng being installed.
+    """
+    data = open(filename, 'rb').read()
+    assert data[:8] == '\x89PNG\r\n\x1a\n', "{} is not a png file".format(filename)
+
+    idat, offset = [], 8
+    while offset < len(data):
+        length, = struct.unpack('>I', data[offset:offset+4])
+        kind = data[offset+4:offset+8]
+        chunk = data[offset+8:offset+8+length]
+        offset += 12 + length
+        if kind == 'IHDR':
+            width, height, depth, colorType = struct.unpack('>IIBB', chunk[:10])
+            assert depth == 8 and colorType in (2, 6), "unsupported png format in {}".format(filename)
+        elif kind == 'IDAT':
+            idat.append(chunk)
+
+    raw = zlib.decompress(''.join(idat))
+    bpp = 3 if colorType == 2 else 4
+    stride = width * bpp
+
+    rows, previous, pos = [], [0] * stride, 0
+    for y in range(height):
+        method = ord(raw[pos])
+        line = [ord(c) for c in raw[pos+1:pos+1+stride]]
+        pos += 1 + stride
+        for x in range(stride):
+            a = line[x-bpp] if x >= bpp else 0
+            b = previous[x]
+            if method == 1:
+                line[x] = (line[x] + a) & 0xff
+            elif method == 2:
+                line[x] = (line[x] + b) & 0xff
+            elif method == 3:
+                line[x] = (line[x] + (a + b) // 2) & 0xff
+            elif method == 4:
+                c = previous[x-bpp] if x >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                line[x] = (line[x] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+        rows.append([line[x*bpp] for x in range(width)])
+        previous = line
+    return width, height, rows
+
+
+def makeVector2(text):
+    x, y = text.split()
+    return Vector2(float(x), float(y))
+
+
+def loadLevel(name, directory = ASSETS_DIR):
+    """
+    Build a LevelInfo for one of the maps in assets/ (e.g. 'map00') from its
+    .png and .ini files, without starting the game.  Only the layout and the
+    team locations are filled in; the bot parameters use the game defaults.
+    """
+    width, height, rows = readPng(os.path.join(directory, name + '.png'))
+
+    level = LevelInfo()
+    level.width, level.height = width, height
+    level.blockHeights = [[HEIGHTS.get(rows[y][x], 4) for y in range(height)] for x in range(width)]
+
+    config = ConfigParser.RawConfigParser()
+    config.read(os.path.join(directory, name + '.ini'))
+    if config.has_section('game'):
+        level.initializationTime = config.getfloat('game', 'initialization')
+        level.gameLength = config.getfloat('game', 'duration')
+        level.respawnTime = config.getfloat('game', 'respawn')
+
+    for section in ['red', 'blue']:
+        if not config.has_section(section):
+            continue
+        teamName = section.capitalize()
+        level.teamNames.append(teamName)
+        level.flagSpawnLocations[teamName] = makeVector2(config.get(section, 'flag'))
+        level.flagScoreLocations[teamName] = makeVector2(config.get(section, 'score'))
+        start, finish = config.get(section, 'base').split(',')
+        level.botSpawnAreas[teamName] = (makeVector2(start), makeVector2(finish))
+
+    # These mirror the constants in game.gameconfig.
+    level.characterRadius = 0.25
+    level.fieldOfViewAngles = [0.0, math.pi / 2.0, math.pi / 6.0] + [math.pi / 2.0] * 6 + [0.0]
+    level.firingDistance = 15.0
+    level.walkingSpeed = 3.0
+    level.runningSpeed = 6.0
+    return level
+
+
+def levelNames(directory = ASSETS_DIR):
+    """
+    Return the names of all the playable maps in assets/, those with both a .png and an .ini file.
+    """
+    names = []
+    for filename in sorted(glob.glob(os.path.join(directory, '*.ini'))):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        if os.path.exists(os.path.join(directory, name + '.png')):
+            names.append(name)
+    return names
@@ -17,11 +17,13 @@ from api.gameinfo import BotInfo
 from api.gameinfo import MatchCombatEvent
 from PySide import QtGui, QtCore
 import networkx as nx
+import numpy as np
 import itertools
 from visibility import Wave
 from visibility import line
 
 from visualizer import VisualizerApplication
+from mapcache import MapCache
 
 class ArlecksCommander(Commander):
     
@@ -264,7 +266,8 @@ class ArlecksCommander(Commander):
         self.attackers = []
         self.spawnCampers = []
         self.aliveEnemies = 0
-        self.lastEventIndex = -1
+        self.game.match.retain(window = 30.0)
+        self.events = self.game.match.cursor(0)
         
         
 
@@ -300,6 +303,13 @@ class ArlecksCommander(Commander):
                 sys.stdout.write(str(free) + '\n')
                 self.spawnCampers.append([None, free, False])
         """
+        self.mapCache = MapCache(self.level)
+        camplines = self.mapCache.get(self.game.team.name + '.camplines', self.computeCamplines)
+        for x, y, cx, cy in camplines.tolist():
+            self.spawnCampers.append([[], (Vector2(x, y), Vector2(cx, cy))])
+
+    def computeCamplines(self):
+        """Find the lines to camp on around the enemy spawn, as an array of rows (x, y, contact x, contact y)."""
         sys.stdout.write(str(self.game.enemyTeam.botSpawnArea[1]) + ' ' + str(self.level.characterRadius) + '\n')
         visited, islandEdges, islandOuter = [], [], []
         for x in range(0, len(self.level.blockHeights)):
@@ -351,9 +361,7 @@ class ArlecksCommander(Commander):
             for _, contact in pls:
                 camplines.add((self.level.findNearestFreePosition(edge), contact))
         sys.stdout.write('\n' + str(camplines))
-        
-        for cl in camplines:
-            self.spawnCampers.append([[], cl])
+        return np.array([(p.x, p.y, c.x, c.y) for p, c in camplines if p is not None], dtype = float).reshape(-1, 4)
 
     def captured(self):
         """Did this team cature the enemy flag?"""
@@ -369,13 +377,13 @@ class ArlecksCommander(Commander):
         return sorted(options, key = lambda p: (bot.position - p).length())[0]
 
     def tick(self):
-        for self.lastEventIndex in range(self.lastEventIndex + 1, len(self.game.match.combatEvents)):
-            if self.game.match.combatEvents[self.lastEventIndex].type is MatchCombatEvent.TYPE_RESPAWN and self.game.match.combatEvents[self.lastEventIndex].subject in self.game.enemyTeam.members:
+        for event in self.events.unseen():
+            if event.type is MatchCombatEvent.TYPE_RESPAWN and event.subject in self.game.enemyTeam.members:
                 self.aliveEnemies += 1
-                sys.stdout.write(str(self.aliveEnemies) + self.game.match.combatEvents[self.lastEventIndex].subject.name + '\n')
-            elif self.game.match.combatEvents[self.lastEventIndex].type is MatchCombatEvent.TYPE_KILLED and self.game.match.combatEvents[self.lastEventIndex].subject in self.game.enemyTeam.members:
+                sys.stdout.write(str(self.aliveEnemies) + event.subject.name + '\n')
+            elif event.type is MatchCombatEvent.TYPE_KILLED and event.subject in self.game.enemyTeam.members:
                 self.aliveEnemies -= 1
-                sys.stdout.write(str(self.aliveEnemies) + ' ' + self.game.match.combatEvents[self.lastEventIndex].subject.name + '\n')
+                sys.stdout.write(str(self.aliveEnemies) + ' ' + event.subject.name + '\n')
         
         
         bots_unused = self.game.bots_available
@@ -0,0 +1,278 @@
+import heapq
+from collections import deque
+
+import numpy as np
+
+from api import Vector2
+
+INFINITY = float('inf')
+
+
+class NoPathError(Exception):
+    pass
+
+
+class GridGraph(object):
+    """
+        Walkability graph of a level, stored as flat arrays instead of one
+    Python object per cell.  Grid nodes are the cell indices i+j*width that
+    getNodeIndex returns, each free cell is linked to its four neighbours, and
+    the edge costs live in two arrays: right[n] is the cost of the edge n <->
+    n+1 and down[n] the cost of n <-> n+width, infinite where there is no edge.
+
+        Extra nodes can be added on top of the grid, e.g. to connect a whole
+    spawn area to a single source for a breadth first search.  They get the
+    indices after the last cell and are linked with explicit edges.
+    """
+
+    def __init__(self, blockHeights):
+        blocks = np.asarray(blockHeights)
+        self.width, self.height = blocks.shape
+        self.size = self.width * self.height
+
+        # The transpose flattens to the same i+j*width order as getNodeIndex.
+        walkable = (blocks.T == 0)
+        right = np.zeros((self.height, self.width), dtype = bool)
+        right[:, :-1] = walkable[:, :-1] & walkable[:, 1:]
+        down = np.zeros((self.height, self.width), dtype = bool)
+        down[:-1, :] = walkable[:-1, :] & walkable[1:, :]
+
+        self.walkable = walkable.ravel()
+        self.edgesRight = right.ravel()
+        self.edgesDown = down.ravel()
+        self.right = np.where(self.edgesRight, 1.0, INFINITY)
+        self.down = np.where(self.edgesDown, 1.0, INFINITY)
+
+        self.positions = [Vector2(float(n % self.width) + 0.5, float(n // self.width) + 0.5) if w else None
+                          for n, w in enumerate(self.walkable)]
+
+        self.links = {}
+        self.nodeCount = self.size
+        self.weightsChanged()
+
+    def weightsChanged(self):
+        """
+        Call this after writing to `right` or `down` directly, so the searches
+        pick up the new costs.
+        """
+        self._costs = None
+
+    def costs(self):
+        if self._costs is None:
+            finite = np.concatenate((self.right[self.edgesRight], self.down[self.edgesDown]))
+            minimum = float(finite.min()) if len(finite) else 0.0
+            self._costs = (self.right.tolist(), self.down.tolist(), minimum)
+        return self._costs
+
+    def setWeights(self, right, down):
+        """
+        Replace all the grid edge costs at once.  Both arrays are indexed by
+        cell like `right` and `down`, the values for missing edges are ignored.
+        """
+        self.right = np.where(self.edgesRight, right, INFINITY)
+        self.down = np.where(self.edgesDown, down, INFINITY)
+        self.weightsChanged()
+
+    def edgeSums(self, values):
+        """
+        Given one value per cell, return the arrays (right, down) holding the
+        sum of the values at both ends of each grid edge.
+        """
+        values = np.asarray(values, dtype = float).ravel()
+        right = np.zeros(self.size)
+        right[:-1] = values[:-1] + values[1:]
+        down = np.zeros(self.size)
+        down[:-self.width] = values[:-self.width] + values[self.width:]
+        return right, down
+
+    def averageWeights(self, default = 0.0):
+        """
+        Return the average cost of the edges around each cell, or `default` for cells without edges.
+        """
+        right = np.where(self.edgesRight, self.right, 0.0)
+        down = np.where(self.edgesDown, self.down, 0.0)
+        total = right + down
+        total[1:] += right[:-1]
+        total[self.width:] += down[:-self.width]
+        count = self.edgesRight.astype(int) + self.edgesDown
+        count[1:] += self.edgesRight[:-1]
+        count[self.width:] += self.edgesDown[:-self.width]
+        return np.where(count > 0, total / np.maximum(count, 1), default)
+
+    def setWeight(self, a, b, weight):
+        """
+        Set the cost of the grid edge between the neighbouring cells a and b.
+        """
+        a, b = min(a, b), max(a, b)
+        if b == a + 1 and self.edgesRight[a]:
+            self.right[a] = weight
+        elif b == a + self.width and self.edgesDown[a]:
+            self.down[a] = weight
+        else:
+            raise KeyError("no edge between {} and {}".format(a, b))
+        self.weightsChanged()
+
+    def getWeight(self, a, b):
+        a, b = min(a, b), max(a, b)
+        if b == a + 1 and self.edgesRight[a]:
+            return float(self.right[a])
+        elif b == a + self.width and self.edgesDown[a]:
+            return float(self.down[a])
+        raise KeyError("no edge between {} and {}".format(a, b))
+
+    def getNodeIndex(self, position):
+        return int(position.x) + int(position.y) * self.width
+
+    def cellsInBox(self, start, finish):
+        """
+        Return the free cells in the half-open box [start, finish), as used for the spawn areas.
+        """
+        return [i + j * self.width for j in range(int(start.y), int(finish.y)) for i in range(int(start.x), int(finish.x))
+                if self.walkable[i + j * self.width]]
+
+    def addNode(self):
+        """
+        Create a new node that is not part of the grid and return its index.
+        """
+        node = self.nodeCount
+        self.nodeCount += 1
+        self.links[node] = {}
+        return node
+
+    def addEdge(self, a, b, weight = 1.0):
+        """
+        Link two nodes with an explicit edge, at least one of them should be
+        an extra node created by addNode.
+        """
+        self.links.setdefault(a, {})[b] = weight
+        self.links.setdefault(b, {})[a] = weight
+
+    def removeNode(self, node):
+        for other in self.links.pop(node, {}):
+            del self.links[other][node]
+            if not self.links[other] and other < self.size:
+                del self.links[other]
+
+    def neighbours(self, n):
+        """
+        Return a list of (neighbour, cost) pairs for the node n.
+        """
+        right, down, _ = self.costs()
+        result = []
+        if n < self.size:
+            width = self.width
+            if right[n] < INFINITY: result.append((n + 1, right[n]))
+            if n > 0 and right[n - 1] < INFINITY: result.append((n - 1, right[n - 1]))
+            if down[n] < INFINITY: result.append((n + width, down[n]))
+            if n >= width and down[n - width] < INFINITY: result.append((n - width, down[n - width]))
+        if n in self.links:
+            result.extend(self.links[n].items())
+        return result
+
+    def shortestPath(self, source, target, weighted = True):
+        """
+        Return the list of nodes on the shortest path from source to target,
+        both included.  With weighted=False the number of steps is minimised,
+        otherwise the edge costs, using A* with a Manhattan distance heuristic
+        scaled by the cheapest edge.  NoPathError is raised if the target
+        cannot be reached.
+        """
+        if not weighted:
+            return self.breadthFirstPath([source], target)
+
+        right, down, minimum = self.costs()
+        width, size, links = self.width, self.size, self.links
+        if links or target >= size:
+            # Extra nodes can cut across the map, so the heuristic is not admissible.
+            minimum = 0.0
+        tx, ty = target % width, target // width
+        push, pop = heapq.heappush, heapq.heappop
+
+        # Padded by a row so that looking below the last row needs no bounds check.
+        distance = [INFINITY] * (self.nodeCount + width)
+        previous = {}
+        closed = bytearray(self.nodeCount)
+        distance[source] = 0.0
+        heap = [(0.0, source)]
+
+        def relax(m, dm):
+            distance[m] = dm
+            previous[m] = n
+            if minimum and m < size:
+                push(heap, (dm + minimum * (abs(m % width - tx) + abs(m // width - ty)), m))
+            else:
+                push(heap, (dm, m))
+
+        while heap:
+            _, n = pop(heap)
+            if n == target:
+                break
+            if closed[n]:
+                continue
+            closed[n] = 1
+            d = distance[n]
+
+            if n < size:
+                dm = d + right[n]
+                if dm < distance[n + 1]: relax(n + 1, dm)
+                dm = d + down[n]
+                if dm < distance[n + width]: relax(n + width, dm)
+                if n > 0:
+                    dm = d + right[n - 1]
+                    if dm < distance[n - 1]: relax(n - 1, dm)
+                if n >= width:
+                    dm = d + down[n - width]
+                    if dm < distance[n - width]: relax(n - width, dm)
+            if n in links:
+                for m, w in links[n].iteritems():
+                    dm = d + w
+                    if dm < distance[m]: relax(m, dm)
+        else:
+            raise NoPathError("no path from {} to {}".format(source, target))
+
+        return self.tracePath(previous, source, target)
+
+    def breadthFirstPath(self, sources, target):
+        """
+        Return the path with the fewest steps from any of the source nodes to the target.
+        """
+        previous = dict.fromkeys(sources)
+        queue = deque(sources)
+        while queue:
+            n = queue.popleft()
+            if n == target:
+                break
+            for m, _ in self.neighbours(n):
+                if m not in previous:
+                    previous[m] = n
+                    queue.append(m)
+        else:
+            raise NoPathError("no path from {} to {}".format(sources, target))
+
+        path = [target]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+    def tracePath(self, previous, source, target):
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+    def pathLengths(self, source):
+        """
+        Return the number of steps from source to every cell of the grid as a
+        flat array, infinite for cells that cannot be reached.
+        """
+        distance = [INFINITY] * self.nodeCount
+        distance[source] = 0
+        queue = deque([source])
+        while queue:
+            n = queue.popleft()
+            d = distance[n] + 1
+            for m, _ in self.neighbours(n):
+                if d < distance[m]:
+                    distance[m] = d
+                    queue.append(m)
+        return np.array(distance[:self.size], dtype = float)
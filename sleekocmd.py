@@ -21,6 +21,9 @@ import random
 import networkx as nx # for graphs
 import itertools
 import math
+import numpy as np
+
+from mapcache import MapCache
 
 #TODO Make bots more aggressive when time is running out and losing
 #TODO Make bots more defensive when time is running out and winning
@@ -40,7 +43,8 @@ class SleekoCommander(Commander):
         """
         self.verbose = True    # display the command descriptions next to the bot labels
         
-        self.lastEventCount = 0
+        self.game.match.retain(window = 30.0)
+        self.events = self.game.match.cursor(0)
         self.numAllies = len(self.game.team.members)
         self.botDeathLocations = [] # stores a list of Vector2 objects of where bots died
 
@@ -145,8 +149,9 @@ class SleekoCommander(Commander):
         #createPngFromMatrix(bt, (self.level.width, self.level.height))
 
         # Determine safest positions for flag defense
-        self.secureFlagDefenseLocs = self.getMostSecurePositions(Vector2(self.game.team.flagSpawnLocation.x, self.game.team.flagSpawnLocation.y))
-        self.secureEnemyFlagLocs = self.getMostSecurePositions(Vector2(self.game.enemyTeam.flagSpawnLocation.x, self.game.enemyTeam.flagSpawnLocation.y))
+        self.mapCache = MapCache(self.level)
+        self.secureFlagDefenseLocs = self.getCachedSecurePositions('secureFlagDefenseLocs', Vector2(self.game.team.flagSpawnLocation.x, self.game.team.flagSpawnLocation.y))
+        self.secureEnemyFlagLocs = self.getCachedSecurePositions('secureEnemyFlagLocs', Vector2(self.game.enemyTeam.flagSpawnLocation.x, self.game.enemyTeam.flagSpawnLocation.y))
 
     def tick(self):
         """
@@ -154,8 +159,7 @@ class SleekoCommander(Commander):
         """
         
         # listen for events
-        if len(self.game.match.combatEvents) > self.lastEventCount:
-            lastCombatEvent = self.game.match.combatEvents[-1]
+        for lastCombatEvent in self.events.unseen():
             #self.log.info('event:'+str(lastCombatEvent.type))
             # if lastCombatEvent.instigator is not None:
             #     print "event:%d %f %s %s" % (lastCombatEvent.type,lastCombatEvent.time,lastCombatEvent.instigator.name,lastCombatEvent.subject.name)
@@ -166,7 +170,6 @@ class SleekoCommander(Commander):
                 if lastCombatEvent.subject in self.game.team.members:
                     self.botDeathLocations.append(lastCombatEvent.subject.position)
                     #self.updateRunnerGraph()
-            self.lastEventCount = len(self.game.match.combatEvents)
 
 
         # run behavior tree
@@ -184,6 +187,13 @@ class SleekoCommander(Commander):
         if myScore < theirScore:
             self.log.info("We lost! Final score: " + str(myScore) + "-" + str(theirScore))
         
+    """
+    Same as getMostSecurePositions, but the result is kept in the map cache so it is only computed once per map and team
+    """
+    def getCachedSecurePositions(self, name, secLoc):
+        positions = self.mapCache.get(self.game.team.name + '.' + name, lambda: np.array(self.getMostSecurePositions(secLoc), dtype = int).reshape(-1, 2))
+        return [tuple(p) for p in positions.tolist()]
+
     """
     Returns most secure positions by using von Neumann neighborhood where r = firingDistance + 2
     """
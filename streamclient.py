@@ -0,0 +1,194 @@
+import sys
+import time
+import socket
+import threading
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from api import handshaking
+from api.commands import encodeCommands
+from api.delta import PROTOCOL_VERSION, DeltaDecoder
+from api.gameinfo import CombatEventLog, fixupGameInfoReferences, mergeGameInfo
+
+
+class NoConnectionError(Exception):
+    pass
+
+
+class DisconnectError(Exception):
+    pass
+
+
+def coalesce(older, newer):
+    """
+    Fold two decoded tick updates that were not merged yet into one: the
+    bots and flags of the newer update win, the combat events of both are
+    kept in order.  Deltas only carry the bots and flags that changed, so
+    the older ones still count where the newer update has none.
+    """
+    for kind in ['bots', 'flags']:
+        objects = dict(getattr(older, kind))
+        objects.update(getattr(newer, kind))
+        setattr(newer, kind, objects)
+    newer.match.combatEvents = CombatEventLog(list(older.match.combatEvents) + list(newer.match.combatEvents))
+    return newer
+
+
+class StreamingClient(object):
+    """
+        A network client that reads and decodes the server's messages on a
+    thread of its own while the commander ticks.  Updates that arrive while
+    a tick is running are coalesced, so the next tick acts on the newest
+    state after a single merge instead of catching up one update at a
+    time.  `skipped` counts the updates that were folded into a later one.
+
+        It speaks the same protocol as game.networkclient.NetworkClient and
+    asks the server for the delta encoded ticks of protocol 1.5, falling
+    back to 1.4 when the server does not offer them.
+    """
+
+    def __init__(self, networkAddr, commanderCls, commanderNick, protocolVersions = [PROTOCOL_VERSION]):
+        super(StreamingClient, self).__init__()
+        self.commander = commanderCls(nick = commanderNick)
+        self.protocolVersions = protocolVersions
+        self.protocolVersion = None
+        """
+        The protocol version agreed on with the server
+        """
+
+        start = time.time()
+        while True:
+            try:
+                self.conn = socket.create_connection(networkAddr)
+                self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                print >> sys.stderr, 'CLIENT: Connected from {}!'.format(self.conn.getsockname())
+                break
+            except socket.error:
+                time.sleep(0.1)
+            if time.time() - start > 10.0:
+                print >> sys.stderr, 'CLIENT: Error connecting to {}:{}'.format(networkAddr[0], networkAddr[1])
+                raise NoConnectionError()
+
+        self.condition = threading.Condition()
+        self.connect = None
+        self.initialize = None
+        self.update = None
+        self.shutdown = False
+        self.error = None
+        self.received = 0
+        """
+        The number of tick updates read from the server
+        """
+        self.skipped = 0
+        """
+        The number of tick updates coalesced into a later one instead of being ticked on
+        """
+
+        self.reader = threading.Thread(target = self.readMessages)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def post(self, **values):
+        with self.condition:
+            for name, value in values.items():
+                setattr(self, name, value)
+            self.condition.notify()
+
+    def readMessages(self):
+        decoder = DeltaDecoder()
+        stream = self.conn.makefile('rb')
+        try:
+            while True:
+                message = stream.readline().rstrip('\n')
+                if message == '<connect>':
+                    self.post(connect = stream.readline())
+                elif message == '<initialize>':
+                    decoder = DeltaDecoder()
+                    levelInfo = decoder.decode(stream.readline())
+                    gameInfo = decoder.decode(stream.readline())
+                    fixupGameInfoReferences(gameInfo)
+                    self.post(initialize = (levelInfo, gameInfo))
+                elif message == '<tick>':
+                    update = decoder.decode(stream.readline())
+                    with self.condition:
+                        self.received += 1
+                        if self.update is not None:
+                            update = coalesce(self.update, update)
+                            self.skipped += 1
+                        self.update = update
+                        self.condition.notify()
+                elif message == '<shutdown>':
+                    self.post(shutdown = True)
+                    break
+                elif message == '':
+                    raise DisconnectError('Error reading from socket')
+                else:
+                    raise DisconnectError('Unknown message received: {}'.format(message))
+        except (socket.error, DisconnectError) as e:
+            self.post(error = e)
+
+    def wait(self, ready):
+        """
+        Block until ready() is true, and return what it returned.
+        """
+        with self.condition:
+            value = ready()
+            while not value:
+                if self.error is not None:
+                    raise DisconnectError(str(self.error))
+                self.condition.wait(1.0)
+                value = ready()
+            return value
+
+    def take(self, name):
+        value = getattr(self, name)
+        setattr(self, name, None)
+        return value
+
+    def send(self, message):
+        try:
+            self.conn.sendall(message)
+        except socket.error as e:
+            raise DisconnectError('Error sending data: {}'.format(e))
+
+    def performHandshaking(self):
+        print >> sys.stderr, 'CLIENT: Waiting for <connect>'
+        connectServer = json.loads(self.wait(lambda: self.connect), object_hook = handshaking.fromJSON)
+        if not connectServer.validate():
+            print >> sys.stderr, 'CLIENT: Validation failed during hand-shaking.'
+            raise DisconnectError('Validation failed during hand-shaking.')
+        self.protocolVersion = connectServer.negotiate(self.protocolVersions)
+
+        print >> sys.stderr, 'CLIENT: Sending <connect> for protocol {}'.format(self.protocolVersion)
+        connectClient = handshaking.ConnectClient(self.commander.name, 'python', self.protocolVersion)
+        self.send('<connect>\n{}\n'.format(json.dumps(connectClient, default = handshaking.toJSON)))
+
+    def run(self):
+        try:
+            self.performHandshaking()
+
+            levelInfo, gameInfo = self.wait(lambda: self.take('initialize'))
+            self.commander.level = levelInfo
+            self.commander.game = gameInfo
+            print >> sys.stderr, 'CLIENT: Initializing...'
+            self.commander.initialize()
+            self.send('<ready>\n')
+            print >> sys.stderr, 'CLIENT: Done with initialization.'
+
+            while True:
+                update = self.wait(lambda: self.take('update') or self.shutdown)
+                if update is True:
+                    break
+                mergeGameInfo(self.commander.game, update)
+                self.commander.tick()
+                self.send(encodeCommands(self.commander.commandQueue))
+                self.commander.clearCommandQueue()
+
+            print >> sys.stderr, 'CLIENT: Shutting down...'
+            self.commander.shutdown()
+            print >> sys.stderr, 'CLIENT: Done with shutdown, skipped {} of {} updates.'.format(self.skipped, self.received)
+        finally:
+            self.conn.close()
@@ -0,0 +1,65 @@
+import random
+import unittest
+
+import numpy as np
+
+import maploader
+from fixtures import sneakSetup, networkxSneakGraph, gridSneakGraph
+
+
+MAPS = ['map00', 'map10', 'map30']
+
+
+def pathCost(weight, path):
+    return sum(weight(a, b) for a, b in zip(path, path[1:]))
+
+
+class TestGridGraph(unittest.TestCase):
+    """
+    The sneak graph of ArlecksCommander on pathfinding.GridGraph, against the
+    networkx graph it replaced.
+    """
+
+    def testSneakPaths(self):
+        import networkx as nx
+
+        for name in MAPS:
+            level = maploader.loadLevel(name)
+            setup = sneakSetup(level, level.teamNames[0], level.teamNames[1])
+            nxGraph, nxRoute, _ = networkxSneakGraph(setup)
+            grid, gridRoute, _ = gridSneakGraph(setup)
+            self.assertEqual(nxRoute, gridRoute, '{}: enemy routes differ in length'.format(name))
+
+            # Routes of the same length can take different cells, which changes
+            # the weights, so search both graphs with the weights from networkx.
+            for a, b in nxGraph.edges():
+                grid.setWeight(a, b, nxGraph[a][b]['weight'])
+
+            rng = random.Random(name)
+            free = sorted(nxGraph.nodes())
+            for _ in range(20):
+                s, t = rng.choice(free), rng.choice(free)
+                if not nx.has_path(nxGraph, s, t):
+                    continue
+                # Equal-cost paths can be broken up differently, so compare the costs.
+                nxCost = pathCost(lambda a, b: nxGraph[a][b]['weight'], nx.shortest_path(nxGraph, s, t, 'weight'))
+                gridCost = pathCost(grid.getWeight, grid.shortestPath(s, t))
+                self.assertAlmostEqual(nxCost, gridCost, 6, '{}: path costs from {} to {} differ'.format(name, s, t))
+
+    def testWeights(self):
+        for name in MAPS:
+            level = maploader.loadLevel(name)
+            setup = sneakSetup(level, level.teamNames[0], level.teamNames[1])
+            nxGraph, _, nxDistances = networkxSneakGraph(setup)
+            grid, _, _ = gridSneakGraph(setup)
+
+            # Weigh both graphs from the same distance field.
+            distances = np.array([nxDistances.get(n, float('inf')) for n in range(grid.size)])
+            right, down = grid.edgeSums(distances)
+            grid.setWeights(np.maximum(255 - 4.0 * right, 0), np.maximum(255 - 4.0 * down, 0))
+            for a, b in nxGraph.edges():
+                self.assertEqual(grid.getWeight(a, b), nxGraph[a][b]['weight'], '{}: weights from {} to {} differ'.format(name, a, b))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import unittest
+
+from api.gameinfo import toJSON
+from api.handshaking import ConnectServer
+from api.delta import PROTOCOL_VERSION, PRECISION, DEFAULT_PRECISION
+
+from fixtures import playStream
+
+
+TICKS = 60
+
+
+def fields(game):
+    value = json.loads(json.dumps(game, default = toJSON))['__value__']
+    return dict((kind, dict((name, obj['__value__']) for name, obj in value[kind].items())) for kind in ['bots', 'flags'])
+
+
+def close(a, b, places):
+    if isinstance(a, list) and a and isinstance(a[0], float):
+        return all(close(x, y, places) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= 0.5 * 10 ** -places + 1e-9
+    return a == b
+
+
+class TestStreamingClient(unittest.TestCase):
+    """
+    A match against a server that sends ticks faster than the commander
+    ticks: the commander must end on the same game as the server, up to the
+    rounding of the deltas, and read every combat event even though stale
+    updates were skipped.
+    """
+
+    def play(self, version):
+        server, client, sent = playStream([version], bots = 5, ticks = TICKS, step = 0.1, interval = 0.005, tickTime = 0.02, rate = 5.0)
+        commander = client.commander
+        self.assertEqual(sent['version'], version)
+
+        expected, received = fields(server), fields(commander.game)
+        for kind in expected:
+            for name, value in expected[kind].items():
+                for key in value:
+                    places = PRECISION.get(key, DEFAULT_PRECISION) if version == PROTOCOL_VERSION else 15
+                    self.assertTrue(close(value[key], received[kind][name][key], places),
+                                    '{} of {} differs at the end: {} != {}'.format(key, name, value[key], received[kind][name][key]))
+
+        self.assertEqual(commander.read, sent['events'])
+        self.assertEqual(client.received, TICKS)
+        self.assertEqual(len(commander.behind) + client.skipped, TICKS)
+        self.assertGreater(client.skipped, 0)
+
+    def testFullSnapshots(self):
+        self.play(ConnectServer.ExpectedProtocolVersion)
+
+    def testDeltas(self):
+        self.play(PROTOCOL_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()
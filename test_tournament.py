@@ -0,0 +1,357 @@
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import itertools
+import unittest
+import multiprocessing
+
+from fixtures import FakeGame
+from tournament import (Coordinator, Elo, Failure, GameQueue, ResultsLog, SequentialTest, Standings, TournamentManager,
+                        discover, key, play, roundRobin, wilson, work)
+
+
+def tournament(levels = 3, commanders = 4):
+    names = ['Commander{}'.format(i) for i in range(commanders)]
+    pairs = itertools.product(['map{:02}'.format(i) for i in range(levels)], itertools.combinations(names, 2))
+    return [(level, pair, seed) for seed, (level, pair) in enumerate(pairs)]
+
+
+def standings(results):
+    tally = Standings()
+    for level, _, _, scores, _ in results:
+        tally.add(level, scores)
+    return tally
+
+
+fakeGame = FakeGame(0.002)
+
+
+def failingGame(game):
+    """
+    A fakeGame that raises for the games with seed 1.
+    """
+    if game[2] == 1:
+        raise RuntimeError('seed 1')
+    return fakeGame(game)
+
+
+class TournamentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.games = tournament()
+        self.expected = standings(fakeGame(game) for game in self.games)
+
+
+class TestPlay(TournamentTestCase):
+
+    def testStandings(self):
+        """
+        The standings must be the same as playing the games one by one.
+        """
+        results = list(play(fakeGame, self.games, 3))
+        self.assertEqual(sorted((level, pair, seed) for level, pair, seed, _, _ in results), sorted(self.games))
+        self.assertEqual(standings(results).scores, self.expected.scores)
+
+    def testRecycle(self):
+        results = list(play(fakeGame, self.games, 2, 4))
+        self.assertEqual(standings(results).scores, self.expected.scores)
+        pids = set(pid for _, _, _, scores, _ in results for pid, _ in scores)
+        self.assertGreaterEqual(len(pids), len(self.games) // 4)
+
+
+class TestResultsLog(TournamentTestCase):
+
+    def setUp(self):
+        TournamentTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'results.jsonl')
+
+    def tearDown(self):
+        TournamentTestCase.tearDown(self)
+        shutil.rmtree(self.directory)
+
+    def interrupted(self):
+        """
+        Log half of the games and a record cut short, as a crash would.
+        """
+        log = ResultsLog(self.path)
+        for game in self.games[:len(self.games) // 2]:
+            log.append(*fakeGame(game))
+        log.file.write('{"level": "map00", "comm')
+        log.close()
+        return log.run
+
+    def testResume(self):
+        """
+        A resumed run must not play a game twice, and end with the standings
+        of playing them all.
+        """
+        run = self.interrupted()
+        log = ResultsLog(self.path, resume = True)
+        self.assertEqual(log.run, run)
+        self.assertEqual(len(log.records), len(self.games) // 2)
+        remaining = [game for game in self.games if not log.played(*game)]
+        self.assertEqual(remaining, self.games[len(self.games) // 2:])
+        for game in remaining:
+            log.append(*fakeGame(game))
+        log.close()
+
+        records = ResultsLog(self.path, resume = True).records
+        self.assertEqual(sorted((level, pair, seed) for level, pair, seed, _, _ in records), sorted(self.games))
+        self.assertEqual(standings(records).scores, self.expected.scores)
+
+    def testNewRun(self):
+        """
+        Without resume the log starts a new run, keeping the earlier runs in
+        the file.
+        """
+        run = self.interrupted()
+        with open(self.path, 'rb') as f:
+            logged = f.read()
+        logged = logged[:logged.rindex('\n') + 1]
+        log = ResultsLog(self.path)
+        self.assertNotEqual(log.run, run)
+        self.assertEqual(log.records, [])
+        self.assertFalse(any(log.played(*game) for game in self.games))
+        log.append(*fakeGame(self.games[0]))
+        log.close()
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read().startswith(logged))
+
+        log = ResultsLog(self.path, resume = True)
+        self.assertEqual(log.run, ResultsLog(self.path, resume = True).run)
+        self.assertEqual(len(log.records), 1)
+
+
+class TestSequentialTest(unittest.TestCase):
+
+    def testWilson(self):
+        for (successes, games, z), (low, high) in [((0, 10, 1.96), (0.0, 0.2775)), ((5, 10, 1.96), (0.2366, 0.7634)),
+                                                   ((81, 263, 1.96), (0.2553, 0.3662))]:
+            interval = wilson(successes, games, z)
+            self.assertAlmostEqual(interval[0], low, 4)
+            self.assertAlmostEqual(interval[1], high, 4)
+
+    def decide(self, strength, rng, budget = 200, round = 12):
+        """
+        Play rounds of simulated games, where the candidate scores this share
+        of the points with a tenth of the games drawn, until the test decides.
+        """
+        pair = ('cand.CandidateCommander', 'base.BaselineCommander')
+        test = SequentialTest(pair[0], pair[1], budget = budget)
+        while test.verdict() is None:
+            for _ in range(min(round, budget - test.games)):
+                r = rng.random()
+                score = (1, 0) if r < strength - 0.05 else (0, 0) if r < strength + 0.05 else (0, 1)
+                test.add(pair, {(pair[0], 'CandidateCommander'): score, (pair[1], 'BaselineCommander'): score[::-1]})
+        self.assertLessEqual(test.games, budget)
+        return test.verdict()
+
+    def testVerdict(self):
+        """
+        A test must never decide the wrong way for a clearly stronger or
+        weaker candidate.
+        """
+        rng = random.Random(0)
+        for strength in [0.3, 0.35, 0.65, 0.7]:
+            verdicts = [self.decide(strength, rng) for _ in range(50)]
+            self.assertNotIn('weaker' if strength > 0.5 else 'stronger', verdicts)
+            self.assertGreater(verdicts.count('stronger' if strength > 0.5 else 'weaker'), 40)
+
+    def testDraws(self):
+        pair = ('cand.CandidateCommander', 'base.BaselineCommander')
+        test = SequentialTest(pair[0], pair[1], budget = 20)
+        for _ in range(20):
+            test.add(pair[::-1], {(pair[1], 'BaselineCommander'): (2, 2), (pair[0], 'CandidateCommander'): (2, 2)})
+        self.assertEqual((test.wins, test.draws, test.losses), (0, 20, 0))
+        self.assertEqual(test.verdict(), 'undecided')
+
+
+class TestGameQueue(TournamentTestCase):
+
+    def testLease(self):
+        """
+        A game whose lease ran out is handed out again, and reported once
+        however many workers played it.
+        """
+        queue = GameQueue(lease = 0.05)
+        queue.add(self.games[:2])
+        self.assertEqual(queue.take(), self.games[0])
+        time.sleep(0.1)
+        self.assertEqual([queue.take(), queue.take(), queue.take()], [self.games[1], self.games[0], None])
+        result = fakeGame(self.games[0])
+        queue.put(result)
+        queue.put(result)
+        self.assertEqual(queue.results.get_nowait(), result)
+        self.assertTrue(queue.results.empty())
+
+    def testAttempts(self):
+        queue = GameQueue(lease = 0.05, attempts = 2)
+        queue.add(self.games[:1])
+        queue.take()
+        queue.fail(self.games[0], 'first')
+        self.assertEqual(queue.take(), self.games[0])
+        time.sleep(0.1)
+        self.assertIsNone(queue.take())
+        failure = queue.results.get_nowait()
+        self.assertIsInstance(failure, Failure)
+        self.assertEqual(failure.game, self.games[0])
+        self.assertIsNone(queue.take())
+
+
+class TestCoordinator(TournamentTestCase):
+
+    def play(self, run, batches, nodes = 2):
+        coordinator = Coordinator(('localhost', 0), 'test', lease = 0.5)
+        coordinator.games.add(batches[0][:2])
+        lost = TournamentManager(address = coordinator.address, authkey = 'test')
+        lost.connect()
+        taken = [lost.games().take() for _ in range(2)]
+        self.assertEqual(taken, batches[0][:2])
+
+        workers = [multiprocessing.Process(target = work, args = (run, coordinator.address, 'test', 2, 4)) for _ in range(nodes)]
+        for worker in workers:
+            worker.start()
+        results = []
+        for batch in batches:
+            results.extend(coordinator.play(batch))
+        coordinator.close()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0] * nodes)
+        return coordinator, results
+
+    def testLostWorker(self):
+        """
+        Two games are taken by a worker that disappears, they must be handed
+        out again once their lease runs out.  Every game must be reported
+        once, with the standings of playing them one by one.
+        """
+        half = len(self.games) // 2
+        _, results = self.play(fakeGame, [self.games[:half], self.games[half:]])
+        self.assertEqual(sorted(key(result) for result in results), sorted(key(game) for game in self.games))
+        self.assertEqual(standings(results).scores, self.expected.scores)
+
+    def testFailure(self):
+        coordinator, results = self.play(failingGame, [self.games])
+        failed = [game for game in self.games if game[2] == 1]
+        self.assertEqual([failure.game for failure in coordinator.failed], failed)
+        self.assertIn('RuntimeError: seed 1', coordinator.failed[0].traceback)
+        self.assertEqual(sorted(key(result) for result in results), sorted(key(game) for game in self.games if game not in failed))
+
+
+class TestLeague(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testDiscover(self):
+        commanders = discover(os.path.dirname(os.path.abspath(__file__)))
+        for expected in ['arlecks31.ArlecksCommander', 'examples.GreedyCommander', 'kilroy14.KilroyCommander']:
+            self.assertIn(expected, commanders)
+        self.assertNotIn('competition', sys.modules, 'scripts were imported while discovering')
+        self.assertNotIn('client', sys.modules, 'scripts were imported while discovering')
+
+    def testRoundRobin(self):
+        for count in [2, 5, 12]:
+            players = ['fake{:02}.FakeCommander'.format(i) for i in range(count)]
+            rounds = roundRobin(players)
+            for pairs in rounds:
+                self.assertEqual(len(set(c for pair in pairs for c in pair)), 2 * len(pairs), 'a commander plays twice in a round')
+            pairs = [tuple(sorted(pair)) for pairs in rounds for pair in pairs]
+            self.assertEqual(sorted(pairs), sorted(itertools.combinations(players, 2)))
+
+    def league(self, commanders = 12, levels = 6):
+        """
+        Return the games of a league between simulated commanders, scheduled
+        like competition.py does, the share of the points the first of each
+        pair is expected to score, and the commanders by strength, best first.
+        """
+        players = ['fake{:02}.FakeCommander'.format(i) for i in range(commanders)]
+        strength = dict((c, 1500.0 + 400.0 * (i - commanders / 2.0) / commanders) for i, c in enumerate(players))
+        rng = random.Random(0)
+        games = []
+        for i in range(levels):
+            for j, pairs in enumerate(roundRobin(players)):
+                for pair in pairs:
+                    pair = pair if (i + j) % 2 == 0 else pair[::-1]
+                    expected = 1.0 / (1.0 + 10.0 ** ((strength[pair[1]] - strength[pair[0]]) / 400.0))
+                    r = rng.random()
+                    score = (1, 0) if r < expected - 0.05 else (0, 0) if r < expected + 0.05 else (0, 1)
+                    results = {(pair[0], 'FakeCommander'): score, (pair[1], 'FakeCommander'): score[::-1]}
+                    games.append(('map{:02}'.format(i), pair, len(games), results))
+        return games, sorted(players, key = strength.get, reverse = True)
+
+    def testRatings(self):
+        """
+        The ratings of commanders with known strengths must come out in about
+        the same order.
+        """
+        games, truth = self.league()
+        elo = Elo()
+        for game in games:
+            elo.add(*game)
+        rank = dict((c, i) for i, (c, _) in enumerate(elo.ranked()))
+        n = len(truth)
+        spearman = 1.0 - 6.0 * sum((rank[c] - i) ** 2 for i, c in enumerate(truth)) / (n * (n * n - 1))
+        self.assertGreater(spearman, 0.8)
+
+    def testReload(self):
+        """
+        Ratings saved, loaded and fed the same games again must not change,
+        while the games of a new run are rated again.
+        """
+        path = os.path.join(self.directory, 'ratings.json')
+        games, _ = self.league(commanders = 6, levels = 2)
+        elo = Elo(path)
+        for game in games:
+            elo.add(*game, run = 'first')
+        elo.save()
+
+        loaded = Elo(path)
+        for game in games:
+            loaded.add(*game, run = 'first')
+        self.assertEqual(loaded.ratings, elo.ratings)
+        self.assertEqual(loaded.games, elo.games)
+
+        for game in games:
+            loaded.add(*game, run = 'second')
+        self.assertEqual(loaded.games, dict((c, 2 * n) for c, n in elo.games.items()))
+
+    def testInterruptedSave(self):
+        """
+        A save that stops before the new file is in place must leave the
+        old ratings to load, also from the .bak file it moved them to.
+        """
+        path = os.path.join(self.directory, 'ratings.json')
+        games, _ = self.league(commanders = 4, levels = 1)
+        elo = Elo(path)
+        for game in games[:10]:
+            elo.add(*game)
+        elo.save()
+        saved = dict(elo.ratings)
+        for game in games[10:]:
+            elo.add(*game)
+
+        rename = os.rename
+        def crash(source, target):
+            raise OSError('crashed')
+        os.rename = crash
+        try:
+            self.assertRaises(OSError, elo.save)
+        finally:
+            os.rename = rename
+        self.assertEqual(Elo(path).ratings, saved)
+
+        os.rename(path, path + '.bak')
+        self.assertEqual(Elo(path).ratings, saved)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import random
+import unittest
+from itertools import islice
+from math import pi, cos, sin
+
+import numpy as np
+
+import maploader
+from fixtures import referenceLine, referenceWave
+from api import Vector2
+from visibility import MaskWave, VisibilityIndex, line
+
+
+MAPS = ['map00', 'map10']
+
+
+def loadBlocked(name):
+    level = maploader.loadLevel(name)
+    blocks = level.blockHeights
+    return (level.width, level.height), lambda x, y: blocks[x][y] > 1
+
+
+def freeCells(size, isBlocked, count, seed):
+    width, height = size
+    free = [(x, y) for x in range(width) for y in range(height) if not isBlocked(x, y)]
+    return random.Random(seed).sample(free, count)
+
+
+class TestLine(unittest.TestCase):
+
+    def check(self, A, B):
+        for covering in [True, False]:
+            self.assertEqual(list(line(A, B, covering = covering)), list(referenceLine(A, B, covering = covering)),
+                             'line from {} to {} differs'.format(A, B))
+            self.assertEqual(list(islice(line(A, B, False, covering), 60)), list(islice(referenceLine(A, B, False, covering), 60)),
+                             'infinite line from {} through {} differs'.format(A, B))
+
+    def testRandomSegments(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            A = Vector2(rng.uniform(0, 88), rng.uniform(0, 50))
+            self.check(A, A + Vector2(rng.uniform(-30, 30), rng.uniform(-30, 30)))
+
+    def testTies(self):
+        """
+        End points on a grid of quarter cells, with deltas whose floats add
+        up exactly, so that lines pass exactly through corners and edges.
+        """
+        rng = random.Random(0)
+        for _ in range(2000):
+            A = Vector2(rng.randrange(4 * 88) / 4.0, rng.randrange(4 * 50) / 4.0)
+            major = rng.choice([1, 2, 4, 8, 16]) * rng.choice([-1, 1])
+            minor = rng.randrange(-4 * abs(major), 4 * abs(major) + 1) / 4.0
+            self.check(A, A + (Vector2(major, minor) if rng.random() < 0.5 else Vector2(minor, major)))
+
+    def testCorner(self):
+        """A covering line through the corners of cells steps diagonally."""
+        self.assertEqual(list(line(Vector2(0.5, 0.5), Vector2(3.5, 3.5))), [(0, 0), (1, 1), (2, 2), (3, 3)])
+        self.assertEqual(list(line(Vector2(3.5, 0.5), Vector2(0.5, 3.5))), [(3, 0), (2, 1), (1, 2), (0, 3)])
+
+
+class TestMaskWave(unittest.TestCase):
+
+    def testWave(self):
+        for name in MAPS:
+            size, isBlocked = loadBlocked(name)
+            cells, expected = [], []
+            for cell in freeCells(size, isBlocked, 100, name):
+                visible = referenceWave(size, isBlocked, cell)
+                if visible is not None:
+                    cells.append(cell)
+                    expected.append(visible)
+
+            wave = MaskWave(np.array(maploader.loadLevel(name).blockHeights) > 1)
+            many = wave.computeMany(np.array(cells) + 0.5)
+            for (x, y), visible, batched in zip(cells, expected, many):
+                self.assertTrue((wave.compute(Vector2(x + 0.5, y + 0.5)) == visible).all(), '{}: compute from {} differs'.format(name, (x, y)))
+                self.assertTrue((batched == visible).all(), '{}: computeMany from {} differs'.format(name, (x, y)))
+
+
+class TestVisibilityIndex(unittest.TestCase):
+
+    def testWave(self):
+        for name in MAPS:
+            size, isBlocked = loadBlocked(name)
+            index = VisibilityIndex(size, isBlocked).build()
+            for x, y in freeCells(size, isBlocked, 30, name):
+                # Leave out the cells Wave never finishes from, see referenceWave.
+                visible = referenceWave(size, isBlocked, (x, y))
+                if visible is None:
+                    continue
+                cells = zip(*np.nonzero(visible))
+                self.assertEqual(set(index.visibleCells(x, y)), set(cells), '{}: visible cells from {} differ'.format(name, (x, y)))
+                a = index.cellIndex(x, y)
+                self.assertTrue(all(index.canSee(a, index.cellIndex(i, j)) for i, j in cells))
+
+    def testParallelBuild(self):
+        size, isBlocked = loadBlocked('map00')
+        index = VisibilityIndex(size, isBlocked).build()
+        for processes in [1, 2]:
+            parallel = VisibilityIndex(size, isBlocked).buildParallel(processes = processes, chunkSize = 256)
+            self.assertTrue((parallel.bits == index.bits).all(), 'the build on {} processes differs'.format(processes))
+
+    def testConeCells(self):
+        level = maploader.loadLevel('map10')
+        size, isBlocked = loadBlocked('map10')
+        index = VisibilityIndex(size, isBlocked).build()
+        rng = random.Random(0)
+        step = 2.0 * pi / index.orientationSteps
+        for x, y in freeCells(size, isBlocked, 200, 'map10'):
+            position = Vector2(x + 0.5, y + 0.5)
+            halfAngle, maxRange = rng.choice([(pi / 3, 20.0), (pi / 8, level.firingDistance), (pi, 15.0)])
+            angle = rng.randrange(index.orientationSteps) * step
+            facing = Vector2(cos(angle), sin(angle))
+
+            # Filter the visible cells one by one, as the ambush commanders did.
+            def inCone((i, j)):
+                delta = Vector2(i + 0.5, j + 0.5) - position
+                l = delta.length()
+                if l > maxRange:
+                    return False
+                if l < 2.5 or halfAngle >= pi:
+                    return True
+                return facing.dotProduct(delta / l) >= cos(halfAngle)
+            expected = set(c for c in index.visibleCells(x, y) if inCone(c))
+            cone = index.coneCells(position, facing, halfAngle, maxRange)
+            self.assertIs(index.coneCells(position, facing, halfAngle, maxRange), cone)
+            found = set(index.cellCoordinates(cone))
+            # Cells exactly on the edge of the cone can go either way with rounding.
+            for i, j in expected ^ found:
+                delta = Vector2(i + 0.5, j + 0.5) - position
+                self.assertAlmostEqual(facing.dotProduct(delta), cos(halfAngle) * delta.length(), 9,
+                                       'cone cells from {} differ at {}'.format((x, y), (i, j)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,643 @@
+"""
+Scheduling and scoring the games of a competition.  The games are played on
+a pool of processes by a function like competition.run, which takes a
+(level, commanders, seed) game and returns it with the scores and the
+duration of the game.  Results are logged and tallied as they come in:
+
+    standings, log = Standings(), ResultsLog('logs/competition.jsonl', resume = True)
+    for level, commanders, seed, scores, duration in log.records:
+        standings.add(level, scores)
+    games = [game for game in games if not log.played(*game)]
+    for level, commanders, seed, scores, duration in play(run, games, gamesPerWorker = 10):
+        log.append(level, commanders, seed, scores, duration)
+        standings.add(level, scores)
+        print standings
+
+To spread the games over several hosts, a Coordinator serves them in place
+of `play`, to workers that connect to it and call `work`.  For a league,
+the commanders are found with `discover`, paired up with `roundRobin` and
+rated with `Elo`.
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import math
+import time
+import Queue
+import socket
+import threading
+import traceback
+import importlib
+import collections
+import multiprocessing
+from inspect import isclass
+from multiprocessing.pool import Pool
+from multiprocessing.managers import BaseManager
+
+
+# Seconds to wait for a result at a time.  Waiting without a timeout does not
+# let a KeyboardInterrupt through in Python 2.
+WAIT = 3600.0
+
+
+def rating(score):
+    """
+    The number used to rank commanders by their tally: 30 per win, 10 per
+    draw and one for each flag captured more than conceded.
+    """
+    return score[2] * 30 + score[3] * 10 + score[0] - score[1]
+
+
+class Standings(object):
+    """
+        The running tally of a competition, by commander: flags captured and
+    conceded, then wins, draws and losses.
+    """
+
+    def __init__(self):
+        self.scores = {}
+        self.games = 0
+        """
+        The number of games tallied
+        """
+
+    def add(self, level, results):
+        for (_, bot), score in results.items():
+            tally = self.scores.setdefault(bot, [0, 0, 0, 0, 0])
+            tally[0] += score[0]                        # Flags captured.
+            tally[1] += score[1]                        # Flags conceded.
+            tally[2] += int(score[0] > score[1])        # Win.
+            tally[3] += int(score[0] == score[1])       # Draw.
+            tally[4] += int(score[1] > score[0])        # Loss.
+        self.games += 1
+
+    def ranked(self):
+        """
+        Return the (commander, tally) pairs, best first.
+        """
+        return sorted(self.scores.items(), key = lambda i: rating(i[1]), reverse = True)
+
+    def __str__(self):
+        lines = ['{:<24} {:>5} {:>5} {:>5} {:>5} {:>5}'.format('commander', 'for', 'agst', 'won', 'drew', 'lost')]
+        for bot, tally in self.ranked():
+            lines.append('{:<24} {:>5} {:>5} {:>5} {:>5} {:>5}'.format(bot.replace('Commander', ''), *tally))
+        return '\n'.join(lines)
+
+
+def wilson(successes, games, z = 1.96):
+    """
+    Return the Wilson score interval of a proportion, as (low, high), for
+    this many successes out of games.  Successes may be fractional, a draw
+    counts as half.
+    """
+    if games == 0:
+        return 0.0, 1.0
+    p = float(successes) / games
+    centre = p + z * z / (2 * games)
+    spread = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games))
+    scale = 1 + z * z / games
+    return (centre - spread) / scale, (centre + spread) / scale
+
+
+def outcome(commanders, results):
+    """
+    Return the (captured, conceded) of each of the commanders of a game, in
+    their order.  The scores of a game are keyed by (nick, class name), and
+    competition.run gives the commanders as the nicks.  Results from before
+    that, with the team names as nicks, are matched by class name instead,
+    which must then tell the commanders apart.
+    """
+    nicks = dict((nick, tuple(score)) for (nick, _), score in results.items())
+    if all(commander in nicks for commander in commanders):
+        return [nicks[commander] for commander in commanders]
+    scores = []
+    for commander in commanders:
+        matches = [tuple(score) for (_, name), score in results.items() if commander.rpartition('.')[2] in name]
+        if len(matches) != 1:
+            raise ValueError('Unable to find {} in the scores {}'.format(commander, results))
+        scores.append(matches[0])
+    return scores
+
+
+# Two sided z for the usual confidence levels.
+CONFIDENCE = {0.9: 1.645, 0.95: 1.96, 0.99: 2.576, 0.999: 3.291}
+
+
+class SequentialTest(object):
+    """
+        Compares a candidate commander with a baseline over games played in
+    rounds, counting a win as a point and a draw as half a point.  After
+    each round the Wilson interval of the candidate's share of the points is
+    checked, and the test is decided once it no longer contains one half.
+    Looking after every round makes a false decision more likely than the
+    confidence suggests, so use a high one, 0.99 by default.
+
+        The commanders are named as in competition.py, like
+    'arlecks31.ArlecksCommander'.
+    """
+
+    def __init__(self, candidate, baseline, confidence = 0.99, budget = 200):
+        self.candidate = candidate
+        self.baseline = baseline
+        self.z = CONFIDENCE[confidence]
+        self.budget = budget
+        """
+        The most games to play before giving up on a decision
+        """
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, commanders, results):
+        """
+        Count the scores of a game between the candidate and the baseline.
+        """
+        captured, conceded = outcome(commanders, results)[list(commanders).index(self.candidate)]
+        self.wins += int(captured > conceded)
+        self.draws += int(captured == conceded)
+        self.losses += int(conceded > captured)
+
+    def interval(self):
+        """
+        Return the confidence interval of the candidate's share of the points.
+        """
+        return wilson(self.wins + 0.5 * self.draws, self.games, self.z)
+
+    def verdict(self):
+        """
+        Return 'stronger' or 'weaker' once the candidate is decided to be
+        so, 'undecided' when the budget ran out first and None otherwise.
+        """
+        low, high = self.interval()
+        if low > 0.5:
+            return 'stronger'
+        if high < 0.5:
+            return 'weaker'
+        if self.games >= self.budget:
+            return 'undecided'
+        return None
+
+    def __str__(self):
+        low, high = self.interval()
+        return '{} against {}: won {}, drew {} and lost {} of {} games, scoring {:.0%} to {:.0%}.'.format(
+            self.candidate, self.baseline, self.wins, self.draws, self.losses, self.games, low, high)
+
+
+def discover(directory, modules = None):
+    """
+    Return the commanders defined in the modules of a directory, or in the
+    named ones, as 'module.ClassName', the way client.getCommander finds
+    them.  Only files that define a subclass of Commander are imported, so
+    scripts like this one are left alone, and a module that fails to import
+    is skipped.
+    """
+    import api
+
+    if modules is None:
+        modules = []
+        for filename in sorted(glob.glob(os.path.join(directory, '*.py'))):
+            with open(filename) as f:
+                if re.search(r'^class\s+\w+\s*\(\s*(api\.)?Commander\s*\)', f.read(), re.MULTILINE):
+                    modules.append(os.path.splitext(os.path.basename(filename))[0])
+
+    commanders = []
+    for modulename in modules:
+        try:
+            module = importlib.import_module(modulename)
+        except Exception as e:
+            print >> sys.stderr, "Skipping '%s', %s." % (modulename, e)
+            continue
+        for name in sorted(dir(module)):
+            cls = getattr(module, name)
+            if isclass(cls) and issubclass(cls, api.Commander) and cls is not api.Commander and cls.__module__ == module.__name__:
+                commanders.append('{}.{}'.format(modulename, name))
+    return commanders
+
+
+def roundRobin(commanders):
+    """
+    Return the rounds of a round robin, in each of which every commander
+    plays at most one game, as lists of pairs.  Over all the rounds every
+    commander meets every other once.
+    """
+    players = list(commanders) + ([None] if len(commanders) % 2 else [])
+    rounds = []
+    for _ in range(len(players) - 1):
+        pairs = zip(players[:len(players) // 2], reversed(players[len(players) // 2:]))
+        rounds.append([pair for pair in pairs if None not in pair])
+        players.insert(1, players.pop())
+    return rounds
+
+
+class Elo(object):
+    """
+        Elo ratings of the commanders, updated after every game and kept in
+    a JSON file from one league to the next.  A commander not rated yet
+    starts at `initial`.  The file also holds the games already rated, by
+    the id of their run in the ResultsLog, level, commanders and seed, so
+    rating the same game twice, like when a league is resumed from its
+    results log, changes nothing while a new league with the same seeds
+    still counts.
+    """
+
+    def __init__(self, path = None, k = 16.0, initial = 1500.0):
+        self.path = path
+        self.k = k
+        self.initial = initial
+        self.ratings = {}
+        self.games = {}
+        """
+        The number of games rated for each commander
+        """
+        self.rated = set()
+        if path and not os.path.exists(path) and os.path.exists(path + '.bak'):
+            path = path + '.bak'
+        if path and os.path.exists(path):
+            with open(path) as f:
+                value = json.load(f)
+            self.ratings = dict((c.encode('utf-8'), r) for c, r in value['ratings'].items())
+            self.games = dict((c.encode('utf-8'), n) for c, n in value['games'].items())
+            self.rated = set((game[0],) + key(game[1:]) if len(game) == 4 else (None,) + key(game) for game in value['rated'])
+
+    def rating(self, commander):
+        return self.ratings.get(commander, self.initial)
+
+    def expected(self, commander, opponent):
+        """
+        Return the share of the points the commander is expected to score.
+        """
+        return 1.0 / (1.0 + 10.0 ** ((self.rating(opponent) - self.rating(commander)) / 400.0))
+
+    def add(self, level, commanders, seed, results, run = None):
+        """
+        Rate a game between two commanders, unless it was rated before.
+        """
+        game = (run,) + key((level, commanders, seed))
+        if game in self.rated:
+            return
+        self.rated.add(game)
+        (a, b), ((captured, conceded), _) = commanders, outcome(commanders, results)
+        points = 1.0 if captured > conceded else 0.5 if captured == conceded else 0.0
+        change = self.k * (points - self.expected(a, b))
+        self.ratings[a], self.ratings[b] = self.rating(a) + change, self.rating(b) - change
+        for commander in commanders:
+            self.games[commander] = self.games.get(commander, 0) + 1
+
+    def save(self):
+        """
+        Write the ratings to a temporary file and rename it over their file,
+        so that a crash leaves either the old ratings or the new ones.  Where
+        rename cannot replace a file, the old one is kept as a .bak file until
+        the new one is in place, and loading falls back to it.
+        """
+        if os.path.dirname(self.path) and not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'ratings': self.ratings, 'games': self.games, 'rated': [list(game) for game in sorted(self.rated)]}, f)
+        if os.name == 'posix' or not os.path.exists(self.path):
+            os.rename(temporary, self.path)
+        else:
+            backup = self.path + '.bak'
+            if os.path.exists(backup):
+                os.remove(backup)
+            os.rename(self.path, backup)
+            os.rename(temporary, self.path)
+            os.remove(backup)
+
+    def ranked(self):
+        return sorted(self.ratings.items(), key = lambda i: i[1], reverse = True)
+
+    def __str__(self):
+        lines = ['{:<40} {:>7} {:>6}'.format('commander', 'rating', 'games')]
+        for commander, rating in self.ranked():
+            lines.append('{:<40} {:>7.0f} {:>6}'.format(commander, rating, self.games.get(commander, 0)))
+        return '\n'.join(lines)
+
+
+class ResultsLog(object):
+    """
+        The results of the games played so far, appended to a file as one
+    JSON record per line, so that a competition that crashed or was
+    interrupted can be resumed without playing them again.  Each record
+    holds the id of the run, the level, the commanders, the seed, the
+    scores and the duration in seconds of a game.  A record cut short by a
+    crash is dropped.
+
+        Every time the competition is started it is a new run, with an id of
+    its own, unless it resumes the last run in the file.  Earlier runs are
+    kept in the file but are not in `records`.
+    """
+
+    def __init__(self, path, resume = False):
+        self.path = path
+        self.run = '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.urandom(2).encode('hex'))
+        """
+        The id of the run the games are played for
+        """
+        self.records = []
+        """
+        The (level, commanders, seed, scores, duration) of each game of the run
+        """
+        self.keys = set()
+        if os.path.exists(path):
+            self.read(resume)
+        elif os.path.dirname(path) and not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.file = open(path, 'ab')
+
+    def read(self, resume):
+        valid, records = 0, []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                records.append(record)
+                valid += len(line)
+        if valid < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid)
+        if resume and records:
+            self.run = records[-1].get('run')
+        for record in records:
+            if record.get('run') == self.run:
+                self.add(record['level'].encode('utf-8'), tuple(c.encode('utf-8') for c in record['commanders']), record['seed'],
+                         dict((tuple(key), tuple(score)) for key, score in record['scores']), record['duration'])
+
+    def add(self, level, commanders, seed, scores, duration):
+        self.records.append((level, commanders, seed, scores, duration))
+        self.keys.add((level, tuple(commanders), seed))
+
+    def played(self, level, commanders, seed):
+        """
+        Return whether this game was played in this run.
+        """
+        return (level, tuple(commanders), seed) in self.keys
+
+    def append(self, level, commanders, seed, scores, duration):
+        """
+        Add the result of a game, writing it to disk before returning.
+        """
+        self.add(level, tuple(commanders), seed, scores, duration)
+        record = {'run': self.run, 'level': level, 'commanders': list(commanders), 'seed': seed, 'duration': duration,
+                  'scores': [[list(key), list(score)] for key, score in scores.items()]}
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def play(run, games, processes = None, gamesPerWorker = None):
+    """
+    Play the games on a pool of processes and yield the result of each as
+    soon as it is done, in the order they finish.  Games are handed out one
+    at a time, so a slow game only holds up its own worker.  With
+    gamesPerWorker, each worker process is replaced after playing that many
+    games, releasing whatever the commanders leaked.  Results of None, from
+    a worker that was interrupted, are skipped.
+    """
+    pool = Pool(processes = processes or multiprocessing.cpu_count(), maxtasksperchild = gamesPerWorker)
+    try:
+        results = pool.imap_unordered(run, games, chunksize = 1)
+        for _ in range(len(games)):
+            result = results.next(timeout = WAIT)
+            if result is not None:
+                yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+class GameQueue(object):
+    """
+        The games a Coordinator hands out to workers, and the results they
+    send back.  A game taken by a worker is leased to it, and given to
+    another worker if no result came back within `lease` seconds, so a
+    worker that crashed or was switched off does not lose its games.  A
+    game is only reported once, however many workers end up playing it.
+    A game that failed or ran out its lease `attempts` times is reported
+    as a Failure instead of being handed out again.
+    """
+
+    def __init__(self, lease, attempts = 3):
+        self.lease = lease
+        self.attempts = attempts
+        self.lock = threading.Lock()
+        self.pending = collections.OrderedDict()
+        self.leased = {}
+        self.tries = collections.Counter()
+        self.results = Queue.Queue()
+        self.over = False
+
+    def add(self, games):
+        with self.lock:
+            for game in games:
+                self.pending[key(game)] = game
+
+    def take(self):
+        """
+        Return the next game to play, or None if there is none right now.
+        """
+        with self.lock:
+            now = time.time()
+            for k, (game, taken) in self.leased.items():
+                if now - taken > self.lease:
+                    self.retry(game, 'No result within {:.0f} seconds.\n'.format(self.lease))
+            if not self.pending:
+                return None
+            k, game = self.pending.popitem(last = False)
+            self.leased[k] = (game, now)
+            self.tries[k] += 1
+            return game
+
+    def retry(self, game, trace):
+        k = key(game)
+        del self.leased[k]
+        if self.tries[k] < self.attempts:
+            self.pending[k] = game
+        else:
+            self.results.put(Failure(game, trace))
+
+    def put(self, result):
+        with self.lock:
+            k = key(result)
+            if self.leased.pop(k, None) is None and self.pending.pop(k, None) is None:
+                return
+            self.results.put(result)
+
+    def fail(self, game, trace):
+        """
+        Take back a game whose worker raised trace while playing it.
+        """
+        with self.lock:
+            if key(game) in self.leased:
+                self.retry(game, trace)
+
+    def close(self):
+        self.over = True
+
+    def closed(self):
+        """
+        Return whether the coordinator has no more games to hand out.
+        """
+        return self.over
+
+
+class Failure(object):
+    """
+    A game that could not be played, with the traceback of the last attempt.
+    """
+
+    def __init__(self, game, traceback):
+        self.game = game
+        self.traceback = traceback
+
+
+def key(game):
+    level, commanders, seed = game[:3]
+    return level, tuple(commanders), seed
+
+
+class TournamentManager(BaseManager):
+    pass
+
+TournamentManager.register('games')
+
+
+class Coordinator(object):
+    """
+        Serves games to workers on other hosts, or other processes, that
+    connect to its address with the same authkey and run `work`.  Games are
+    played like with `play`, but by whichever workers are connected:
+
+        coordinator = Coordinator(('', 41042), 'secret')
+        for result in coordinator.play(games):
+            ...
+        coordinator.close()
+
+        The coordinator can play several batches of games, like the rounds
+    of a SequentialTest, and the workers wait for the next batch until it
+    is closed.  Games that fail on every attempt are left out of the
+    results, printed and kept in `failed`.
+    """
+
+    def __init__(self, address, authkey, lease = 600.0, attempts = 3):
+        self.games = GameQueue(lease, attempts)
+        self.failed = []
+        """
+        The Failure of each game that could not be played
+        """
+
+        class Manager(TournamentManager):
+            pass
+        Manager.register('games', callable = lambda: self.games)
+        self.server = Manager(address = address, authkey = authkey).get_server()
+        self.address = self.server.address
+        """
+        The address workers connect to, with the port chosen if it was 0
+        """
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def play(self, games):
+        """
+        Hand out the games and yield the result of each as it comes back.
+        """
+        self.games.add(games)
+        for _ in range(len(games)):
+            while True:
+                try:
+                    result = self.games.results.get(timeout = WAIT)
+                    break
+                except Queue.Empty:
+                    pass
+            if isinstance(result, Failure):
+                level, commanders, seed = result.game
+                print >> sys.stderr, 'Gave up on {} on {} with seed {}:\n{}'.format(' against '.join(commanders), level, seed, result.traceback)
+                self.failed.append(result)
+            else:
+                yield result
+
+    def close(self):
+        self.games.close()
+
+
+def attempt(run, game):
+    """
+    Return run(game), or a Failure with the traceback if it raised, so that
+    a game that fails does not take the worker with it.
+    """
+    try:
+        return run(game)
+    except Exception:
+        return Failure(game, traceback.format_exc())
+
+
+def work(run, address, authkey, processes = None, gamesPerWorker = None, patience = 60.0):
+    """
+    Play games from the Coordinator at address on a pool of processes, as
+    many at once as there are processes, until it is closed or goes away.
+    Waits up to `patience` seconds for the coordinator to start.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    manager = TournamentManager(address = address, authkey = authkey)
+    start = time.time()
+    while True:
+        try:
+            manager.connect()
+            break
+        except socket.error:
+            if time.time() - start > patience:
+                raise
+            time.sleep(1.0)
+    games = manager.games()
+
+    pool = Pool(processes = processes, maxtasksperchild = gamesPerWorker)
+    slots = threading.Semaphore(processes)
+    def finished(result):
+        try:
+            if isinstance(result, Failure):
+                games.fail(result.game, result.traceback)
+            elif result is not None:
+                games.put(result)
+        except (EOFError, IOError):
+            pass
+        slots.release()
+
+    try:
+        while True:
+            slots.acquire()
+            try:
+                game = games.take()
+                if game is None:
+                    slots.release()
+                    if games.closed():
+                        break
+                    time.sleep(1.0)
+                    continue
+            except (EOFError, IOError):
+                break
+            pool.apply_async(attempt, (run, game), callback = finished)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()